@@ -3,11 +3,88 @@ LLM Assistant Core Engine
 Manages conversation context, file loading, and Ollama integration
 """
 
+import httpx
 import ollama
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set
 import json
 
+from context_tools import ContextTools, describe, is_tool_prompt, outlined_files, run_tool_loop, tool_context
+from file_cache import get_file_cache, mentioned_symbols
+from hardware_profile import runtime_options
+from prompts import DEFAULT_KEEP_ALIVE, PrefillTracker, PromptTemplate
+from runtime_config import get_config
+
+
+def client_timeout(seconds: Optional[float]):
+    """`ollama.timeout` applied to connecting only.
+
+    Prefilling a long prompt on CPU or loading a cold model can take minutes
+    before the first chunk, so reads are not bounded.
+    """
+    return httpx.Timeout(None, connect=seconds) if seconds else None
+
+
+def _closer(client) -> Callable[[], None]:
+    """Callable that closes an ollama client's HTTP connection.
+
+    The httpx client is private to ollama; if a version lacks it, aborting
+    is a no-op and cancellation waits for the next streamed chunk instead.
+    """
+    close = getattr(getattr(client, "_client", None), "close", None)
+    return close if callable(close) else (lambda: None)
+
+
+class QueryCancelled(Exception):
+    """Raised when a query is cancelled before its answer is complete."""
+
+
+def stream_chat(
+    model: str,
+    messages: List[Dict],
+    host: Optional[str] = None,
+    cancel_event=None,
+    register_abort=None,
+    keep_alive: Optional[str] = None,
+    stats: Optional[Dict] = None,
+    options: Optional[Dict] = None,
+    timeout: Optional[float] = None,
+) -> str:
+    """Stream a chat completion, stopping as soon as `cancel_event` is set.
+
+    `register_abort` receives a callable that closes the HTTP connection, so
+    another thread can abort a request that is still waiting on the server.
+    `keep_alive` keeps the model (and its prompt cache) loaded between
+    queries; `stats` is filled with the timing counters of the final chunk.
+    `options` are model options such as num_ctx and num_thread; `timeout`
+    (seconds) bounds connecting to the server, not the wait for chunks.
+    """
+    client = ollama.Client(host=host, timeout=client_timeout(timeout))
+    if register_abort:
+        register_abort(_closer(client))
+
+    parts = []
+    stream = client.chat(model=model, messages=messages, stream=True, keep_alive=keep_alive, options=options)
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise QueryCancelled()
+            parts.append(chunk['message']['content'])
+            if stats is not None and chunk.get('done'):
+                for key in ('prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration', 'total_duration'):
+                    stats[key] = chunk.get(key)
+    except Exception:
+        if cancel_event is not None and cancel_event.is_set():
+            raise QueryCancelled()
+        raise
+    finally:
+        stream.close()
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise QueryCancelled()
+    return ''.join(parts)
+
+
 class LLMAssistant:
     def __init__(
         self,
@@ -15,61 +92,136 @@ class LLMAssistant:
         codebase_path: str = "../aethermud-code",
         context_window: int = 16384
     ):
-        import yaml
-        from pathlib import Path
-        config_path = Path(__file__).parent / "config.yaml"
-        with open(config_path, "r", encoding="utf-8") as f:
-            self.config = yaml.safe_load(f)
-        self.model = model or self.config.get("models", {}).get("default", "qwen2.5-coder:3b")
+        self.config = get_config().data
+        self._default_model = self.config.get("models", {}).get("default", "qwen2.5-coder:3b")
+        self.model = model or self._default_model
+        # Follow models.default on reload unless a model was chosen explicitly
+        self._follow_default = model is None
         self.app_name = self.config.get("assistant", {}).get("name", "Universal Knowledge Assistant")
         self.codebase_path = Path(codebase_path)
         self.context_window = context_window
+        self.last_iterative: Dict = {}
         self.conversation_history = []
-        self.loaded_files = {}
-        
-    def load_file_context(self, file_path: str, max_lines: int = 300) -> str:
-        """Load file content for context"""
+        self.file_cache = get_file_cache()
+        self.loaded_files = {}  # file path -> line ranges last sent as context
+        self.prefill = PrefillTracker()
+        self._load_settings()
+        get_config().subscribe(self.apply_config)
+
+    def _load_settings(self):
+        """Settings that can change while running (re-read by apply_config)."""
+        self.host = self.config.get("ollama", {}).get("host")
+        self.keep_alive = self.config.get("ollama", {}).get("keep_alive", DEFAULT_KEEP_ALIVE)
+        self.timeout = self.config.get("ollama", {}).get("timeout")
+        self.options = runtime_options(self.config, self.context_window)
+        self.max_lines = self.config.get("context", {}).get("max_lines_per_file", 300)
+        # "iterative": send an outline of the selected files and let the model fetch what it needs
+        self.context_mode = self.config.get("context", {}).get("mode", "full")
+        iterative = self.config.get("context", {}).get("iterative", {}) or {}
+        self.max_steps = int(iterative.get("max_steps", 4))
+        self.token_budget = int(iterative.get("token_budget", 4000))
+        self.prompt = PromptTemplate.from_config(self.config)
+
+    def apply_config(self, config: Dict, changed: Set[str]):
+        """Pick up a reloaded config.yaml; queries already running keep their settings."""
+        self.config = config
+        if "context.context_window" in changed:
+            self.context_window = config.get("context", {}).get("context_window") or self.context_window
+        if "models.default" in changed:
+            self._default_model = config.get("models", {}).get("default", self._default_model)
+            if self._follow_default:
+                self.model = self._default_model
+        self._load_settings()
+
+    def load_file_context(
+        self,
+        file_path: str,
+        max_lines: Optional[int] = None,
+        start_line: int = 1,
+        end_line: Optional[int] = None,
+        symbols: Optional[List[str]] = None,
+    ) -> str:
+        """Load file content for context
+
+        Reads `start_line`..`end_line` (capped at `max_lines`), or the blocks
+        defining any of `symbols` when the file contains them.
+        """
+        max_lines = max_lines or self.max_lines
         # Normalize path separators to forward slashes
         normalized_path = file_path.replace('\\', '/')
         full_path = self.codebase_path / normalized_path
         
         if not full_path.exists():
             return f"Error: File {file_path} not found"
-            
-        with open(full_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()[:max_lines]
-            
-        self.loaded_files[file_path] = ''.join(lines)
-        return self.loaded_files[file_path]
+
+        ranges = self.file_cache.symbol_ranges(full_path, symbols) if symbols else []
+        if not ranges:
+            end = start_line + max_lines - 1
+            ranges = [(start_line, min(end_line, end) if end_line else end)]
+
+        parts = []
+        budget = max_lines
+        for start, end in ranges:
+            if budget <= 0:
+                break
+            end = min(end, start + budget - 1)
+            text = self.file_cache.read_lines(full_path, start, end)
+            if len(ranges) > 1 or start > 1:
+                text = f"# lines {start}-{end}\n{text}"
+            parts.append(text)
+            budget -= end - start + 1
+
+        self.loaded_files[file_path] = ranges
+        return '\n'.join(parts)
     
-    def query(self, question: str, files: List[str] = None) -> str:
-        """Send query to Ollama with context"""
+    def prepare(self, question: str, files: List[str] = None) -> List[Dict]:
+        """Load file context and build the chat messages for a query"""
         context = ""
-        
-        # Load file contexts
+
+        if files and self.context_mode == "iterative":
+            outline = ContextTools(self.file_cache, [self.codebase_path]).outline(sorted(files))
+            return self.prompt.messages(question, tool_context(outline))
+
+        # Load file contexts (sorted so the same files always form the same prefix)
         if files:
-            for file_path in files:
-                content = self.load_file_context(file_path)
+            symbols = mentioned_symbols(question)
+            for file_path in sorted(files):
+                content = self.load_file_context(file_path, symbols=symbols)
                 context += f"\n\n=== File: {file_path} ===\n{content}"
-        
-        # Build prompt
-        prompt = f"""You are a helpful AI coding assistant for {self.app_name} development.
-    {self.app_name} is a Rifts-themed MUD built on Evennia framework in Python.
 
-    Context files:
-    {context}
+        return self.prompt.messages(question, context)
 
-    Question: {question}
+    def generate(self, messages: List[Dict], cancel_event=None, register_abort=None) -> str:
+        """Run prepared messages through Ollama"""
 
-    Provide a clear, code-focused answer. Reference specific lines when relevant."""
+        def chat(turn: List[Dict]) -> str:
+            stats = {}
+            answer = stream_chat(
+                self.model,
+                turn,
+                host=self.host,
+                cancel_event=cancel_event,
+                register_abort=register_abort,
+                keep_alive=self.keep_alive,
+                stats=stats,
+                options=self.options,
+                timeout=self.timeout,
+            )
+            self.prefill.record(turn, stats)
+            return answer
 
-        # Query Ollama
-        response = ollama.chat(
-            model=self.model,
-            messages=[{'role': 'user', 'content': prompt}]
+        if not is_tool_prompt(messages):
+            return chat(messages)
+        tools = ContextTools(
+            self.file_cache, [self.codebase_path], max_lines=self.max_lines, outlined=outlined_files(messages)
         )
-        
-        return response['message']['content']
+        answer, self.last_iterative = run_tool_loop(chat, messages, tools, self.max_steps, self.token_budget)
+        print(describe(self.last_iterative))
+        return answer
+
+    def query(self, question: str, files: List[str] = None) -> str:
+        """Send query to Ollama with context"""
+        return self.generate(self.prepare(question, files))
     
     def chat(self, message: str) -> str:
         """Conversational interface with history"""
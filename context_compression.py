@@ -0,0 +1,257 @@
+"""
+Context Compression
+Shrinks retrieved chunks before they go into the prompt, since every prompt
+token costs prefill time on CPU. Levels, each including the previous one:
+
+    light       trailing whitespace, blank-line runs, lines already sent by
+                an overlapping chunk of the same file
+    medium      comment-only lines (license headers included), import lines
+                already sent in this prompt, docstrings cut to their summary
+    aggressive  chunks ranked below `full_chunks` reduced to their
+                class/function signatures
+
+Line numbers stay exact: short removals are left as empty lines, longer
+ones become a single "... lines A-B omitted" marker, and the block header
+is updated to the lines actually shown.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LEVELS = {"off": 0, "light": 1, "medium": 2, "aggressive": 3}
+MIN_OMITTED = 3  # shorter removals stay as empty lines, so no marker is needed
+CHARS_PER_TOKEN = 4
+
+_HASH_COMMENT = {".py", ".pyw", ".sh", ".rb", ".pl", ".r", ".yaml", ".yml", ".toml", ".cfg", ".ini"}
+_SLASH_COMMENT = {
+    ".js", ".jsx", ".ts", ".tsx", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs",
+    ".java", ".kt", ".go", ".rs", ".swift", ".php", ".scala",
+}
+_CODE = (_HASH_COMMENT | _SLASH_COMMENT) - {".yaml", ".yml", ".toml", ".cfg", ".ini"}
+
+_IMPORT_RE = re.compile(r"^(import\s|from\s+\S+\s+import\s|#include\s|using\s+[\w.]+\s*;|use\s+[\w:]+)")
+_SIGNATURE_RE = re.compile(
+    r"^\s*(@\w|(async\s+)?def\s|class\s|(export\s+)?(default\s+)?(async\s+)?function\s|func\s|(pub\s+)?fn\s"
+    r"|interface\s|struct\s|impl\s|(public|private|protected|static)\s.*\()"
+)
+_DOCSTRING_RE = re.compile(r"^\s*[rRuUbB]?(\"\"\"|''')")
+_DEF_RE = re.compile(r"^\s*(async\s+)?(def|class)\s")
+
+
+def compression_level(value) -> int:
+    """Level number from a config value: a name, a number or a boolean."""
+    if isinstance(value, bool):
+        return LEVELS["light"] if value else LEVELS["off"]
+    if value is None:
+        return LEVELS["off"]
+    if isinstance(value, int):
+        return max(0, min(value, LEVELS["aggressive"]))
+    try:
+        return LEVELS[str(value).lower()]
+    except KeyError:
+        raise ValueError(f"Unknown compression level '{value}' (use {', '.join(LEVELS)})")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _comment_prefix(suffix: str) -> Optional[str]:
+    if suffix in _HASH_COMMENT:
+        return "#"
+    if suffix in _SLASH_COMMENT:
+        return "//"
+    return None
+
+
+def _split_lines(text: str) -> List[str]:
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _header(start: int, end: int, note: Optional[str]) -> str:
+    return f"lines {start}-{end}" + (f", {note}" if note else "")
+
+
+def _opens_docstring(out: List[str], i: int, start: int) -> bool:
+    """True if line `i` starts a docstring: right after a def/class header, or a module docstring.
+
+    Chunks are cut at fixed line counts and often begin inside a docstring,
+    so a bare triple quote is only trusted where a docstring can start.
+    """
+    if not _DOCSTRING_RE.match(out[i]):
+        return False
+    previous = next((j for j in range(i - 1, -1, -1) if out[j].strip() and not out[j].lstrip().startswith("#")), None)
+    if previous is None:
+        # Top of the chunk: a docstring only if the chunk is the top of the file
+        return start == 1
+    if not out[previous].rstrip().endswith(":"):
+        return False
+    # The header may span lines: walk back to its def/class line
+    for j in range(previous, max(previous - 20, -1), -1):
+        if _DEF_RE.match(out[j]):
+            return j == previous or not out[j].rstrip().endswith(":")
+        if j != previous and out[j].rstrip().endswith(":"):
+            return False
+    return False
+
+
+class _Compressor:
+    """Per-prompt state: which lines and imports were already sent."""
+
+    def __init__(self, level: int, full_chunks: int):
+        self.level = level
+        self.full_chunks = full_chunks
+        self.sent: Dict[str, set] = {}  # file -> line numbers already in the prompt
+        self.imports = set()
+
+    def compress(self, block: Dict, rank: int) -> Optional[Dict]:
+        lines = _split_lines(block["text"])
+        start = block.get("start_line") or 0
+        if block.get("note"):
+            # Symbol definitions are sent whole; later overlapping hits skip their lines
+            if start:
+                self.sent.setdefault(block.get("file", ""), set()).update(range(start, start + len(lines)))
+            return block
+        suffix = Path(block.get("file", "")).suffix.lower()
+        comment = _comment_prefix(suffix)
+        keep = [True] * len(lines)
+        # Lines dropped only for this block's rank; overlapping full copies may still send them
+        rank_only = [False] * len(lines)
+        out = [line.rstrip() for line in lines]
+
+        sent = self.sent.setdefault(block.get("file", ""), set()) if start else set()
+        for i, line in enumerate(out):
+            if not line or (start and start + i in sent):
+                keep[i] = False
+
+        if self.level >= LEVELS["medium"]:
+            self._strip_comments_and_docstrings(out, keep, comment, suffix, start)
+            self._dedupe_imports(out, keep)
+
+        if self.level >= LEVELS["aggressive"] and rank >= self.full_chunks and suffix in _CODE:
+            signatures = [i for i, line in enumerate(out) if keep[i] and _SIGNATURE_RE.match(line)]
+            if signatures:
+                for i in range(len(out)):
+                    if keep[i] and i not in signatures:
+                        keep[i] = False
+                        rank_only[i] = True
+
+        if start:
+            sent.update(start + i for i in range(len(lines)) if not rank_only[i])
+        return self._render(block, out, keep, start, comment)
+
+    def _strip_comments_and_docstrings(
+        self, out: List[str], keep: List[bool], comment: Optional[str], suffix: str, start: int
+    ):
+        i = 0
+        while i < len(out):
+            stripped = out[i].strip()
+            if comment and stripped.startswith(comment) and not stripped.startswith("#!"):
+                keep[i] = False
+            elif suffix in (".py", ".pyw") and _opens_docstring(out, i, start):
+                match = _DOCSTRING_RE.match(out[i])
+                quote = match.group(1)
+                rest = out[i][match.end() :]
+                if quote not in rest:
+                    close = next((j for j in range(i + 1, len(out)) if quote in out[j]), len(out))
+                    # Keep the opening line, plus the summary line when the opening has no text
+                    summary = i + 1 if not rest.strip() and i + 1 < close else i
+                    if close - summary > 1:
+                        for j in range(summary + 1, min(close + 1, len(out))):
+                            keep[j] = False
+                        out[summary] = out[summary] + f" ...{quote}"
+                        i = close
+            i += 1
+
+    def _dedupe_imports(self, out: List[str], keep: List[bool]):
+        i = 0
+        while i < len(out):
+            line = out[i]
+            if keep[i] and _IMPORT_RE.match(line):
+                j = i
+                # Parenthesized multi-line import: one statement
+                if "(" in line and ")" not in line:
+                    while j + 1 < len(out) and ")" not in out[j]:
+                        j += 1
+                key = " ".join(part.strip() for part in out[i : j + 1])
+                if key in self.imports:
+                    for n in range(i, j + 1):
+                        keep[n] = False
+                self.imports.add(key)
+                i = j
+            i += 1
+
+    def _render(self, block: Dict, out: List[str], keep: List[bool], start: int, comment: Optional[str]) -> Optional[Dict]:
+        kept = [i for i, flag in enumerate(keep) if flag]
+        if not kept:
+            return None
+        first, last = kept[0], kept[-1]
+        rendered = []
+        i = first
+        while i <= last:
+            if keep[i]:
+                rendered.append(out[i])
+                i += 1
+                continue
+            j = i
+            while not keep[j]:
+                j += 1
+            if j - i < MIN_OMITTED or not start:
+                rendered.extend([""] * (j - i))
+            else:
+                rendered.append(f"{comment or ''} ... lines {start + i}-{start + j - 1} omitted".lstrip())
+            i = j
+
+        compressed = dict(block)
+        compressed["text"] = "\n".join(rendered) + "\n"
+        if start:
+            compressed["start_line"] = start + first
+            compressed["header"] = _header(start + first, start + last, block.get("note"))
+        return compressed
+
+
+def compress_blocks(blocks: List[Dict], level, full_chunks: int = 2) -> Tuple[List[Dict], Dict]:
+    """Compress context blocks given in rank order; returns (blocks, report).
+
+    Blocks are processed in file order so overlap and import dedup keep the
+    earlier copy; the result keeps rank order, minus blocks that were
+    entirely redundant.
+    """
+    level = compression_level(level)
+    before = sum(estimate_tokens(block["text"]) for block in blocks)
+    if level == LEVELS["off"]:
+        return blocks, {"level": level, "tokens_before": before, "tokens_after": before, "saved": 0, "dropped": 0}
+
+    compressor = _Compressor(level, full_chunks)
+    by_position = sorted(range(len(blocks)), key=lambda i: (blocks[i].get("file", ""), blocks[i].get("start_line", 0)))
+    results: Dict[int, Optional[Dict]] = {}
+    # Rank among search hits; definition blocks (with a note) are always sent whole
+    ranks, hits = {}, 0
+    for i, block in enumerate(blocks):
+        ranks[i] = hits
+        hits += 0 if block.get("note") else 1
+    for i in by_position:
+        results[i] = compressor.compress(blocks[i], rank=ranks[i])
+    compressed = [results[i] for i in range(len(blocks)) if results[i] is not None]
+
+    after = sum(estimate_tokens(block["text"]) for block in compressed)
+    return compressed, {
+        "level": level,
+        "tokens_before": before,
+        "tokens_after": after,
+        "saved": before - after,
+        "dropped": len(blocks) - len(compressed),
+    }
+
+
+def describe(report: Dict) -> str:
+    before = report["tokens_before"]
+    percent = round(100 * report["saved"] / before) if before else 0
+    text = f"🗜️ Context ~{before} → ~{report['tokens_after']} tokens (saved ~{report['saved']}, {percent}%)"
+    if report["dropped"]:
+        text += f", {report['dropped']} redundant chunks dropped"
+    return text
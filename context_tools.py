@@ -0,0 +1,363 @@
+"""
+Iterative Context Fetching
+Instead of pasting whole files into the prompt up front, the model starts
+from a compact outline (symbols and line ranges of the selected files, or
+the top retrieval hits) and asks for what it needs with tool calls, one JSON
+object per line of its reply:
+
+    {"tool": "symbol", "name": "CombatHandler.resolve"}
+    {"tool": "lines", "file": "world/combat.py", "start": 120, "end": 160}
+    {"tool": "search", "query": "damage calculation"}    (indexed mode only)
+
+Calls are resolved locally from the symbol index and the file cache, and the
+results are appended to the conversation, so every step extends the previous
+prompt and Ollama only prefills the new part. A reply without tool calls is
+the answer. The number of steps and the tokens added by tool results are
+capped; the model is then told to answer from what it has.
+
+Any `chat(messages) -> str` callable can drive the loop, including
+`ScriptedModel`, which replays canned replies without a model server.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from context_compression import CHARS_PER_TOKEN, estimate_tokens
+from symbol_index import parse_symbols
+
+TOOL_HEADER = "You can fetch more context before answering."
+MAX_OUTLINE_ENTRIES = 80  # per file
+MAX_CALLS_PER_STEP = 4
+_SIGNATURE_RE = re.compile(r"^\s*((async\s+)?def|class|(export\s+)?(async\s+)?function|func|(pub\s+)?fn)\s+\w+")
+_HEADING_RE = re.compile(r"^#{1,4}\s+\S")
+_OUTLINE_FILE_RE = re.compile(r"^=== (.+) \(\d+ lines\) ===$", re.MULTILINE)
+# Call parentheses and quoting a model may wrap a symbol name in
+_SYMBOL_NOISE_RE = re.compile(r"\(\)$|[`'\"]")
+
+TOOL_INSTRUCTIONS = (
+    TOOL_HEADER
+    + " The outline below lists files, symbols and line ranges, not their code.\n"
+    "To read code, reply with only tool calls, one JSON object per line:\n"
+    '{"tool": "symbol", "name": "<class, function or Class.method>"}\n'
+    '{"tool": "lines", "file": "<path as listed>", "start": <first line>, "end": <last line>}\n'
+    "{search}"
+    "Request only what you need. When you have enough, reply with the answer and no tool calls."
+)
+_SEARCH_TOOL = '{"tool": "search", "query": "<what to look for>"}\n'
+FINAL_NOTE = "Tool budget used up: answer now from the context above, without tool calls."
+
+
+def tool_context(outline: str, search: bool = False) -> str:
+    """Prompt context for iterative mode: the tool instructions and the outline."""
+    instructions = TOOL_INSTRUCTIONS.replace("{search}", _SEARCH_TOOL if search else "")
+    return f"{instructions}\n\n{outline}"
+
+
+def is_tool_prompt(messages: List[Dict]) -> bool:
+    """True if `messages` were prepared for the iterative loop."""
+    return bool(messages) and messages[-1]["role"] == "user" and TOOL_HEADER in messages[-1]["content"]
+
+
+def outlined_files(messages: List[Dict]) -> List[str]:
+    """Files whose outline is in the prompt, so a later step can search them for symbols."""
+    return _OUTLINE_FILE_RE.findall(messages[-1]["content"]) if messages else []
+
+
+def parse_tool_calls(reply: str) -> List[Dict]:
+    """Tool calls in a model reply: JSON objects with a "tool" key, one per line."""
+    calls = []
+    for line in reply.splitlines():
+        line = line.strip().strip("`").strip()
+        if not (line.startswith("{") and '"tool"' in line):
+            continue
+        try:
+            call = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(call, dict) and isinstance(call.get("tool"), str):
+            calls.append(call)
+    return calls
+
+
+def _strip_tool_calls(reply: str) -> str:
+    kept = []
+    for line in reply.splitlines():
+        if parse_tool_calls(line):
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def file_outline(text: str, suffix: str) -> List[Tuple[int, int, str]]:
+    """(start, end, label) entries for a file: Python symbols, else signatures or headings."""
+    if suffix in (".py", ".pyw"):
+        try:
+            return [
+                (s["start_line"], s["end_line"], f"{'  ' * s['qualname'].count('.')}{s['kind']} {s['qualname']}")
+                for s in parse_symbols(text)
+            ]
+        except (SyntaxError, ValueError):
+            pass
+    pattern = _HEADING_RE if suffix in (".md", ".rst", ".txt") else _SIGNATURE_RE
+    # Numbered like FileCache lines: only "\n" ends a line
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    starts = [i + 1 for i, line in enumerate(lines) if pattern.match(line)]
+    # Each entry runs until the next one
+    ends = [next_start - 1 for next_start in starts[1:]] + [len(lines)]
+    return [(start, end, lines[start - 1].strip()[:100]) for start, end in zip(starts, ends)]
+
+
+def _truncate(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[: cut if cut > 0 else limit] + "\n... (truncated: context budget reached)"
+
+
+class ContextTools:
+    """Resolves tool calls against files under `roots`.
+
+    `symbol_lookup(name)` returns definition rows (file, start_line, end_line,
+    qualname, optionally text) from a symbol index; without one, symbols are
+    found in the `outlined` files. `search(query)` returns retrieval hits.
+    """
+
+    def __init__(
+        self,
+        file_cache,
+        roots: List[Path],
+        symbol_lookup: Optional[Callable[[str], List[Dict]]] = None,
+        search: Optional[Callable[[str], List[Dict]]] = None,
+        max_lines: int = 300,
+        outlined: Optional[List[str]] = None,
+    ):
+        self.file_cache = file_cache
+        self.roots = [Path(root) for root in roots]
+        self.symbol_lookup = symbol_lookup
+        self.search = search
+        self.max_lines = max_lines
+        self.outlined: List[str] = list(outlined or [])
+
+    def resolve(self, file: str) -> Optional[Path]:
+        """Path of a listed file; never outside the roots."""
+        relative = file.replace("\\", "/").lstrip("/")
+        for root in self.roots:
+            path = (root / relative).resolve()
+            try:
+                path.relative_to(root.resolve())
+            except ValueError:
+                continue
+            if path.is_file():
+                return path
+        return None
+
+    def outline(self, files: List[str]) -> str:
+        """Compact outline of whole files: line counts plus symbols and their line ranges."""
+        parts = []
+        for file in files:
+            path = self.resolve(file)
+            if path is None:
+                parts.append(f"=== {file} === (not found)")
+                continue
+            text = self.file_cache.read_text(path)
+            entries = file_outline(text, path.suffix.lower())
+            lines = [f"=== {file} ({self.file_cache.line_count(path)} lines) ==="]
+            lines += [f"{label}  lines {start}-{end}" for start, end, label in entries[:MAX_OUTLINE_ENTRIES]]
+            if len(entries) > MAX_OUTLINE_ENTRIES:
+                lines.append(f"... {len(entries) - MAX_OUTLINE_ENTRIES} more")
+            parts.append("\n".join(lines))
+            self.outlined.append(file)
+        return "\n\n".join(parts)
+
+    def call(self, request: Dict) -> str:
+        """Result text for one tool call (errors are reported to the model, not raised)."""
+        tool = request.get("tool")
+        try:
+            if tool == "symbol":
+                return self._symbol(str(request["name"]))
+            if tool == "lines":
+                return self._lines(str(request["file"]), int(request.get("start", 1)), request.get("end"))
+            if tool == "search" and self.search is not None:
+                return self._search(str(request["query"]))
+        except (KeyError, TypeError, ValueError) as e:
+            return f"[{tool}] invalid call {json.dumps(request)}: {e}"
+        return f"[{tool}] unknown tool; use symbol, lines" + (" or search" if self.search else "")
+
+    def _symbol(self, name: str) -> str:
+        name = _SYMBOL_NOISE_RE.sub("", name.replace("::", ".").replace("#", "."))
+        rows = self._find(name)
+        if not rows:
+            return f"[symbol {name}] not found" + self._owner_hint(name)
+        parts = []
+        for row in rows[:3]:
+            text = row.get("text")
+            if text is None:
+                path = self.resolve(row["file"])
+                if path is None:
+                    continue
+                text = self.file_cache.read_lines(path, row["start_line"], row["end_line"])
+            label = row.get("qualname", name)
+            parts.append(f"=== {row['file']} (lines {row['start_line']}-{row['end_line']}, {label}) ===\n{text}")
+        return "\n\n".join(parts) or f"[symbol {name}] not found"
+
+    def _find(self, name: str) -> List[Dict]:
+        return self.symbol_lookup(name) if self.symbol_lookup else self._outlined_symbol(name)
+
+    def _owner_hint(self, name: str) -> str:
+        """For a missing `Class.member`, where the class is and what it does define."""
+        if "." not in name:
+            return ""
+        owner = name.rsplit(".", 1)[0]
+        rows = [row for row in self._find(owner) if row.get("qualname", owner).endswith(owner.rsplit(".", 1)[-1])]
+        if not rows:
+            return ""
+        row = rows[0]
+        hint = f"; {row.get('qualname', owner)} is in {row['file']} lines {row['start_line']}-{row['end_line']}"
+        path = self.resolve(row["file"])
+        if path is not None and path.suffix.lower() in (".py", ".pyw"):
+            qualname = row.get("qualname", owner)
+            members = [s["name"] for s in self._python_symbols(path) if s["qualname"] == f"{qualname}.{s['name']}"]
+            if members:
+                hint += f" and defines {', '.join(members)}"
+        return hint
+
+    def _python_symbols(self, path: Path) -> List[Dict]:
+        try:
+            return parse_symbols(self.file_cache.read_text(path))
+        except (SyntaxError, ValueError):
+            return []
+
+    def _outlined_symbol(self, name: str) -> List[Dict]:
+        """Definitions in the outlined files, matched like SymbolIndex.lookup.
+
+        A qualified name may also carry the module ("transcript.ChatTranscript.append").
+        """
+        rows = []
+        for file in self.outlined:
+            path = self.resolve(file)
+            if path is None:
+                continue
+            if path.suffix.lower() in (".py", ".pyw"):
+                symbols = self._python_symbols(path)
+                module = Path(file).with_suffix("").as_posix().replace("/", ".")
+                wanted = name
+                for prefix in (module, Path(file).stem):
+                    if name.startswith(prefix + "."):
+                        wanted = name[len(prefix) + 1:]
+                        break
+                matches = [s for s in symbols if s["qualname"] == wanted]
+                if not matches and "." in wanted:
+                    matches = [s for s in symbols if s["qualname"].endswith("." + wanted)]
+                if not matches:
+                    matches = [s for s in symbols if s["name"] == wanted]
+                rows += [{"file": file, **s} for s in matches]
+                if symbols:
+                    continue
+            for start, end in self.file_cache.symbol_ranges(path, [name], context=0):
+                rows.append({"file": file, "start_line": start, "end_line": end, "qualname": name})
+        return rows
+
+    def _lines(self, file: str, start: int, end) -> str:
+        path = self.resolve(file)
+        if path is None:
+            return f"[lines {file}] file not found"
+        start = max(1, start)
+        end = int(end) if end is not None else start + self.max_lines - 1
+        end = min(end, start + self.max_lines - 1, self.file_cache.line_count(path))
+        if end < start:
+            return f"[lines {file}] past the end of the file"
+        return f"=== {file} (lines {start}-{end}) ===\n{self.file_cache.read_lines(path, start, end)}"
+
+    def _search(self, query: str) -> str:
+        hits = self.search(query)
+        if not hits:
+            return f"[search {query}] no results"
+        return hit_outline(hits)
+
+
+def hit_outline(hits: List[Dict]) -> str:
+    """Retrieval hits as an outline: file, line range and the signatures inside each chunk."""
+    parts = []
+    for hit in hits:
+        meta = hit.get("metadata", {})
+        start = meta.get("start_line")
+        lines = hit.get("text", "").splitlines()
+        end = meta.get("end_line") or (start + len(lines) - 1 if isinstance(start, int) else "?")
+        entry = [f"=== {meta.get('file', '?')} (lines {start}-{end}) ==="]
+        for offset, line in enumerate(lines):
+            if _SIGNATURE_RE.match(line):
+                number = f"{start + offset}: " if isinstance(start, int) else ""
+                entry.append(f"{number}{line.strip()[:100]}")
+        parts.append("\n".join(entry))
+    return "\n\n".join(parts)
+
+
+def run_tool_loop(
+    chat: Callable[[List[Dict]], str],
+    messages: List[Dict],
+    tools: ContextTools,
+    max_steps: int = 4,
+    token_budget: int = 4000,
+) -> Tuple[str, Dict]:
+    """Let the model fetch context for up to `max_steps` rounds, then answer.
+
+    Returns the answer and stats: model calls, tool calls, and the context
+    tokens the prompt ended up with (outline plus fetched results).
+    """
+    messages = list(messages)
+    outline_tokens = estimate_tokens(messages[-1]["content"])
+    stats = {"model_calls": 0, "tool_calls": 0, "outline_tokens": outline_tokens, "fetched_tokens": 0}
+    final = max_steps <= 0
+    while True:
+        reply = chat(messages)
+        stats["model_calls"] += 1
+        calls = parse_tool_calls(reply)
+        if not calls:
+            return reply, stats
+        if final:
+            # Still asking after the final note: keep whatever prose came with the calls
+            return _strip_tool_calls(reply) or "Could not gather enough context within the tool budget.", stats
+
+        results = []
+        for call in calls[:MAX_CALLS_PER_STEP]:
+            remaining = token_budget - stats["fetched_tokens"]
+            if remaining <= 0:
+                break
+            text = _truncate(tools.call(call), remaining)
+            stats["tool_calls"] += 1
+            stats["fetched_tokens"] += estimate_tokens(text)
+            results.append(text)
+        content = "Tool results:\n\n" + "\n\n".join(results or ["(none)"])
+        final = stats["model_calls"] >= max_steps or stats["fetched_tokens"] >= token_budget
+        if final:
+            content += f"\n\n{FINAL_NOTE}"
+        messages += [{"role": "assistant", "content": reply}, {"role": "user", "content": content}]
+
+
+def describe(stats: Dict) -> str:
+    return (
+        f"🧰 Iterative context: {stats['model_calls']} model calls, {stats['tool_calls']} tool calls, "
+        f"~{stats['outline_tokens'] + stats['fetched_tokens']} context tokens "
+        f"(outline ~{stats['outline_tokens']}, fetched ~{stats['fetched_tokens']})"
+    )
+
+
+class ScriptedModel:
+    """Stand-in chat model that replays fixed replies and records the prompts it saw.
+
+    Drives `run_tool_loop` without an Ollama server, e.g. to check a prompt
+    outline or the token budget.
+    """
+
+    def __init__(self, replies: List[str]):
+        self.replies = list(replies)
+        self.prompts: List[List[Dict]] = []
+
+    def __call__(self, messages: List[Dict]) -> str:
+        self.prompts.append([dict(message) for message in messages])
+        return self.replies.pop(0) if self.replies else ""
@@ -0,0 +1,247 @@
+"""
+Conversational Retrieval
+Multi-turn chat on top of IndexedAssistant. Follow-up questions are rewritten
+into standalone search queries, and every chunk sent to the model joins a
+per-session working set under a short label ([C1], [C2], ...). Later turns
+send only chunks the model has not seen and refer to the rest by label, so
+the per-turn prompt stays flat and earlier turns remain a reusable prefix.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Set
+
+import ollama
+
+from assistant_core import client_timeout, stream_chat
+from prompts import order_context_blocks
+from runtime_config import get_config
+
+# Words that refer back to an earlier subject
+_PRONOUNS = {"it", "its", "they", "them", "their", "theirs", "one", "ones"}
+_DEMONSTRATIVES = {"this", "that", "these", "those"}
+# After a demonstrative these mean it stands alone ("what does that do"), not "that config"
+_NON_NOUNS = {
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "has", "have", "had", "can", "could",
+    "will", "would", "should", "may", "might", "must", "work", "works", "mean", "means", "return",
+    "returns", "get", "gets", "happen", "happens", "call", "calls", "one", "ones", "for", "in", "on",
+    "to", "with", "from", "of", "at", "by", "and", "or", "but", "so", "too", "also", "again", "instead",
+}
+_LEADS = ("what about ", "how about ", "and ", "same for ", "also ")
+_WORD_RE = re.compile(r"[A-Za-z_][\w.]*")
+# Identifiers give a question its own subject: snake_case, dotted.names, CamelCase, calls, `code`
+_IDENTIFIER_RE = re.compile(r"`[^`]+`|\w+\(|\b\w+_\w+|\b\w+\.\w+|\b[a-z]+[A-Z]\w*|\b[A-Z][a-z]+[A-Z]\w*")
+
+
+def is_follow_up(question: str) -> bool:
+    """True if `question` refers back to an earlier subject and names none of its own."""
+    if _IDENTIFIER_RE.search(question):
+        return False
+    text = question.strip().lower()
+    if text.startswith(_LEADS):
+        return True
+    words = [word.lower() for word in _WORD_RE.findall(question)]
+    for i, word in enumerate(words):
+        if word in _PRONOUNS:
+            return True
+        if word in _DEMONSTRATIVES and (i + 1 == len(words) or words[i + 1] in _NON_NOUNS):
+            return True
+    return False
+
+
+REWRITE_PROMPT = """Rewrite the last question as a standalone search query for a codebase.
+Keep identifiers exactly as written. Reply with the query only.
+
+Earlier questions:
+{history}
+
+Last question: {question}"""
+
+
+class ChatTurn:
+    """A question with its standalone query and prefetched context blocks."""
+
+    def __init__(self, question: str, search_query: str, blocks: List[Dict], direct: Optional[str] = None):
+        self.question = question
+        self.search_query = search_query
+        self.blocks = blocks
+        self.direct = direct  # symbol-table answer, no model call needed
+
+
+class ConversationalAssistant:
+    """Chat mode around an IndexedAssistant, usable wherever prepare/generate is.
+
+    `prepare` only retrieves (so a queue may prefetch it); the working-set
+    diff and history are applied in `generate`, after earlier turns finished.
+    """
+
+    def __init__(self, assistant, max_turns: int = 6, rewrite: str = "heuristic"):
+        self.assistant = assistant
+        self.max_turns = max_turns
+        self.rewrite = rewrite  # "heuristic" or "model"
+        self._lock = threading.Lock()
+        self._questions: List[str] = []  # submitted questions, for rewriting
+        self._topic = ""
+        self.reset()
+
+    @classmethod
+    def from_config(cls, assistant) -> "ConversationalAssistant":
+        chat = assistant.config.get("chat", {}) or {}
+        conversation = cls(assistant, max_turns=int(chat.get("max_turns", 6)), rewrite=chat.get("rewrite", "heuristic"))
+        get_config().subscribe(conversation.apply_config)
+        return conversation
+
+    def apply_config(self, config: Dict, changed: Set[str]):
+        """Pick up chat settings from a reloaded config.yaml (the assistant subscribes itself)."""
+        chat = config.get("chat", {}) or {}
+        self.max_turns = int(chat.get("max_turns", self.max_turns))
+        self.rewrite = chat.get("rewrite", self.rewrite)
+
+    # The GUI switches models on whatever assistant it holds
+    @property
+    def model(self) -> str:
+        return self.assistant.model
+
+    @model.setter
+    def model(self, value: str):
+        self.assistant.model = value
+
+    def reset(self):
+        """Start a new conversation."""
+        with self._lock:
+            self.turns: List[Dict] = []  # {user, assistant, chunk_ids}
+            self.labels: Dict[str, str] = {}  # chunk id -> label
+            self._next_label = 1
+            self.turn_count = 0
+            self._questions = []
+            self._topic = ""
+            self.last_turn: Dict = {}
+
+    # ---------- Query rewriting ----------
+
+    def rewrite_query(self, question: str) -> str:
+        """Standalone search query for a possibly elliptical follow-up."""
+        if not self._questions:
+            return question
+        if self.rewrite == "model":
+            try:
+                history = "\n".join(f"- {q}" for q in self._questions[-3:])
+                response = ollama.Client(host=self.assistant.host, timeout=client_timeout(self.assistant.timeout)).generate(
+                    model=self.assistant.model,
+                    prompt=REWRITE_PROMPT.format(history=history, question=question),
+                    options={"num_predict": 48, "temperature": 0},
+                    keep_alive=self.assistant.keep_alive,
+                )
+                rewritten = response["response"].strip().strip('"').splitlines()[0]
+                if rewritten:
+                    return rewritten
+            except Exception as e:
+                print(f"⚠️ Query rewrite failed, using heuristic: {e}")
+        return f"{self._topic} {question}" if self._topic and is_follow_up(question) else question
+
+    # ---------- prepare / generate ----------
+
+    def prepare(self, question: str, files: Optional[List[str]] = None) -> ChatTurn:
+        self.assistant.refresh_index()
+        direct = self.assistant.answer_lookup(question)
+        if direct is not None:
+            return ChatTurn(question, question, [], direct=direct)
+
+        search_query = self.rewrite_query(question)
+        if not is_follow_up(question):
+            self._topic = question
+        self._questions = self._questions[-9:] + [question]
+        return ChatTurn(question, search_query, self.assistant.context_blocks(search_query, files=files))
+
+    def generate(self, turn: ChatTurn, cancel_event=None, register_abort=None) -> str:
+        if turn.direct is not None:
+            self.last_turn = {}
+            self._commit(turn.question, turn.direct, {})
+            return turn.direct
+
+        messages, new_labels = self.build_messages(turn)
+        stats = {}
+        # Background indexing pauses while the model is answering
+        with self.assistant.activity.busy():
+            answer = stream_chat(
+                self.assistant.model,
+                messages,
+                host=self.assistant.host,
+                cancel_event=cancel_event,
+                register_abort=register_abort,
+                keep_alive=self.assistant.keep_alive,
+                stats=stats,
+                options=self.assistant.options,
+                timeout=self.assistant.timeout,
+            )
+        self.assistant.prefill.record(messages, stats)
+        self._commit(messages[-1]["content"], answer, new_labels)
+        return answer
+
+    def query(self, question: str, files: Optional[List[str]] = None) -> str:
+        return self.generate(self.prepare(question, files=files))
+
+    def build_messages(self, turn: ChatTurn):
+        """History plus a user message carrying only unseen chunks. Returns (messages, new labels)."""
+        with self._lock:
+            # Make room first so chunks from the dropped turn are sent again, not referenced
+            self._trim(self.max_turns - 1)
+
+            new_blocks, seen = [], []
+            for block in turn.blocks:
+                (seen if block["id"] in self.labels else new_blocks).append(block)
+            # Dedupe repeated hits within the turn
+            unique = {block["id"]: block for block in new_blocks}
+            new_blocks = order_context_blocks(list(unique.values()))
+
+            labels = {}
+            for block in new_blocks:
+                labels[block["id"]] = f"C{self._next_label + len(labels)}"
+
+            context = ""
+            for block in new_blocks:
+                context += f"\n\n=== [{labels[block['id']]}] {block['file']} ({block['header']}) ===\n{block['text']}"
+            if seen:
+                refs = ", ".join(
+                    f"[{self.labels[b['id']]}] {b['file']} ({b['header']})"
+                    for b in order_context_blocks(list({b["id"]: b for b in seen}.values()))
+                )
+                context += f"\n\nAlready provided earlier in this conversation: {refs}"
+
+            prompt = self.assistant.prompt
+            user = prompt.user_template.format(app_name=prompt.app_name, context=context, question=turn.question)
+            history = []
+            for past in self.turns:
+                history.append({"role": "user", "content": past["user"]})
+                history.append({"role": "assistant", "content": past["assistant"]})
+            messages = [{"role": "system", "content": prompt.system}, *history, {"role": "user", "content": user}]
+
+            self.last_turn = {
+                "search_query": turn.search_query,
+                "new_chunks": len(new_blocks),
+                "referenced_chunks": len(seen),
+                "new_chars": len(user),
+            }
+            return messages, labels
+
+    def _commit(self, user: str, answer: str, new_labels: Dict[str, str]):
+        with self._lock:
+            for chunk_id, label in new_labels.items():
+                self.labels[chunk_id] = label
+            self._next_label += len(new_labels)
+            self.turns.append({"user": user, "assistant": answer, "chunk_ids": list(new_labels)})
+            self.turn_count += 1
+            # Direct answers skip build_messages, so trim here as well
+            self._trim(self.max_turns)
+        if self.last_turn:
+            print(
+                f"💬 Turn {self.turn_count}: {self.last_turn.get('new_chunks', 0)} new chunks, "
+                f"{self.last_turn.get('referenced_chunks', 0)} referenced"
+            )
+
+    def _trim(self, keep: int):
+        """Drop the oldest turns (caller holds the lock); their chunks leave the working set."""
+        while len(self.turns) > max(keep, 0):
+            dropped = self.turns.pop(0)
+            for chunk_id in dropped["chunk_ids"]:
+                self.labels.pop(chunk_id, None)
@@ -0,0 +1,210 @@
+"""
+Shared File Content Cache
+Byte-bounded LRU cache of source files with mtime/size validation and
+line-offset indexes for cheap line-range reads.
+"""
+
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_DEFINITION_RE = r"^([ \t]*)(?:async[ \t]+)?(?:def|class)[ \t]+{name}\b"
+_IDENTIFIER_RE = re.compile(r"`([A-Za-z_][\w.]*)`|\b([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+|[A-Z][a-z0-9]+[A-Z]\w*)\b")
+
+
+class _Entry:
+    __slots__ = ("mtime_ns", "size", "offsets", "data")
+
+    def __init__(self, mtime_ns: int, size: int, offsets: array, data: Optional[bytes]):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = offsets  # byte offset of the start of every line
+        self.data = data  # whole file, or None when it is too large to keep
+
+    @property
+    def cost(self) -> int:
+        return self.offsets.itemsize * len(self.offsets) + (len(self.data) if self.data else 0)
+
+
+class FileCache:
+    """LRU cache of file contents bounded by total bytes.
+
+    Entries are revalidated against the file's mtime and size on every access.
+    Files larger than `max_file_bytes` only keep their line-offset index, and
+    line ranges are read by seeking straight to the first requested line.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_file_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- Public API ----------
+
+    def read_lines(self, path, start: int = 1, end: Optional[int] = None) -> str:
+        """Return lines `start`..`end` (1-based, inclusive) of a file."""
+        path = str(path)
+        entry = self._get(path)
+        line_count = len(entry.offsets)
+        start = max(1, start)
+        end = line_count if end is None else min(end, line_count)
+        if start > end:
+            return ""
+
+        begin = entry.offsets[start - 1]
+        stop = entry.offsets[end] if end < line_count else entry.size
+        if entry.data is not None:
+            raw = entry.data[begin:stop]
+        else:
+            with open(path, "rb") as f:
+                f.seek(begin)
+                raw = f.read(stop - begin)
+        return raw.decode("utf-8", errors="replace")
+
+    def read_text(self, path) -> str:
+        return self.read_lines(path)
+
+    def line_count(self, path) -> int:
+        return len(self._get(str(path)).offsets)
+
+    def symbol_ranges(self, path, names: Iterable[str], context: int = 3) -> List[Tuple[int, int]]:
+        """Line ranges of the `def`/`class` blocks defining any of `names`.
+
+        Dotted names match on their last component. Overlapping ranges are
+        merged and returned in file order.
+        """
+        wanted = {name.split(".")[-1] for name in names if name}
+        if not wanted:
+            return []
+        text = self.read_text(path)
+        # Split on "\n" only, like the line offsets; splitlines() also breaks on \f, \v, \u2028 ...
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        pattern = re.compile(
+            _DEFINITION_RE.format(name="(?:" + "|".join(map(re.escape, sorted(wanted))) + ")"),
+            re.MULTILINE,
+        )
+
+        ranges: List[Tuple[int, int]] = []
+        for match in pattern.finditer(text):
+            first = text.count("\n", 0, match.start()) + 1
+            indent = len(match.group(1).expandtabs())
+            last = first
+            for number in range(first + 1, len(lines) + 1):
+                line = lines[number - 1]
+                if not line.strip():
+                    continue
+                if len(line) - len(line.lstrip()) <= indent:
+                    break
+                last = number
+            ranges.append((max(1, first - context), min(len(lines), last + context)))
+        return _merge_ranges(ranges)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(str(path), None)
+            if entry is not None:
+                self._bytes -= entry.cost
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # ---------- Internals ----------
+
+    def _get(self, path: str) -> _Entry:
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns and entry.size == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._load(path, st)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.cost
+            if entry.cost <= self.max_bytes:
+                self._entries[path] = entry
+                self._bytes += entry.cost
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.cost
+        return entry
+
+    def _load(self, path: str, st: os.stat_result) -> _Entry:
+        offsets = array("Q", [0])
+        keep = st.st_size <= self.max_file_bytes
+        chunks = []
+        position = 0
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                if keep:
+                    chunks.append(block)
+                index = block.find(b"\n")
+                while index != -1:
+                    offsets.append(position + index + 1)
+                    index = block.find(b"\n", index + 1)
+                position += len(block)
+        # A trailing newline does not start another line
+        if len(offsets) > 1 and offsets[-1] == position:
+            offsets.pop()
+        if position == 0:
+            offsets = array("Q")
+        data = b"".join(chunks) if keep else None
+        return _Entry(st.st_mtime_ns, position, offsets, data)
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def mentioned_symbols(text: str) -> List[str]:
+    """Identifiers a question refers to: `backticked`, dotted or CamelCase names."""
+    names = []
+    for quoted, bare in _IDENTIFIER_RE.findall(text):
+        name = quoted or bare
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+_shared_cache: Optional[FileCache] = None
+
+
+def get_file_cache() -> FileCache:
+    """Process-wide cache shared by all assistants."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = FileCache()
+    return _shared_cache
@@ -290,7 +290,7 @@ This wizard will help you set up everything in less than 2 minutes.
         # Download model button
         self.download_model_btn = ctk.CTkButton(
             content,
-            text="Download Recommended Model (qwen2.5-coder:3b)",
+            text=f"Download Recommended Model ({self.backend.get_recommended_model()})",
             command=self._download_recommended_model,
             fg_color=BUTTON_COLOR,
             hover_color=BUTTON_HOVER,
@@ -719,9 +719,14 @@ This wizard will help you set up everything in less than 2 minutes.
     
     def _check_dependencies_thread(self):
         """Background thread to check dependencies."""
-        # Check Ollama
         self.after(0, lambda: self.ollama_status.configure(text="⏳ Checking Ollama..."))
-        ollama_ok, ollama_msg = self.backend.check_ollama_installed()
+        self.after(0, lambda: self.packages_status.configure(text="⏳ Checking Python packages..."))
+        self.after(0, lambda: self.models_status.configure(text="⏳ Detecting Ollama models..."))
+        # Runs once per session; revisiting this screen reuses the results
+        env = self.backend.check_environment()
+        
+        # Check Ollama
+        ollama_ok, ollama_msg = env['ollama']
         
         if ollama_ok:
             self.after(0, lambda: self.ollama_status.configure(
@@ -735,8 +740,7 @@ This wizard will help you set up everything in less than 2 minutes.
             ))
         
         # Check Python packages
-        self.after(0, lambda: self.packages_status.configure(text="⏳ Checking Python packages..."))
-        packages_ok, missing = self.backend.check_python_packages()
+        packages_ok, missing = env['packages']
         
         if packages_ok:
             self.after(0, lambda: self.packages_status.configure(
@@ -752,9 +756,8 @@ This wizard will help you set up everything in less than 2 minutes.
             self.after(0, lambda: self.install_packages_btn.grid())
         
         # Check models
-        self.after(0, lambda: self.models_status.configure(text="⏳ Detecting Ollama models..."))
         if ollama_ok:
-            models = self.backend.get_installed_models()
+            models = env['models']
             
             if models:
                 models_str = ", ".join(models)
@@ -813,6 +816,7 @@ This wizard will help you set up everything in less than 2 minutes.
     def _download_recommended_model(self):
         """Download the recommended model."""
         self.download_model_btn.configure(state="disabled")
+        self.progress_bar.configure(mode="indeterminate")
         self.progress_bar.grid()
         self.progress_bar.start()
         
@@ -821,11 +825,18 @@ This wizard will help you set up everything in less than 2 minutes.
     def _download_model_thread(self):
         """Background thread to download model."""
         model_name = self.backend.get_recommended_model()
+        # Finish any downloads a previous run left behind alongside it
+        models = [model_name] + [m for m in self.backend.interrupted_downloads() if m != model_name]
         
         def progress_callback(msg):
             self.after(0, lambda: self.progress_label.configure(text=msg))
+
+        def on_progress(overall):
+            if overall["total"]:
+                self.after(0, lambda: self._show_download_fraction(overall["fraction"]))
         
-        success, message = self.backend.download_model(model_name, progress_callback)
+        results = self.backend.download_models(models, progress_callback, on_progress)
+        success, message = results[model_name]
         
         self.after(0, lambda: self.progress_bar.stop())
         self.after(0, lambda: self.progress_bar.grid_remove())
@@ -840,7 +851,9 @@ This wizard will help you set up everything in less than 2 minutes.
             # Add to available models
             if not hasattr(self, 'available_models'):
                 self.available_models = []
-            self.available_models.append(model_name)
+            for name, (ok, _) in results.items():
+                if ok and name not in self.available_models:
+                    self.available_models.append(name)
         else:
             self.after(0, lambda: self.progress_label.configure(
                 text=f"❌ {message}",
@@ -848,6 +861,13 @@ This wizard will help you set up everything in less than 2 minutes.
             ))
             self.after(0, lambda: self.download_model_btn.configure(state="normal"))
     
+    def _show_download_fraction(self, fraction: float):
+        """Switch the progress bar to real download progress."""
+        if self.progress_bar.cget("mode") != "determinate":
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(fraction)
+    
     def _browse_knowledge_base(self):
         """Browse for knowledge base folder."""
         folder = filedialog.askdirectory(
@@ -923,7 +943,11 @@ Setup will:
     
     def _finish_setup_thread(self):
         """Background thread to finish setup."""
-        # Step 1: Create config
+        # Step 1: Size the model profile for this machine, then create config
+        self.after(0, lambda: self.final_status.configure(
+            text="Measuring hardware and model speed...",
+            text_color=MUTED_COLOR
+        ))
         success, message = self.backend.create_config(
             self.config_data['app_name'],
             self.config_data['knowledge_base_path'],
@@ -0,0 +1,124 @@
+"""
+Git Change Detection
+Uses git to list the files to index and to find what changed since the
+commit an index was built from, so updates and branch overlays cost the
+size of the diff instead of a walk and hash of the whole tree.
+"""
+
+import hashlib
+import re
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Set
+
+MAX_COLLECTION_NAME = 63  # Chroma's limit
+VERSION_SUFFIX_LEN = 21  # "__YYYYmmddHHMMSS_xxxx" added by version_name()
+
+
+def _git(cwd, *args) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=str(cwd), capture_output=True, text=True, encoding="utf-8", check=True
+    ).stdout
+
+
+def repo_root(path) -> Optional[Path]:
+    """Top of the git work tree containing `path`, or None outside a repository."""
+    try:
+        return Path(_git(path, "rev-parse", "--show-toplevel").strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def head_commit(root) -> Optional[str]:
+    try:
+        return _git(root, "rev-parse", "HEAD").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None  # no commits yet
+
+
+def _git_dir(root: Path) -> Path:
+    dot_git = Path(root) / ".git"
+    if dot_git.is_file():
+        # Worktrees and submodules: ".git" points at the real git dir
+        target = dot_git.read_text(encoding="utf-8").strip().split("gitdir:", 1)[1].strip()
+        return (Path(root) / target).resolve()
+    return dot_git
+
+
+def current_branch(root) -> Optional[str]:
+    """Checked-out branch (short commit when detached), read from HEAD without running git.
+
+    Cheap enough to call before every search.
+    """
+    try:
+        head = (_git_dir(Path(root)) / "HEAD").read_text(encoding="utf-8").strip()
+    except (OSError, IndexError):
+        return None
+    if head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/") :]
+    return head[:12] or None
+
+
+def default_branch(root) -> str:
+    """origin's default branch if known, else "main" or "master"."""
+    try:
+        ref = _git(root, "symbolic-ref", "--quiet", "refs/remotes/origin/HEAD").strip()
+        return ref.rsplit("/", 1)[-1]
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    for name in ("main", "master"):
+        try:
+            _git(root, "rev-parse", "--verify", "--quiet", f"refs/heads/{name}")
+            return name
+        except (OSError, subprocess.CalledProcessError):
+            continue
+    return "main"
+
+
+def _matches(rel: str, patterns: List[str]) -> bool:
+    path = Path(rel)
+    return any(path.match(pattern) for pattern in patterns)
+
+
+def tracked_files(base_dir, patterns: List[str]) -> List[Path]:
+    """Files under `base_dir` git tracks or would track (tracked + untracked, minus ignored)."""
+    out = _git(base_dir, "ls-files", "-z", "--cached", "--others", "--exclude-standard")
+    files = {Path(base_dir) / rel for rel in out.split("\0") if rel and _matches(rel, patterns)}
+    # --cached still lists tracked files deleted from the work tree
+    return sorted(path for path in files if path.is_file())
+
+
+def changed_files(base_dir, since: str, patterns: List[str]) -> Optional[Set[Path]]:
+    """Files under `base_dir` added, modified or deleted since commit `since`.
+
+    Compares against the work tree, so uncommitted edits count. Returns None
+    when `since` is not in the repository any more (e.g. after a rebase and
+    gc); callers then fall back to a full build.
+    """
+    try:
+        _git(base_dir, "cat-file", "-e", f"{since}^{{commit}}")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    diff = _git(base_dir, "diff", "--name-only", "-z", "--no-renames", "--relative", since, "--", ".")
+    untracked = _git(base_dir, "ls-files", "-z", "--others", "--exclude-standard")
+    names = [rel for rel in (diff + untracked).split("\0") if rel]
+    return {Path(base_dir) / rel for rel in names if _matches(rel, patterns)}
+
+
+def dirty_files(base_dir, patterns: List[str]) -> Set[Path]:
+    """Files under `base_dir` with uncommitted edits, deletions, or untracked.
+
+    An index built from the work tree records these next to HEAD: their
+    indexed content matches no commit, so the next update must re-index them
+    even if the edits were reverted in the meantime.
+    """
+    return changed_files(base_dir, "HEAD", patterns) or set()
+
+
+def overlay_name(collection: str, branch: str) -> str:
+    """Logical collection for a branch's overlay, short enough for versioned names."""
+    digest = hashlib.md5(branch.encode("utf-8")).hexdigest()[:6]
+    prefix = f"{collection}__br_"
+    room = MAX_COLLECTION_NAME - VERSION_SUFFIX_LEN - len(prefix) - len(digest) - 1
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", branch).strip("-")[: max(room, 0)]
+    return f"{prefix}{slug}_{digest}" if slug else f"{prefix}{digest}"
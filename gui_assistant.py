@@ -6,10 +6,14 @@ GUI wrapper around LLMAssistant with Thurtea.com-inspired dark minimal design.
 import customtkinter as ctk
 import tkinter as tk
 from pathlib import Path
-import threading
-import yaml
+import time
+from collections import deque
 from PIL import Image, ImageTk
 from assistant_core import LLMAssistant
+from query_profiler import QueryProfiler
+from query_queue import QueryQueue
+from runtime_config import get_config
+from transcript import ChatTranscript
 
 # ---- Thurtea Brand Palette ----
 THURTEA_BG = "#0a0a0a"          # Overall background
@@ -22,6 +26,11 @@ THURTEA_ACCENT = "#d4d4d4"      # Light accent (lines, subtle highlights)
 THURTEA_BUTTON = "#1f1f1f"      # Buttons
 THURTEA_BUTTON_HOVER = "#2a2a2a"
 
+# ---- Transcript rendering ----
+RENDER_CHUNK_CHARS = 2000       # Characters inserted per widget call
+RENDER_FRAME_BUDGET = 0.008     # Seconds of inserting per main-loop tick
+TRANSCRIPT_WINDOW = 40          # Messages kept rendered per panel
+
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")  # We override with custom colors
 
@@ -30,9 +39,12 @@ class ThurteaAssistantApp(ctk.CTk):
     def __init__(self):
         super().__init__()
 
-        # Load config
-        with open("config.yaml", "r", encoding="utf-8") as f:
-            self.config = yaml.safe_load(f)
+        # Load config (validated once and shared with the assistants; edits apply live)
+        runtime = get_config()
+        runtime.require("models.default", "models.fast", "codebase.path", "context.context_window")
+        self.config = runtime.data
+        if Path("config.yaml").exists() and Path("config.yaml").resolve() != runtime.path:
+            print(f"⚠️ Ignoring ./config.yaml; settings are read from {runtime.path}")
 
         # Core assistant selection (indexed preferred if available)
         index_path = Path("./chroma_db")
@@ -44,9 +56,16 @@ class ThurteaAssistantApp(ctk.CTk):
                 self.assistant = IndexedAssistant(
                     model=self.config["models"]["default"],
                     index_path=str(index_path),
+                    top_k=(self.config.get("retrieval", {}) or {}).get("top_k", 3),
                 )
                 self.indexed_mode = True
                 print("✅ Using indexed search (fast mode)")
+                if (self.config.get("chat", {}) or {}).get("enabled", False):
+                    from conversation import ConversationalAssistant
+
+                    # Follow-ups keep earlier turns and only send new chunks
+                    self.assistant = ConversationalAssistant.from_config(self.assistant)
+                    print("💬 Conversational retrieval enabled")
             except Exception as e:
                 print(f"⚠️ Indexed load failed, falling back: {e}")
                 self.assistant = LLMAssistant(
@@ -62,20 +81,14 @@ class ThurteaAssistantApp(ctk.CTk):
             )
             print("⚠️ Using direct file access (run index_codebase.py for speed)")
 
-        import yaml
-        from pathlib import Path
-
-        config_path = Path(__file__).parent / "config.yaml"
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-
         # Window configuration
-        self.title(config.get("assistant", {}).get("name", "Universal Knowledge Assistant"))
+        self.title(self.config.get("assistant", {}).get("name", "Universal Knowledge Assistant"))
         self.geometry("1100x700")
         self.minsize(900, 600)
         self.configure(fg_color=THURTEA_BG)
 
         self._status_flash_token = None
+        self._closing = False  # set once the window starts closing; worker callbacks are dropped
 
         # Window icon (favicon)
         try:
@@ -88,9 +101,20 @@ class ThurteaAssistantApp(ctk.CTk):
 
         # State
         self.selected_files = []  # relative paths from ../aethermud-code
+        self.query_queue = QueryQueue(
+            self.assistant,
+            on_result=lambda job, answer: self._call_soon(lambda: self._on_query_result(job, answer)),
+            on_error=lambda job, e: self._call_soon(lambda: self._on_query_error(job, e)),
+            on_change=lambda: self._call_soon(self._refresh_queue_status),
+            profiler=QueryProfiler.from_config(self.config),
+        )
 
         # Layout
         self._build_layout()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        runtime.subscribe(lambda config, changed: self._call_soon(lambda: self._on_config_change(config, changed)))
+        runtime.watch()
 
     # ---------- Layout ----------
 
@@ -146,6 +170,7 @@ class ThurteaAssistantApp(ctk.CTk):
         nav.grid_columnconfigure(0, weight=1)
         nav.grid_columnconfigure(1, weight=0)
         nav.grid_columnconfigure(2, weight=0)
+        nav.grid_columnconfigure(3, weight=0)
 
         # Left: thin accent line (visual separator, like your site)
         line = ctk.CTkLabel(
@@ -153,6 +178,19 @@ class ThurteaAssistantApp(ctk.CTk):
         )
         line.grid(row=0, column=0, sticky="ew", pady=(10, 10), padx=(0, 20))
 
+        # New conversation (only meaningful in chat mode)
+        if hasattr(self.assistant, "reset"):
+            new_chat_btn = ctk.CTkButton(
+                nav,
+                text="New Chat",
+                command=self._on_new_chat,
+                fg_color=THURTEA_BUTTON,
+                hover_color=THURTEA_BUTTON_HOVER,
+                text_color=THURTEA_TEXT,
+                width=90,
+            )
+            new_chat_btn.grid(row=0, column=1, padx=(0, 10), sticky="e")
+
         # Model selector
         self.model_var = ctk.StringVar(value=self.config["models"]["default"])
         model_menu = ctk.CTkOptionMenu(
@@ -169,7 +207,7 @@ class ThurteaAssistantApp(ctk.CTk):
             button_hover_color=THURTEA_BUTTON_HOVER,
             text_color=THURTEA_TEXT,
         )
-        model_menu.grid(row=0, column=1, padx=(0, 10), sticky="e")
+        model_menu.grid(row=0, column=2, padx=(0, 10), sticky="e")
 
         # Status
         self.status_label = ctk.CTkLabel(
@@ -178,7 +216,7 @@ class ThurteaAssistantApp(ctk.CTk):
             font=("Inter", 11),
             text_color=THURTEA_MUTED,
         )
-        self.status_label.grid(row=0, column=2, sticky="e")
+        self.status_label.grid(row=0, column=3, sticky="e")
 
     def _build_body(self):
         body = ctk.CTkFrame(self, fg_color=THURTEA_BG)
@@ -330,6 +368,16 @@ class ThurteaAssistantApp(ctk.CTk):
         )
         self.context_label.grid(row=1, column=0, sticky="w")
 
+        # Queued questions with their positions
+        self.queue_label = ctk.CTkLabel(
+            input_frame,
+            text="",
+            font=("Inter", 10),
+            text_color=THURTEA_MUTED,
+            justify="left",
+        )
+        self.queue_label.grid(row=2, column=0, columnspan=2, sticky="w")
+
         # Right bottom: buttons (stacked visually)
         buttons_frame = ctk.CTkFrame(input_frame, fg_color=THURTEA_BG)
         buttons_frame.grid(row=1, column=1, sticky="e")
@@ -356,6 +404,18 @@ class ThurteaAssistantApp(ctk.CTk):
         )
         self.send_button.grid(row=0, column=1)
 
+        self.cancel_button = ctk.CTkButton(
+            buttons_frame,
+            text="Cancel",
+            command=self._on_cancel_clicked,
+            fg_color=THURTEA_BUTTON,
+            hover_color=THURTEA_BUTTON_HOVER,
+            text_color=THURTEA_TEXT,
+            width=80,
+            state="disabled",
+        )
+        self.cancel_button.grid(row=0, column=2, padx=(8, 0))
+
     # ---------- Helpers ----------
 
     def _set_status(self, text: str, level: str = "info"):
@@ -375,11 +435,71 @@ class ThurteaAssistantApp(ctk.CTk):
         return text
 
     def _append_to_box(self, textbox: ctk.CTkTextbox, content: str, text_color: str):
-        """Append text to a specific textbox."""
+        """Append text to a specific textbox.
+
+        The message is stored in the box's transcript and rendered in chunks
+        from the main loop, so long answers never block a frame.
+        """
+        message_id = textbox._transcript.append(content)
+        self._queue_render(textbox, message_id, prepend=False)
+
+    def _queue_render(self, textbox: ctk.CTkTextbox, message_id: int, prepend: bool):
+        content = textbox._transcript.get(message_id)["content"] + "\n\n"
+        chunks = ChatTranscript.split_chunks(content, RENDER_CHUNK_CHARS)
+        tag = f"msg{message_id}"
+        if prepend:
+            # Inserting at the top in reverse keeps the chunks in order
+            for chunk in reversed(chunks):
+                textbox._render_queue.append(("1.0", chunk, tag))
+        else:
+            for chunk in chunks:
+                textbox._render_queue.append(("end", chunk, tag))
+        if not textbox._render_scheduled:
+            textbox._render_scheduled = True
+            self.after_idle(lambda: self._flush_render(textbox))
+
+    def _flush_render(self, textbox: ctk.CTkTextbox):
+        """Insert queued chunks until the frame budget is spent."""
+        queue = textbox._render_queue
+        follow = textbox.yview()[1] >= 0.999
+        deadline = time.perf_counter() + RENDER_FRAME_BUDGET
         textbox.configure(state="normal")
-        textbox.insert("end", content + "\n\n")
+        try:
+            while queue and time.perf_counter() < deadline:
+                index, chunk, tag = queue.popleft()
+                textbox.insert(index, chunk, tag)
+        finally:
+            textbox.configure(state="disabled")
+
+        if queue:
+            self.after(1, lambda: self._flush_render(textbox))
+        else:
+            textbox._render_scheduled = False
+            if follow:
+                self._trim_box(textbox)
+        if follow:
+            textbox.see("end")
+
+    def _trim_box(self, textbox: ctk.CTkTextbox):
+        """Drop the oldest rendered messages once the window is exceeded."""
+        textbox.configure(state="normal")
+        for message_id in textbox._transcript.trim():
+            tag = f"msg{message_id}"
+            ranges = textbox.tag_ranges(tag)
+            if ranges:
+                textbox.delete(ranges[0], ranges[-1])
+            textbox.tag_delete(tag)
         textbox.configure(state="disabled")
-        textbox.see("end")
+
+    def _on_box_scroll(self, textbox: ctk.CTkTextbox):
+        """Render a page of older messages when scrolled to the top."""
+        transcript = textbox._transcript
+        if textbox._render_queue or not transcript.has_older():
+            return
+        if textbox.yview()[0] > 0.0:
+            return
+        for message_id in transcript.older_page():
+            self._queue_render(textbox, message_id, prepend=True)
 
     def _append_user(self, message: str):
         self._append_to_box(self.user_box, message, THURTEA_TEXT)
@@ -387,6 +507,9 @@ class ThurteaAssistantApp(ctk.CTk):
     def _append_assistant(self, message: str):
         self._append_to_box(self.assistant_box, message, THURTEA_TEXT)
 
+    def _append_system(self, message: str):
+        self._append_to_box(self.assistant_box, message, THURTEA_MUTED)
+
     def _flash_status(self, text: str, level: str = "info", duration_ms: int = 1200):
         previous_text = self.status_label.cget("text")
         previous_color = self.status_label.cget("text_color")
@@ -404,6 +527,9 @@ class ThurteaAssistantApp(ctk.CTk):
         """Initialize interactions for a textbox (selection, copy, context menu)."""
         # Configure selection visuals using the underlying text widget
         text_widget = textbox._textbox
+        textbox._transcript = ChatTranscript(window_size=TRANSCRIPT_WINDOW)
+        textbox._render_queue = deque()
+        textbox._render_scheduled = False
         text_widget.configure(
             selectbackground="#2d2d2d",
             selectforeground=THURTEA_TEXT,
@@ -417,6 +543,12 @@ class ThurteaAssistantApp(ctk.CTk):
         textbox.bind("<Control-c>", lambda e: self._on_copy(e, textbox))
         textbox.bind("<Control-C>", lambda e: self._on_copy(e, textbox))
         textbox.bind("<Button-3>", lambda e: self._show_context_menu(e, textbox))
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Prior>", "<Control-Home>"):
+            text_widget.bind(
+                sequence,
+                lambda e: self.after_idle(lambda: self._on_box_scroll(textbox)),
+                add="+",
+            )
 
         # Create context menu for this textbox
         context_menu = tk.Menu(
@@ -441,10 +573,28 @@ class ThurteaAssistantApp(ctk.CTk):
 
     # ---------- Events ----------
 
+    def _on_config_change(self, config, changed):
+        """Reflect a reloaded config.yaml (the assistants update themselves)."""
+        old_default = self.config["models"]["default"]
+        self.config = config
+        if "assistant.name" in changed:
+            self.title(config.get("assistant", {}).get("name", "Universal Knowledge Assistant"))
+        new_default = (config.get("models", {}) or {}).get("default", old_default)
+        # Follow the new default unless another model was picked in the menu
+        if "models.default" in changed and self.model_var.get() == old_default:
+            self.model_var.set(new_default)
+            self.assistant.model = new_default
+        self._set_status("Settings reloaded from config.yaml", "info")
+
     def _on_model_change(self, model_name: str):
         self.assistant.model = model_name
         self._set_status(f"Model set to {model_name}", "info")
 
+    def _on_new_chat(self):
+        self.query_queue.cancel_all()
+        self.assistant.reset()
+        self._append_system("Started a new conversation.")
+
     def _on_send_shortcut(self, event):
         self._on_send_clicked()
         return "break"
@@ -456,23 +606,56 @@ class ThurteaAssistantApp(ctk.CTk):
 
         self.input_box.delete("1.0", "end")
         self._append_user(query)
-        self._set_status("Thinking...", "warn")
-        self.send_button.configure(state="disabled", text="Thinking…")
-
-        # Run in background
-        threading.Thread(target=self._run_query, args=(query,), daemon=True).start()
-
-    def _run_query(self, query: str):
+        files = list(self.selected_files) if self.selected_files else None
+        self.query_queue.submit(query, files=files)
+
+    def _on_cancel_clicked(self):
+        if self.query_queue.cancel():
+            self._append_system("Cancelled.")
+
+    def _on_query_result(self, job, answer: str):
+        self._append_assistant(answer)
+
+    def _on_query_error(self, job, error: Exception):
+        self._append_system(f"Error: {error}")
+        self._flash_status("Error talking to model", "error", duration_ms=2500)
+
+    def _refresh_queue_status(self):
+        active = self.query_queue.active
+        pending = self.query_queue.pending()
+
+        lines = []
+        for position, job in enumerate(pending, start=1):
+            question = job.question.splitlines()[0]
+            if len(question) > 60:
+                question = question[:57] + "..."
+            lines.append(f"{position}. {question}")
+        self.queue_label.configure(text="Queued:  " + "   ".join(lines) if lines else "")
+
+        busy = active is not None or bool(pending)
+        self.cancel_button.configure(state="normal" if busy else "disabled")
+        if active is None and not pending:
+            self._set_status(self._ready_status_text(), "ok")
+        else:
+            phase = "Retrieving..." if active is None or active.state != "generating" else "Thinking..."
+            if pending:
+                phase += f" · {len(pending)} queued"
+            self._set_status(phase, "warn")
+
+    def _call_soon(self, callback):
+        """Run `callback` on the Tk main loop from a worker thread; dropped once the window is closing."""
+        if self._closing:
+            return
         try:
-            files = self.selected_files if self.selected_files else None
-            response = self.assistant.query(query, files=files)
-            self.after(0, lambda: self._append_assistant(response))
-            self.after(0, lambda: self._set_status(self._ready_status_text(), "ok"))
-        except Exception as e:
-            self.after(0, lambda: self._append_system(f"Error: {e}"))
-            self.after(0, lambda: self._set_status("Error talking to model", "error"))
-        finally:
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send (Ctrl+Enter)"))
+            self.after(0, callback)
+        except (RuntimeError, tk.TclError):
+            pass  # the window went away between the check and the call
+
+    def _on_close(self):
+        self._closing = True
+        # Joins the worker, so no callback is still running when the window goes away
+        self.query_queue.shutdown()
+        self.destroy()
 
     def _on_add_context(self):
         from tkinter import filedialog
@@ -505,9 +688,9 @@ class ThurteaAssistantApp(ctk.CTk):
         self.context_label.configure(text=f"Context: {names}")
 
     def _copy_panel_text(self, textbox: ctk.CTkTextbox):
-        """Copy entire content of a panel."""
+        """Copy entire content of a panel, including messages no longer rendered."""
         try:
-            content = textbox.get("1.0", "end-1c").strip()
+            content = textbox._transcript.text().strip()
             if not content:
                 return
             self.clipboard_clear()
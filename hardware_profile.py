@@ -0,0 +1,384 @@
+"""
+Hardware-Aware Model Profile
+Probes RAM, CPU cores and instruction-set flags, times the installed models
+with a short generation through the Ollama API, and picks the model, context
+window, thread count and retrieval `top_k` that answer within a target
+latency.
+
+Usage:
+    python hardware_profile.py                 # probe + benchmark, print the profile
+    python hardware_profile.py --write         # ...and save it to config.yaml
+    python hardware_profile.py --no-benchmark  # RAM/CPU only
+"""
+
+import argparse
+import ctypes
+import os
+import platform
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+import yaml
+
+from runtime_config import get_config
+
+# Model tiers, most capable first: (name, resident GB, KV cache MB per 1k context tokens)
+MODEL_TIERS = [
+    ("qwen2.5-coder:7b", 4.7, 56),
+    ("qwen2.5-coder:3b", 2.0, 36),
+    ("qwen2.5-coder:1.5b", 1.0, 28),
+]
+# Models not listed above are sized per billion parameters, rounded up from the tiers
+GB_PER_BILLION = 0.7
+KV_MB_PER_BILLION = 19
+_PARAMS_RE = re.compile(r"(?:(\d+)x)?(\d+(?:\.\d+)?)b\b", re.IGNORECASE)
+CONTEXT_SIZES = [32768, 16384, 8192, 4096]
+TOP_K_CHOICES = [5, 4, 3, 2]
+INTERESTING_FLAGS = {"avx", "avx2", "avx512f", "fma", "f16c", "neon", "asimd", "sve"}
+TOKENS_PER_LINE = 8
+PROMPT_OVERHEAD_TOKENS = 300
+ANSWER_TOKENS = 200
+RAM_HEADROOM = 0.8  # share of available RAM the model and its cache may use
+
+BENCH_PROMPT = (
+    "Summarize what this function does in one sentence.\n\n"
+    + "def handle(self, caller, args):\n    target = caller.search(args)\n    if not target:\n        return\n"
+    * 20
+)
+
+
+# ---------- Probing ----------
+
+
+def probe_hardware() -> Dict:
+    """RAM (GB), logical/physical cores and notable CPU flags for this machine."""
+    total, available = _memory_gb()
+    logical = os.cpu_count() or 1
+    return {
+        "platform": platform.system(),
+        "machine": platform.machine(),
+        "total_ram_gb": round(total, 1),
+        "available_ram_gb": round(available, 1),
+        "logical_cores": logical,
+        "physical_cores": _physical_cores() or (logical // 2 if logical >= 4 else logical),
+        "cpu_flags": sorted(_cpu_flags() & INTERESTING_FLAGS),
+    }
+
+
+def _memory_gb():
+    system = platform.system()
+    try:
+        if system == "Linux":
+            info = {}
+            with open("/proc/meminfo", "r", encoding="utf-8") as f:
+                for line in f:
+                    key, value = line.split(":", 1)
+                    info[key] = int(value.split()[0]) * 1024
+            total = info["MemTotal"]
+            return total / 1024 ** 3, info.get("MemAvailable", total) / 1024 ** 3
+        if system == "Windows":
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(MemoryStatus)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys / 1024 ** 3, status.ullAvailPhys / 1024 ** 3
+        if system == "Darwin":
+            total = int(subprocess.run(["sysctl", "-n", "hw.memsize"], capture_output=True, text=True).stdout)
+            # macOS keeps caches in "used" memory; most of it is reclaimable
+            return total / 1024 ** 3, total * 0.7 / 1024 ** 3
+    except Exception:
+        pass
+    return 8.0, 4.0  # unknown platform: assume a modest laptop
+
+
+def _physical_cores() -> Optional[int]:
+    try:
+        if platform.system() == "Linux":
+            cores = set()
+            physical_id = core_id = None
+            with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("physical id"):
+                        physical_id = line.split(":")[1].strip()
+                    elif line.startswith("core id"):
+                        core_id = line.split(":")[1].strip()
+                    elif not line.strip() and core_id is not None:
+                        cores.add((physical_id, core_id))
+                        physical_id = core_id = None
+            return len(cores) or None
+        if platform.system() == "Darwin":
+            out = subprocess.run(["sysctl", "-n", "hw.physicalcpu"], capture_output=True, text=True).stdout
+            return int(out)
+    except Exception:
+        pass
+    return None
+
+
+def _cpu_flags() -> set:
+    try:
+        if platform.system() == "Linux":
+            with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith(("flags", "Features")):
+                        return set(line.split(":", 1)[1].split())
+        if platform.system() == "Darwin":
+            out = subprocess.run(
+                ["sysctl", "-n", "machdep.cpu.features", "machdep.cpu.leaf7_features"],
+                capture_output=True,
+                text=True,
+            ).stdout
+            flags = {flag.lower().replace("avx1.0", "avx") for flag in out.split()}
+            if platform.machine() == "arm64":
+                flags |= {"neon", "asimd"}
+            return flags
+        if platform.system() == "Windows" and platform.machine().lower() in ("amd64", "x86_64"):
+            # PF_AVX_INSTRUCTIONS_AVAILABLE (39) / PF_AVX2_INSTRUCTIONS_AVAILABLE (40) / AVX512F (41)
+            present = ctypes.windll.kernel32.IsProcessorFeaturePresent
+            return {flag for flag, code in (("avx", 39), ("avx2", 40), ("avx512f", 41)) if present(code)}
+    except Exception:
+        pass
+    return set()
+
+
+# ---------- Benchmarking ----------
+
+
+def benchmark_model(
+    host: str,
+    model: str,
+    num_ctx: int = 4096,
+    num_thread: Optional[int] = None,
+    timeout: float = 180,
+) -> Dict:
+    """Prefill and generation speed (tokens/s) of one short, non-streamed generation."""
+    options = {"num_ctx": num_ctx, "num_predict": 32, "temperature": 0}
+    if num_thread:
+        options["num_thread"] = num_thread
+    started = time.perf_counter()
+    response = requests.post(
+        f"{host.rstrip('/')}/api/generate",
+        # A unique first line keeps the server's prompt cache from skipping prefill
+        json={"model": model, "prompt": f"# run {time.time_ns()}\n{BENCH_PROMPT}", "stream": False, "options": options},
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    data = response.json()
+    prompt_tokens = data.get("prompt_eval_count") or 0
+    prompt_s = (data.get("prompt_eval_duration") or 0) / 1e9
+    gen_tokens = data.get("eval_count") or 0
+    gen_s = (data.get("eval_duration") or 0) / 1e9
+    return {
+        "model": model,
+        "prefill_tps": round(prompt_tokens / prompt_s, 1) if prompt_s else 0.0,
+        "generate_tps": round(gen_tokens / gen_s, 1) if gen_s else 0.0,
+        "load_s": round((data.get("load_duration") or 0) / 1e9, 2),
+        "wall_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def benchmark_models(host: str, models: List[str], num_thread: Optional[int] = None) -> Dict[str, Dict]:
+    """Benchmark models one after another (in parallel they would skew each other)."""
+    results = {}
+    for model in models:
+        try:
+            results[model] = benchmark_model(host, model, num_thread=num_thread)
+        except Exception as e:
+            print(f"⚠️ Benchmark failed for {model}: {e}")
+    return results
+
+
+# ---------- Choosing ----------
+
+
+def _tier(model: str):
+    for tier in MODEL_TIERS:
+        if tier[0] == model:
+            return tier
+    # Unknown model: scale by the parameter count it names ("codellama:13b", "mixtral:8x7b")
+    match = _PARAMS_RE.search(model.split(":")[-1]) or _PARAMS_RE.search(model)
+    if match is None:
+        # No size in the name: assume the largest tier rather than risk running out of memory
+        return (model, MODEL_TIERS[0][1], MODEL_TIERS[0][2])
+    billions = float(match.group(2)) * int(match.group(1) or 1)
+    return (model, round(billions * GB_PER_BILLION, 1), round(billions * KV_MB_PER_BILLION))
+
+
+def _fits(tier, context: int, hardware: Dict) -> bool:
+    _, model_gb, kv_mb = tier
+    needed = model_gb + kv_mb * context / 1000 / 1024
+    return needed <= hardware["available_ram_gb"] * RAM_HEADROOM
+
+
+def estimate_latency(bench: Dict, top_k: int, chunk_lines: int) -> float:
+    """Seconds for a typical retrieval query: prefill of the context plus the answer."""
+    prompt_tokens = PROMPT_OVERHEAD_TOKENS + top_k * chunk_lines * TOKENS_PER_LINE
+    prefill = prompt_tokens / bench["prefill_tps"] if bench.get("prefill_tps") else float("inf")
+    generate = ANSWER_TOKENS / bench["generate_tps"] if bench.get("generate_tps") else float("inf")
+    return prefill + generate
+
+
+def choose_profile(
+    hardware: Dict,
+    benchmarks: Optional[Dict[str, Dict]] = None,
+    target_latency_s: float = 10.0,
+    chunk_lines: int = 300,
+    candidates: Optional[List[str]] = None,
+) -> Dict:
+    """Largest model/top_k that meets the latency target within memory.
+
+    Without benchmarks the choice is memory-only. When nothing meets the
+    target, the fastest measured option is returned.
+    """
+    benchmarks = benchmarks or {}
+    # Most capable (largest) first
+    models = sorted(candidates or [tier[0] for tier in MODEL_TIERS], key=lambda m: -_tier(m)[1])
+    threads = max(1, hardware["physical_cores"])
+    best = None
+    fallback = None
+
+    for model in models:
+        tier = _tier(model)
+        for top_k in TOP_K_CHOICES:
+            needed = PROMPT_OVERHEAD_TOKENS + top_k * chunk_lines * TOKENS_PER_LINE + ANSWER_TOKENS
+            contexts = [c for c in sorted(CONTEXT_SIZES) if c >= needed and _fits(tier, c, hardware)]
+            if not contexts:
+                continue
+            option = {"model": model, "top_k": top_k, "context_window": contexts[0], "num_thread": threads}
+            bench = benchmarks.get(model)
+            if bench is None:
+                # Memory-only: the default top_k of 3 is a safe middle ground
+                if not benchmarks and best is None and top_k <= 3:
+                    best = dict(option, estimated_latency_s=None)
+                continue
+            latency = estimate_latency(bench, top_k, chunk_lines)
+            option["estimated_latency_s"] = round(latency, 1)
+            if latency <= target_latency_s:
+                best = best or option
+            elif fallback is None or latency < fallback["estimated_latency_s"]:
+                fallback = option
+        if best:
+            break
+
+    profile = best or fallback
+    if profile is None:
+        # Not even the smallest model fits comfortably; use it with a small context
+        profile = {
+            "model": models[-1],
+            "top_k": TOP_K_CHOICES[-1],
+            "context_window": CONTEXT_SIZES[-1],
+            "num_thread": threads,
+            "estimated_latency_s": None,
+        }
+    # Room left over goes to a larger context window for file-context queries
+    tier = _tier(profile["model"])
+    for context in CONTEXT_SIZES:
+        if context > profile["context_window"] and _fits(tier, context, hardware):
+            profile["context_window"] = context
+            break
+    profile["target_latency_s"] = target_latency_s
+    return profile
+
+
+def write_profile(config_path: Path, profile: Dict, hardware: Dict, benchmarks: Optional[Dict] = None):
+    """Store the chosen profile in config.yaml (model, context, threads, top_k)."""
+    config = {}
+    if config_path.exists():
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    config.setdefault("models", {})["default"] = profile["model"]
+    config.setdefault("context", {})["context_window"] = profile["context_window"]
+    config.setdefault("ollama", {})["num_thread"] = profile["num_thread"]
+    config.setdefault("retrieval", {})["top_k"] = profile["top_k"]
+    config["hardware"] = {
+        "target_latency_s": profile["target_latency_s"],
+        "estimated_latency_s": profile.get("estimated_latency_s"),
+        "probe": hardware,
+        "benchmarks": benchmarks or {},
+        "profiled_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+
+def runtime_options(config: Dict, context_window: Optional[int] = None) -> Dict:
+    """Ollama request options (num_ctx, num_thread) from the saved profile."""
+    options = {}
+    context_window = context_window or (config.get("context", {}) or {}).get("context_window")
+    if context_window:
+        options["num_ctx"] = int(context_window)
+    num_thread = (config.get("ollama", {}) or {}).get("num_thread")
+    if num_thread:
+        options["num_thread"] = int(num_thread)
+    return options
+
+
+def main():
+    config_path = Path(__file__).parent / "config.yaml"
+    config = get_config(config_path).data
+    hardware_cfg = config.get("hardware", {}) or {}
+
+    parser = argparse.ArgumentParser(description="Pick a model profile for this machine")
+    parser.add_argument("--host", default=(config.get("ollama", {}) or {}).get("host", "http://localhost:11434"))
+    parser.add_argument("--target-latency", type=float, default=float(hardware_cfg.get("target_latency_s", 10.0)))
+    parser.add_argument("--no-benchmark", action="store_true", help="Choose from RAM/CPU only")
+    parser.add_argument("--write", action="store_true", help="Save the profile to config.yaml")
+    args = parser.parse_args()
+
+    hardware = probe_hardware()
+    print(
+        f"🖥️ {hardware['total_ram_gb']} GB RAM ({hardware['available_ram_gb']} GB free), "
+        f"{hardware['physical_cores']} cores / {hardware['logical_cores']} threads, "
+        f"flags: {', '.join(hardware['cpu_flags']) or 'unknown'}"
+    )
+
+    benchmarks = {}
+    if not args.no_benchmark:
+        try:
+            tags = requests.get(f"{args.host}/api/tags", timeout=3).json()
+            installed = [m["name"] for m in tags.get("models", [])]
+        except Exception as e:
+            print(f"⚠️ Ollama not reachable, choosing from hardware only: {e}")
+            installed = []
+        for model in installed:
+            print(f"⏱️ Benchmarking {model}...")
+        benchmarks = benchmark_models(args.host, installed, num_thread=hardware["physical_cores"])
+        for model, result in benchmarks.items():
+            print(f"  {model}: prefill {result['prefill_tps']} tok/s, generate {result['generate_tps']} tok/s")
+
+    chunk_lines = int((config.get("indexing", {}) or {}).get("chunk_size", 300))
+    profile = choose_profile(
+        hardware,
+        benchmarks,
+        target_latency_s=args.target_latency,
+        chunk_lines=chunk_lines,
+        candidates=list(benchmarks) or None,
+    )
+    print(
+        f"✅ Profile: {profile['model']}, context {profile['context_window']}, "
+        f"{profile['num_thread']} threads, top_k {profile['top_k']} "
+        f"(est. {profile.get('estimated_latency_s') or '?'} s, target {profile['target_latency_s']} s)"
+    )
+    if args.write:
+        write_profile(config_path, profile, hardware, benchmarks)
+        print(f"💾 Saved to {config_path}")
+
+
+if __name__ == "__main__":
+    main()
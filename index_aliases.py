@@ -0,0 +1,135 @@
+"""
+Collection Aliases
+Maps logical collection names to the physical Chroma collections that
+currently back them, so a rebuilt collection can be swapped in atomically.
+
+Builds write into a versioned shadow collection (`<name>__<timestamp>_<rand>`);
+flipping the alias publishes it, and the collection it replaced is retired
+and garbage-collected once the grace period has passed.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+from sharded_index import drop_shards
+from summaries import drop_summaries
+from symbol_index import symbol_db_path
+from vector_store import store_path
+
+ALIAS_FILE = "aliases.json"
+RETIRED_FILE = "retired.json"
+
+
+def read_aliases(index_path) -> Dict[str, str]:
+    return _read_json(Path(index_path) / ALIAS_FILE)
+
+
+def resolve_collection(index_path, name: str) -> str:
+    """Physical collection behind a logical name (the name itself if unaliased)."""
+    return read_aliases(index_path).get(name, name)
+
+
+def alias_stamp(index_path) -> int:
+    """Cheap change marker for the alias file (0 when there is none)."""
+    try:
+        return os.stat(Path(index_path) / ALIAS_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def version_name(name: str) -> str:
+    """A new physical collection name for the next build of `name`.
+
+    The random tail keeps two builds started in the same second apart.
+    """
+    return f"{name}__{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:4]}"
+
+
+def set_alias(index_path, name: str, physical: str):
+    """Point `name` at `physical`; readers see either the old or new file, never half."""
+    index_path = Path(index_path)
+    aliases = read_aliases(index_path)
+    aliases[name] = physical
+    _write_json_atomic(index_path / ALIAS_FILE, aliases)
+
+
+def swap_alias(index_path, name: str, physical: str) -> str:
+    """Publish `physical` as `name` and retire the collection it replaces."""
+    previous = resolve_collection(index_path, name)
+    set_alias(index_path, name, physical)
+    if previous != physical:
+        retire_collection(index_path, previous)
+    return previous
+
+
+def retire_collection(index_path, physical: str):
+    index_path = Path(index_path)
+    retired = _read_json(index_path / RETIRED_FILE)
+    retired.setdefault(physical, time.time())
+    _write_json_atomic(index_path / RETIRED_FILE, retired)
+
+
+def collect_garbage(client, index_path, grace_seconds: float) -> List[str]:
+    """Drop retired collections (with their symbol tables, summaries, shards and vector stores) past the grace period."""
+    index_path = Path(index_path)
+    retired = _read_json(index_path / RETIRED_FILE)
+    live = set(read_aliases(index_path).values())
+    now = time.time()
+    dropped = []
+    for physical, retired_at in list(retired.items()):
+        if physical in live:
+            del retired[physical]
+            continue
+        if now - retired_at < grace_seconds:
+            continue
+        try:
+            client.delete_collection(physical)
+        except Exception as e:
+            # Already gone is fine; anything else is retried on the next run
+            if "does not exist" not in str(e):
+                print(f"⚠️ Could not drop retired collection '{physical}': {e}")
+                continue
+        drop_summaries(client, physical)
+        drop_shards(index_path, physical)
+        db_path = symbol_db_path(index_path, physical)
+        try:
+            db_path.unlink(missing_ok=True)
+        except OSError as e:
+            # Windows: a running assistant still has the symbol table open; retried on the next run
+            print(f"⚠️ Could not remove symbol table of '{physical}' yet: {e}")
+            continue
+        vectors = store_path(index_path, physical)
+        if vectors.exists():
+            shutil.rmtree(vectors, ignore_errors=True)
+        del retired[physical]
+        dropped.append(physical)
+    _write_json_atomic(index_path / RETIRED_FILE, retired)
+    return dropped
+
+
+def _read_json(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json_atomic(path: Path, data: Dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.stem}-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,553 @@
+"""
+Index Bundles
+Packages a built collection into one compressed, versioned file so a team
+can share an index instead of everyone re-embedding the same code. A bundle
+holds the chunk vectors, documents and metadata, the file/directory
+summaries, the symbol table and a manifest recording the embedding model
+identity. Import streams the archive and bulk-loads the stored vectors, so
+nothing is embedded again.
+
+Delta bundles carry only the chunks that changed since a base bundle (plus
+the ids that were removed) and apply on top of an index installed from
+that base.
+
+Usage:
+    python index_bundles.py export --kb NAME --out team.idx.tgz
+    python index_bundles.py export --kb NAME --base team.idx.tgz --out delta.idx.tgz
+    python index_bundles.py import team.idx.tgz [--kb NAME]
+    python index_bundles.py import delta.idx.tgz [--in-place]
+    python index_bundles.py info team.idx.tgz
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import chromadb
+import numpy as np
+
+from index_aliases import collect_garbage, resolve_collection, set_alias, swap_alias, version_name
+from knowledge_bases import load_config, load_knowledge_bases
+from sharded_index import is_sharded
+from summaries import summary_collection_name
+from symbol_index import SymbolIndex, symbol_db_path
+from vector_store import drop_store, embed_texts, export_collection, export_method, store_path
+
+BUNDLE_FORMAT = 1
+PAGE_SIZE = 1000
+INSTALLED_FILE = "bundles.json"  # logical collection -> id of the bundle it was imported from
+EMBEDDING_FUNCTION = "chromadb.default"
+PROBE_TEXT = "def load_config(path):\n    return yaml.safe_load(open(path))"
+MIN_PROBE_SIMILARITY = 0.99
+
+
+# ---------- Embedding identity ----------
+
+
+def embedding_identity() -> Dict:
+    """Which embedding model produced the vectors, with a probe vector to compare."""
+    probe = embed_texts([PROBE_TEXT])[0]
+    return {
+        "function": EMBEDDING_FUNCTION,
+        "dim": int(probe.shape[0]),
+        "probe": [round(float(v), 6) for v in probe],
+    }
+
+
+def compatibility_error(identity: Dict, local: Optional[Dict] = None) -> Optional[str]:
+    """Why vectors from `identity` can't be searched with the local model, or None."""
+    local = local or embedding_identity()
+    if identity.get("function") != local["function"] or identity.get("dim") != local["dim"]:
+        return (
+            f"bundle was embedded with {identity.get('function')} ({identity.get('dim')} dims), "
+            f"this install uses {local['function']} ({local['dim']} dims)"
+        )
+    similarity = float(np.dot(np.asarray(identity["probe"]), np.asarray(local["probe"])))
+    if similarity < MIN_PROBE_SIMILARITY:
+        return f"embedding model differs (probe similarity {similarity:.3f})"
+    return None
+
+
+# ---------- Installed bundle tracking ----------
+
+
+def _read_installed(index_path) -> Dict[str, str]:
+    path = Path(index_path) / INSTALLED_FILE
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def installed_bundle(index_path, logical: str) -> Optional[str]:
+    return _read_installed(index_path).get(logical)
+
+
+def _set_installed(index_path, logical: str, bundle_id: Optional[str]):
+    installed = _read_installed(index_path)
+    if bundle_id is None:
+        if logical not in installed:
+            return
+        installed.pop(logical)
+    else:
+        installed[logical] = bundle_id
+    path = Path(index_path) / INSTALLED_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(installed, f, indent=2)
+    os.replace(tmp, path)
+
+
+def forget_bundle(index_path, logical: str):
+    """A local rebuild no longer matches any bundle, so deltas must not apply to it."""
+    _set_installed(index_path, logical, None)
+
+
+# ---------- Export ----------
+
+
+def _record_hash(document: str, metadata: Optional[Dict]) -> str:
+    payload = document + "\0" + json.dumps(metadata or {}, sort_keys=True)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def _pages(collection, include: List[str]) -> Iterator[Dict]:
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=PAGE_SIZE, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            return
+        yield page
+        offset += len(ids)
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_json(tar: tarfile.TarFile, name: str, data):
+    _add_bytes(tar, name, json.dumps(data).encode("utf-8"))
+
+
+def _add_page(tar: tarfile.TarFile, prefix: str, number: int, page: Dict, precision: str):
+    name = f"{prefix}/{number:06d}"
+    _add_json(tar, name + ".json", {k: page[k] for k in ("ids", "documents", "metadatas")})
+    vectors = io.BytesIO()
+    np.save(vectors, np.asarray(page["embeddings"], dtype=precision))
+    _add_bytes(tar, name + ".npy", vectors.getvalue())
+
+
+def _write_collection(tar, prefix: str, collection, precision: str, only: Optional[set] = None) -> int:
+    """Write a collection's records (or just the ids in `only`) as page pairs."""
+    written = number = 0
+    buffer = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+    for page in _pages(collection, ["documents", "metadatas", "embeddings"]):
+        for i, record_id in enumerate(page["ids"]):
+            if only is not None and record_id not in only:
+                continue
+            buffer["ids"].append(record_id)
+            buffer["documents"].append(page["documents"][i])
+            buffer["metadatas"].append(page["metadatas"][i] or {})
+            buffer["embeddings"].append(page["embeddings"][i])
+            if len(buffer["ids"]) >= PAGE_SIZE:
+                _add_page(tar, prefix, number, buffer, precision)
+                written, number = written + len(buffer["ids"]), number + 1
+                buffer = {key: [] for key in buffer}
+    if buffer["ids"]:
+        _add_page(tar, prefix, number, buffer, precision)
+        written += len(buffer["ids"])
+    return written
+
+
+def read_manifest(bundle) -> Dict:
+    """Manifest and record hashes of a bundle, reading only the archive head."""
+    with tarfile.open(bundle, "r|gz") as tar:
+        manifest = hashes = None
+        for member in tar:
+            if member.name == "manifest.json":
+                manifest = json.load(tar.extractfile(member))
+            elif member.name == "hashes.json":
+                hashes = json.load(tar.extractfile(member))
+            if manifest is not None and hashes is not None:
+                break
+    if manifest is None:
+        raise ValueError(f"{bundle} is not an index bundle (no manifest)")
+    manifest["hashes"] = hashes or {}
+    return manifest
+
+
+def export_bundle(
+    client,
+    index_path,
+    kb: Dict,
+    out,
+    precision: str = "float16",
+    base: Optional[str] = None,
+) -> Dict:
+    """Write a full bundle of a knowledge base's live collection, or a delta against `base`."""
+    index_path = Path(index_path)
+    physical = resolve_collection(index_path, kb["collection"])
+    if is_sharded(index_path, physical):
+        raise ValueError(f"'{kb['collection']}' is sharded; bundles support single collections only")
+    collection = client.get_collection(physical)
+
+    # First pass (no vectors): record hashes, so the manifest can lead the archive
+    hashes = {}
+    for page in _pages(collection, ["documents", "metadatas"]):
+        for i, record_id in enumerate(page["ids"]):
+            hashes[record_id] = _record_hash(page["documents"][i], page["metadatas"][i])
+
+    base_manifest = read_manifest(base) if base else None
+    changed, deleted = None, []
+    if base_manifest:
+        base_hashes = base_manifest["hashes"]
+        changed = {record_id for record_id, digest in hashes.items() if base_hashes.get(record_id) != digest}
+        deleted = [record_id for record_id in base_hashes if record_id not in hashes]
+
+    summaries = None
+    try:
+        summaries = client.get_collection(summary_collection_name(physical))
+    except Exception:
+        pass
+    symbols = symbol_db_path(index_path, physical)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "kind": "delta" if base_manifest else "full",
+        "bundle_id": uuid.uuid4().hex,
+        "base_id": base_manifest["bundle_id"] if base_manifest else None,
+        "collection": kb["collection"],
+        "source_collection": physical,
+        "created_at": time.time(),
+        "knowledge_base": {
+            "folder": Path(kb["path"]).name,
+            "chunk_size": kb["chunk_size"],
+            "overlap": kb["overlap"],
+            "patterns": kb["patterns"],
+        },
+        "embedding": embedding_identity(),
+        "precision": precision,
+        "count": len(hashes),
+        "records": len(changed) if changed is not None else len(hashes),
+        "deleted": len(deleted),
+        "summaries": summaries is not None,
+        "symbols": symbols.exists(),
+        "path_sep": os.sep,
+    }
+
+    out = Path(out)
+    tmp = out.with_name(out.name + ".tmp")
+    started = time.perf_counter()
+    with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+        _add_json(tar, "manifest.json", manifest)
+        _add_json(tar, "hashes.json", hashes)
+        _add_json(tar, "deleted.json", deleted)
+        _write_collection(tar, "chunks", collection, precision, only=changed)
+        if summaries is not None:
+            _write_collection(tar, "summaries", summaries, precision)
+        if symbols.exists():
+            tar.add(str(symbols), arcname="symbols.db")
+    os.replace(tmp, out)
+    manifest["bytes"] = out.stat().st_size
+    manifest["seconds"] = round(time.perf_counter() - started, 1)
+    return manifest
+
+
+# ---------- Import ----------
+
+
+def _localize(path: str, separator: str) -> str:
+    return path.replace(separator, os.sep) if separator != os.sep else path
+
+
+def _localize_page(page: Dict, separator: str) -> Dict:
+    """Rewrite file/dir paths written on another OS to native separators."""
+    if separator == os.sep:
+        return page
+    for meta in page["metadatas"]:
+        for key in ("file", "dir"):
+            if isinstance(meta.get(key), str):
+                meta[key] = _localize(meta[key], separator)
+    page["ids"] = [
+        _localize(record_id, separator) if record_id.startswith(("file:", "dir:")) else record_id
+        for record_id in page["ids"]
+    ]
+    return page
+
+
+def _install_symbols(fileobj, path: Path, separator: str, root: Optional[Path]):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(fileobj, f)
+    if separator != os.sep:
+        conn = sqlite3.connect(str(tmp))
+        try:
+            for table in ("symbols", "refs"):
+                conn.execute(f"UPDATE {table} SET file = replace(file, ?, ?)", (separator, os.sep))
+            conn.commit()
+        finally:
+            conn.close()
+    if root is not None:
+        symbols = SymbolIndex(tmp)
+        symbols.set_meta("root", str(root.resolve()))
+        symbols.close()
+    os.replace(tmp, path)
+
+
+def _copy_live(live, target, skip: set) -> int:
+    """Copy the live collection's records (minus `skip`) with their stored vectors."""
+    copied = 0
+    for page in _pages(live, ["documents", "metadatas", "embeddings"]):
+        keep = [i for i, record_id in enumerate(page["ids"]) if record_id not in skip]
+        if keep:
+            target.add(
+                ids=[page["ids"][i] for i in keep],
+                documents=[page["documents"][i] for i in keep],
+                metadatas=[page["metadatas"][i] for i in keep],
+                embeddings=[page["embeddings"][i] for i in keep],
+            )
+            copied += len(keep)
+    return copied
+
+
+def import_bundle(
+    client,
+    index_path,
+    bundle,
+    kb: Optional[Dict] = None,
+    in_place: bool = False,
+    force: bool = False,
+    vector_store: Optional[str] = None,
+    gc_grace_seconds: float = 1800,
+) -> Dict:
+    """Load a bundle into the index directory and publish it under its collection alias.
+
+    Full bundles and (by default) deltas build a new collection version and
+    swap the alias like `index_codebase.py`; `in_place` applies a delta
+    directly to the live collection and its summaries, then re-stamps the
+    alias so running assistants reopen them.
+    """
+    index_path = Path(index_path)
+    started = time.perf_counter()
+    with tarfile.open(bundle, "r|gz") as tar:
+        members = iter(tar)
+        first = next(members, None)
+        if first is None or first.name != "manifest.json":
+            raise ValueError(f"{bundle} is not an index bundle (no manifest)")
+        manifest = json.load(tar.extractfile(first))
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format {manifest.get('format')} (expected {BUNDLE_FORMAT})")
+        problem = compatibility_error(manifest["embedding"])
+        if problem:
+            if not force:
+                raise ValueError(f"Incompatible bundle: {problem}")
+            print(f"⚠️ {problem}; importing anyway (--force)")
+
+        logical = kb["collection"] if kb else manifest["collection"]
+        delta = manifest["kind"] == "delta"
+        if delta:
+            installed = installed_bundle(index_path, logical)
+            if installed != manifest["base_id"] and not force:
+                raise ValueError(
+                    f"Delta applies to bundle {manifest['base_id'][:8]}, but '{logical}' "
+                    f"has {installed[:8] if installed else 'no bundle'} installed"
+                )
+        elif in_place:
+            raise ValueError("--in-place applies to delta bundles only")
+
+        live_name = resolve_collection(index_path, logical)
+        if delta and in_place:
+            target_name = live_name
+            target = client.get_collection(live_name)
+        else:
+            target_name = version_name(logical)
+            target = client.create_collection(
+                name=target_name, metadata={"description": f"{manifest['knowledge_base']['folder']} chunks"}
+            )
+
+        separator = manifest.get("path_sep", os.sep)
+        summaries = None
+        summary_ids = set()
+        pending: Dict[str, Dict] = {}
+        loaded = deleted = 0
+        try:
+            for member in members:
+                name = member.name
+                data = tar.extractfile(member) if member.isfile() else None
+                if data is None or name == "hashes.json":
+                    continue
+                if name == "deleted.json":
+                    removed = json.load(data)
+                    deleted = len(removed)
+                    if not delta:
+                        continue
+                    if in_place:
+                        for i in range(0, len(removed), PAGE_SIZE):
+                            target.delete(ids=removed[i : i + PAGE_SIZE])
+                    else:
+                        # Start the new version from the live one; changed chunks are overwritten below
+                        copied = _copy_live(client.get_collection(live_name), target, set(removed))
+                        print(f"📋 Carried over {copied} unchanged chunks")
+                elif name == "symbols.db":
+                    root = Path(kb["path"]).parent if kb else None
+                    _install_symbols(data, symbol_db_path(index_path, target_name), separator, root)
+                elif name.endswith(".json"):
+                    pending[name[:-5]] = _localize_page(json.load(data), separator)
+                elif name.endswith(".npy"):
+                    page = pending.pop(name[:-4])
+                    vectors = np.load(io.BytesIO(data.read())).astype(np.float32)
+                    if name.startswith("summaries/"):
+                        if summaries is None:
+                            # Live summaries are updated in place, never dropped under running readers
+                            summaries = client.get_or_create_collection(
+                                name=summary_collection_name(target_name), metadata={"hnsw:space": "cosine"}
+                            )
+                        summary_ids.update(page["ids"])
+                        destination = summaries
+                    else:
+                        destination = target
+                        loaded += len(page["ids"])
+                    # Stored vectors go straight in; upsert lets deltas replace changed chunks
+                    destination.upsert(
+                        ids=page["ids"],
+                        documents=page["documents"],
+                        metadatas=page["metadatas"],
+                        embeddings=vectors.tolist(),
+                    )
+        except BaseException:
+            if target_name != live_name:
+                for name in (target_name, summary_collection_name(target_name)):
+                    try:
+                        client.delete_collection(name)
+                    except Exception:
+                        pass
+                db_path = symbol_db_path(index_path, target_name)
+                if db_path.exists():
+                    db_path.unlink()
+            raise
+
+    if summaries is not None and target_name == live_name:
+        # Bundles carry every summary, so live ones missing from it are stale
+        stale = [
+            record_id for page in _pages(summaries, []) for record_id in page["ids"] if record_id not in summary_ids
+        ]
+        for i in range(0, len(stale), PAGE_SIZE):
+            summaries.delete(ids=stale[i : i + PAGE_SIZE])
+
+    if vector_store:
+        exported = export_collection(target, store_path(index_path, target_name), method=vector_store)
+        print(f"🗜️ Exported {exported['count']} vectors as {exported['method']}")
+    else:
+        drop_store(index_path, target_name)
+    if target_name != live_name:
+        previous = swap_alias(index_path, logical, target_name)
+        print(f"🔁 '{logical}' now serves '{target_name}' (was '{previous}')")
+        for name in collect_garbage(client, index_path, gc_grace_seconds):
+            print(f"🗑️ Dropped retired collection '{name}'")
+    else:
+        # Same collection, new symbol table file: a fresh alias stamp makes readers reopen it
+        set_alias(index_path, logical, live_name)
+    _set_installed(index_path, logical, manifest["bundle_id"])
+
+    stats = {
+        "collection": logical,
+        "physical_collection": target_name,
+        "bundle_id": manifest["bundle_id"],
+        "kind": manifest["kind"],
+        "total_chunks": target.count(),
+        "loaded_chunks": loaded,
+        "deleted_chunks": deleted,
+        "chunk_size": manifest["knowledge_base"]["chunk_size"],
+        "overlap": manifest["knowledge_base"]["overlap"],
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    with open(index_path / f"index_stats_{logical}.json", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+# ---------- CLI ----------
+
+
+def _kb_for_collection(bases: Dict, collection: str) -> Optional[Dict]:
+    return next((kb for kb in bases.values() if kb["collection"] == collection), None)
+
+
+def main():
+    config = load_config()
+    bases = load_knowledge_bases(config)
+    indexing = config.get("indexing", {}) or {}
+
+    parser = argparse.ArgumentParser(description="Export and import prebuilt index bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="Write a bundle of a knowledge base")
+    export_cmd.add_argument("--kb", choices=list(bases), default=next(iter(bases)))
+    export_cmd.add_argument("--out", required=True)
+    export_cmd.add_argument("--base", help="Earlier bundle; writes only the changes since it")
+    export_cmd.add_argument("--precision", choices=["float16", "float32"], default="float16")
+    import_cmd = sub.add_parser("import", help="Load a bundle and publish it")
+    import_cmd.add_argument("bundle")
+    import_cmd.add_argument("--kb", choices=list(bases), help="Knowledge base to load into (default: by collection)")
+    import_cmd.add_argument("--in-place", action="store_true", help="Apply a delta to the live collection")
+    import_cmd.add_argument("--force", action="store_true", help="Skip model and base-bundle checks")
+    info_cmd = sub.add_parser("info", help="Show a bundle's manifest")
+    info_cmd.add_argument("bundle")
+    for command in (export_cmd, import_cmd):
+        command.add_argument("--index-path", default="./chroma_db")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        manifest = read_manifest(args.bundle)
+        print(f"📦 {args.bundle}: {manifest['kind']} bundle {manifest['bundle_id'][:8]}")
+        if manifest.get("base_id"):
+            print(f"  Base: {manifest['base_id'][:8]}")
+        print(f"  Collection: {manifest['collection']} ({manifest['count']} chunks, {manifest['records']} included)")
+        print(f"  Embedding: {manifest['embedding']['function']} ({manifest['embedding']['dim']} dims)")
+        kb = manifest["knowledge_base"]
+        print(f"  Chunking: {kb['chunk_size']} lines, {kb['overlap']} overlap, {', '.join(kb['patterns'])}")
+        print(f"  Created: {time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['created_at']))}")
+        return
+
+    client = chromadb.PersistentClient(path=args.index_path)
+    if args.command == "export":
+        manifest = export_bundle(
+            client, args.index_path, bases[args.kb], args.out, precision=args.precision, base=args.base
+        )
+        print(
+            f"📦 Wrote {manifest['kind']} bundle {args.out}: {manifest['records']} chunks"
+            + (f", {manifest['deleted']} deletions" if manifest["kind"] == "delta" else "")
+            + f", {manifest['bytes'] / (1024 * 1024):.1f} MB in {manifest['seconds']} s"
+        )
+    else:
+        kb = bases[args.kb] if args.kb else _kb_for_collection(bases, read_manifest(args.bundle)["collection"])
+        stats = import_bundle(
+            client,
+            args.index_path,
+            args.bundle,
+            kb=kb,
+            in_place=args.in_place,
+            force=args.force,
+            vector_store=export_method(config),
+            gc_grace_seconds=float(indexing.get("gc_grace_minutes", 30)) * 60,
+        )
+        print(
+            f"✅ Imported {stats['loaded_chunks']} chunks into '{stats['collection']}' "
+            f"({stats['total_chunks']} total) in {stats['seconds']} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
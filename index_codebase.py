@@ -3,13 +3,48 @@ Vector Database Indexing for AetherMUD Codebase
 Creates ChromaDB index for fast semantic search
 """
 
+import argparse
 import hashlib
 import json
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 import chromadb
 
+from git_changes import (
+    changed_files,
+    current_branch,
+    default_branch,
+    dirty_files,
+    head_commit,
+    overlay_name,
+    repo_root,
+    tracked_files,
+)
+from index_aliases import collect_garbage, resolve_collection, swap_alias, version_name
+from index_bundles import forget_bundle
+from index_scheduler import IndexScheduler
+from knowledge_bases import (
+    DEFAULT_COLLECTION,
+    DEFAULT_PATTERNS,
+    load_config,
+    load_knowledge_bases,
+)
+from query_profiler import QueryProfiler
+from sharded_index import ShardWriter, drop_shards, is_sharded, shard_root
+from summaries import build_summaries, drop_summaries
+from symbol_index import SymbolIndex, symbol_db_path
+from vector_store import drop_store, export_collection, export_method, store_path
+
+
+def list_files(codebase_path, patterns: List[str], git_root=None) -> List[Path]:
+    """Files a build indexes: git's view of the tree inside a work tree (respects .gitignore), else a walk."""
+    if git_root:
+        return tracked_files(codebase_path, patterns)
+    return sorted({p for pattern in patterns for p in Path(codebase_path).rglob(pattern) if p.is_file()})
+
 
 class CodebaseIndexer:
     def __init__(
@@ -18,18 +53,112 @@ class CodebaseIndexer:
         index_path: str = "./chroma_db",
         chunk_size: int = 300,
         overlap: int = 50,
+        collection_name: str = DEFAULT_COLLECTION,
+        patterns: Optional[List[str]] = None,
+        blue_green: bool = True,
+        gc_grace_seconds: float = 1800,
+        vector_store: Optional[str] = None,
+        summaries: bool = True,
+        shards: int = 1,
+        scheduler: Optional[IndexScheduler] = None,
+        use_git: bool = True,
+        base_branch: Optional[str] = None,
+        overlays: bool = True,
+        full: bool = False,
+        profiler: Optional[QueryProfiler] = None,
     ):
         self.codebase_path = Path(codebase_path)
         self.index_path = Path(index_path)
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.collection_name = collection_name
+        self.patterns = patterns or DEFAULT_PATTERNS
+        self.blue_green = blue_green
+        self.gc_grace_seconds = gc_grace_seconds
+        # "auto"/"flat"/"int8"/"pq" to also export a NumPy store, None to skip
+        self.vector_store = vector_store
+        # File/directory summary layer for hierarchical retrieval
+        self.summaries = summaries
+        # >1 splits chunks over that many Chroma databases by file path
+        self.shards = max(1, int(shards))
+        # Paces embedding batches around interactive queries; None runs flat out
+        self.scheduler = scheduler
+        # Inside a git work tree: list files with git, update from the diff since
+        # the indexed commit, and index other branches as overlays on the base
+        self.git_root = repo_root(self.codebase_path) if use_git else None
+        self.base_branch = base_branch
+        self.overlays = overlays
+        self.full = full
+        # Opt-in: profiles of embedding batches slower than profiling.index_threshold_ms
+        self.profiler = profiler
 
         self.client = chromadb.PersistentClient(path=str(self.index_path))
-        self.collection = self.client.get_or_create_collection(
-            name="aethermud_code",
-            metadata={"description": "AetherMUD codebase chunks"},
+        # Target collection and symbol table are picked per build
+        self.collection = None
+        self.symbols: Optional[SymbolIndex] = None
+
+    @classmethod
+    def from_knowledge_base(cls, kb: Dict, index_path: str = "./chroma_db", **kwargs) -> "CodebaseIndexer":
+        return cls(
+            codebase_path=kb["path"],
+            index_path=index_path,
+            chunk_size=kb["chunk_size"],
+            overlap=kb["overlap"],
+            collection_name=kb["collection"],
+            patterns=kb["patterns"],
+            **kwargs,
         )
 
+    def _open_target(self) -> str:
+        """Open the collection this build writes to.
+
+        Blue/green builds go into a fresh versioned collection that readers
+        don't see until `_publish` flips the alias; in-place builds write
+        straight into the live one. Sharded builds write the same way into
+        per-shard databases under `shards/<target>/`.
+        """
+        if self.blue_green:
+            target = version_name(self.collection_name)
+        else:
+            target = resolve_collection(self.index_path, self.collection_name)
+        metadata = {"description": f"{self.codebase_path.name} chunks"}
+        if self.shards > 1:
+            self.collection = ShardWriter(shard_root(self.index_path, target), self.shards, metadata=metadata)
+        elif self.blue_green:
+            self.collection = self.client.create_collection(name=target, metadata=metadata)
+        else:
+            self.collection = self.client.get_or_create_collection(name=target, metadata=metadata)
+        self.symbols = SymbolIndex(symbol_db_path(self.index_path, target))
+        return target
+
+    def _publish(self, target: str):
+        if self.shards > 1:
+            manifest = self.collection.write_manifest()
+            print(f"🧩 Wrote {sum(manifest['counts'])} chunks across {manifest['shards']} shards")
+        elif self.vector_store:
+            # Export before the swap so the store is ready when readers switch
+            manifest = export_collection(
+                self.collection, store_path(self.index_path, target), method=self.vector_store
+            )
+            print(f"🗜️ Exported {manifest['count']} vectors as {manifest['method']}")
+        else:
+            drop_store(self.index_path, target)
+        # A local build replaces whatever bundle was imported, so deltas no longer apply
+        forget_bundle(self.index_path, self.collection_name)
+        if not self.blue_green:
+            return
+        previous = swap_alias(self.index_path, self.collection_name, target)
+        print(f"🔁 '{self.collection_name}' now serves '{target}' (was '{previous}')")
+        dropped = collect_garbage(self.client, self.index_path, self.gc_grace_seconds)
+        for name in dropped:
+            print(f"🗑️ Dropped retired collection '{name}'")
+
+    def _chunk_id(self, file_path: Path, start: int) -> str:
+        return hashlib.md5(f"{file_path}:{start}".encode()).hexdigest()
+
+    def _relative_file(self, file_path: Path) -> str:
+        return str(file_path.relative_to(self.codebase_path.parent))
+
     def chunk_file(self, file_path: Path) -> List[Dict]:
         chunks: List[Dict] = []
         try:
@@ -40,13 +169,14 @@ class CodebaseIndexer:
             for i in range(0, len(lines), step):
                 chunk_lines = lines[i : i + self.chunk_size]
                 chunk_text = "".join(chunk_lines)
-                chunk_id = hashlib.md5(f"{file_path}:{i}".encode()).hexdigest()
+                chunk_id = self._chunk_id(file_path, i)
                 chunks.append(
                     {
                         "id": chunk_id,
                         "text": chunk_text,
                         "metadata": {
-                            "file": str(file_path.relative_to(self.codebase_path.parent)),
+                            "file": self._relative_file(file_path),
+                            "dir": str(Path(self._relative_file(file_path)).parent),
                             "start_line": i + 1,
                             "end_line": i + len(chunk_lines),
                             "chunk_index": i // step,
@@ -57,50 +187,350 @@ class CodebaseIndexer:
             print(f"Error chunking {file_path}: {e}")
         return chunks
 
-    def index_codebase(self):
-        print("🔍 Indexing AetherMUD codebase...")
-        py_files = list(self.codebase_path.rglob("*.py"))
-        print(f"Found {len(py_files)} Python files")
+    def list_files(self) -> List[Path]:
+        return list_files(self.codebase_path, self.patterns, self.git_root)
 
+    def index_symbols(self, file_path: Path) -> int:
+        """Record the classes/functions defined in a file in the symbol table."""
+        if file_path.suffix != ".py":
+            return 0
+        step = self.chunk_size - self.overlap
+        try:
+            source = file_path.read_text(encoding="utf-8")
+        except Exception as e:
+            print(f"Error reading symbols from {file_path}: {e}")
+            return 0
+        return self.symbols.add_file(
+            self._relative_file(file_path),
+            source,
+            lambda line: self._chunk_id(file_path, ((line - 1) // step) * step),
+        )
+
+    def _discard(self, target: str):
+        """Throw away an unpublished shadow build."""
+        self.symbols.close()
+        if not self.blue_green:
+            return
+        if self.shards > 1:
+            drop_shards(self.index_path, target)
+        else:
+            try:
+                self.client.delete_collection(target)
+            except Exception as e:
+                print(f"⚠️ Could not remove unfinished build '{target}': {e}")
+        drop_summaries(self.client, target)
+        db_path = symbol_db_path(self.index_path, target)
+        if db_path.exists():
+            db_path.unlink()
+
+    def _build(self, files: List[Path]):
         all_chunks: List[Dict] = []
-        for file_path in py_files:
+        total_symbols = 0
+        for file_path in files:
             chunks = self.chunk_file(file_path)
             all_chunks.extend(chunks)
+            total_symbols += self.index_symbols(file_path)
             print(f"  Indexed: {file_path.name} ({len(chunks)} chunks)")
 
-        batch_size = 100
-        for i in range(0, len(all_chunks), batch_size):
+        i = 0
+        while i < len(all_chunks):
+            batch_size = self.scheduler.next_batch() if self.scheduler else 100
             batch = all_chunks[i : i + batch_size]
-            self.collection.add(
-                ids=[c["id"] for c in batch],
-                documents=[c["text"] for c in batch],
-                metadatas=[c["metadata"] for c in batch],
+            started = time.perf_counter()
+            profile = (
+                self.profiler.capture("index", f"{self.collection_name}: chunks {i}-{i + len(batch)}")
+                if self.profiler
+                else nullcontext()
             )
+            with profile:
+                # Upsert so re-indexing replaces chunks with the same position-based IDs
+                self.collection.upsert(
+                    ids=[c["id"] for c in batch],
+                    documents=[c["text"] for c in batch],
+                    metadatas=[c["metadata"] for c in batch],
+                )
+            if self.scheduler:
+                self.scheduler.done(time.perf_counter() - started)
+            i += len(batch)
+        return all_chunks, total_symbols
+
+    def _chunking(self) -> str:
+        """Settings that decide which files are indexed and how they are chunked."""
+        return json.dumps({"chunk_size": self.chunk_size, "overlap": self.overlap, "patterns": sorted(self.patterns)})
+
+    def _indexed_state(self, physical: Optional[str]) -> Tuple[Optional[str], set]:
+        """Commit the live version was built from and the files dirty at the time.
+
+        (None, empty) when the version cannot be updated incrementally, including
+        when it was chunked with other settings.
+        """
+        if not physical or is_sharded(self.index_path, physical):
+            return None, set()  # sharded versions are rebuilt in full
+        db_path = symbol_db_path(self.index_path, physical)
+        if not db_path.exists():
+            return None, set()
+        symbols = SymbolIndex(db_path)
+        try:
+            if symbols.get_meta("chunking") != self._chunking():
+                print("⚙️ Chunk size, overlap or patterns changed since the last build; re-indexing everything")
+                return None, set()
+            dirty = json.loads(symbols.get_meta("git_dirty") or "[]")
+            return symbols.get_meta("git_commit"), {self.codebase_path / rel for rel in dirty}
+        finally:
+            symbols.close()
+
+    def _record_git_state(self, symbols: SymbolIndex):
+        if self.git_root:
+            commit = head_commit(self.git_root)
+            symbols.set_meta("git_commit", commit or "")
+            symbols.set_meta("git_branch", current_branch(self.git_root) or "")
+            # Indexed from the work tree: uncommitted and untracked files match no commit
+            dirty = dirty_files(self.codebase_path, self.patterns) if commit else set()
+            rels = sorted(path.relative_to(self.codebase_path).as_posix() for path in dirty)
+            symbols.set_meta("git_dirty", json.dumps(rels))
 
-        print(f"✅ Indexed {len(all_chunks)} chunks from {len(py_files)} files")
+    def _carry_over(self, source_name: str, skip_files: set) -> int:
+        """Copy chunks (with their embeddings) of unchanged files from the previous version."""
+        source = self.client.get_collection(source_name)
+        copied = offset = 0
+        while True:
+            page = source.get(include=["documents", "metadatas", "embeddings"], limit=1000, offset=offset)
+            ids = page.get("ids", [])
+            if not ids:
+                return copied
+            keep = [i for i, meta in enumerate(page["metadatas"]) if (meta or {}).get("file") not in skip_files]
+            if keep:
+                self.collection.add(
+                    ids=[ids[i] for i in keep],
+                    documents=[page["documents"][i] for i in keep],
+                    metadatas=[page["metadatas"][i] for i in keep],
+                    embeddings=[page["embeddings"][i] for i in keep],
+                )
+                copied += len(keep)
+            offset += len(ids)
 
-        stats = {
-            "total_files": len(py_files),
-            "total_chunks": len(all_chunks),
-            "chunk_size": self.chunk_size,
-            "overlap": self.overlap,
-        }
+    def _write_stats(self, stats: Dict, collection_name: str) -> Dict:
+        if self.scheduler:
+            stats["throttled_seconds"] = round(self.scheduler.paused_seconds, 1)
         self.index_path.mkdir(parents=True, exist_ok=True)
-        with open(self.index_path / "index_stats.json", "w", encoding="utf-8") as f:
+        stats_path = self.index_path / f"index_stats_{collection_name}.json"
+        with open(stats_path, "w", encoding="utf-8") as f:
             json.dump(stats, f, indent=2)
         return stats
 
+    def index_codebase(self):
+        # The version being replaced; its unchanged file summaries are reused
+        previous = resolve_collection(self.index_path, self.collection_name)
+        changed = None
+        if self.git_root and not self.full:
+            base_commit, was_dirty = self._indexed_state(previous)
+            branch = current_branch(self.git_root)
+            if base_commit:
+                changed = changed_files(self.codebase_path, base_commit, self.patterns)
+            if changed is not None:
+                # Files dirty at the last build are stale even if their edits were reverted since
+                changed |= was_dirty
+            base_branch = self.base_branch or default_branch(self.git_root)
+            if self.overlays and base_commit and changed is not None and branch != base_branch:
+                return self.index_overlay(branch, base_commit, changed)
+            if self.shards > 1:
+                changed = None
+            if changed is not None and not changed:
+                symbols = SymbolIndex(symbol_db_path(self.index_path, previous))
+                self._record_git_state(symbols)
+                symbols.close()
+                print(f"✅ '{self.collection_name}' is up to date with {branch}")
+                stats = {
+                    "collection": self.collection_name,
+                    "physical_collection": previous,
+                    "mode": "update",
+                    "changed_files": 0,
+                }
+                return self._write_stats(stats, self.collection_name)
+
+        target = self._open_target()
+        mode = "update" if changed is not None else "full"
+        print(f"🔍 Indexing {self.codebase_path} into '{self.collection_name}' ({target}, {mode})...")
+        py_files = self.list_files()
+        print(f"Found {len(py_files)} files matching {', '.join(self.patterns)}")
+
+        try:
+            to_index = py_files
+            if changed is not None:
+                # Only the diff is chunked and embedded; everything else is carried over
+                changed_rel = {self._relative_file(path) for path in changed}
+                if target != previous:
+                    carried = self._carry_over(previous, changed_rel)
+                    self.symbols.copy_from(symbol_db_path(self.index_path, previous), changed_rel)
+                    print(f"📋 Carried over {carried} chunks of unchanged files")
+                else:
+                    rels = sorted(changed_rel)
+                    for i in range(0, len(rels), 100):
+                        self.collection.delete(where={"file": {"$in": rels[i : i + 100]}})
+                    for rel in rels:
+                        self.symbols.remove_file(rel)
+                to_index = [path for path in py_files if path in changed]
+                print(f"Re-indexing {len(to_index)} changed files ({len(changed) - len(to_index)} removed)")
+            all_chunks, total_symbols = self._build(to_index)
+            summary_stats = {}
+            if self.summaries:
+                summary_stats = build_summaries(
+                    self.client,
+                    target,
+                    previous,
+                    py_files,
+                    self._relative_file,
+                    scheduler=self.scheduler,
+                    changed=changed,
+                )
+                print(
+                    f"🗂️ Summaries: {summary_stats['files']} files, {summary_stats['dirs']} directories "
+                    f"({summary_stats['embedded']} embedded, {summary_stats['reused']} reused)"
+                )
+        except BaseException:
+            self._discard(target)
+            raise
+
+        self.symbols.set_meta("root", str(self.codebase_path.parent.resolve()))
+        self.symbols.set_meta("chunking", self._chunking())
+        self._record_git_state(self.symbols)
+        self.symbols.close()
+        self._publish(target)
+        print(f"✅ Indexed {len(all_chunks)} chunks from {len(to_index)} files")
+        print(f"✅ Indexed {total_symbols} symbol definitions")
+
+        return self._write_stats(
+            {
+                "collection": self.collection_name,
+                "physical_collection": target,
+                "mode": mode,
+                "changed_files": len(changed) if changed is not None else None,
+                "total_files": len(py_files),
+                "total_chunks": self.collection.count(),
+                "total_symbols": total_symbols,
+                "chunk_size": self.chunk_size,
+                "overlap": self.overlap,
+                "summaries": summary_stats,
+                "shards": self.shards,
+            },
+            self.collection_name,
+        )
+
+    def index_overlay(self, branch: str, base_commit: str, changed: set) -> Dict:
+        """Index only the files `branch` changed relative to the base index.
+
+        The overlay is a small collection of its own; searches on the branch
+        use it for these files and the base index for everything else.
+        """
+        logical = overlay_name(self.collection_name, branch)
+        target = version_name(logical)
+        self.collection = self.client.create_collection(
+            name=target, metadata={"description": f"{self.codebase_path.name} chunks on {branch}"}
+        )
+        self.symbols = SymbolIndex(symbol_db_path(self.index_path, target))
+        existing = sorted(path for path in changed if path.is_file())
+        print(f"🌿 Indexing {len(existing)} files changed on '{branch}' into overlay '{logical}'...")
+        try:
+            all_chunks, total_symbols = self._build(existing)
+        except BaseException:
+            self.symbols.close()
+            self.client.delete_collection(target)
+            symbol_db_path(self.index_path, target).unlink(missing_ok=True)
+            raise
+
+        self.symbols.set_meta("root", str(self.codebase_path.parent.resolve()))
+        self.symbols.set_meta("chunking", self._chunking())
+        self.symbols.set_meta("overlay_of", self.collection_name)
+        self.symbols.set_meta("base_commit", base_commit)
+        # Deleted files are shadowed too, so the base stops returning them
+        self.symbols.set_meta("shadowed", json.dumps(sorted(self._relative_file(path) for path in changed)))
+        self._record_git_state(self.symbols)
+        self.symbols.close()
+        previous = swap_alias(self.index_path, logical, target)
+        print(f"🔁 '{logical}' now serves '{target}' (was '{previous}')")
+        for name in collect_garbage(self.client, self.index_path, self.gc_grace_seconds):
+            print(f"🗑️ Dropped retired collection '{name}'")
+        deleted = len(changed) - len(existing)
+        print(f"✅ Overlay: {len(all_chunks)} chunks from {len(existing)} files, {deleted} deleted")
+
+        return self._write_stats(
+            {
+                "collection": logical,
+                "physical_collection": target,
+                "mode": "overlay",
+                "branch": branch,
+                "base_commit": base_commit,
+                "changed_files": len(changed),
+                "total_chunks": len(all_chunks),
+                "total_symbols": total_symbols,
+            },
+            logical,
+        )
+
 
 def main():
-    indexer = CodebaseIndexer()
-    stats = indexer.index_codebase()
-
-    print("\n" + "=" * 60)
-    print("INDEXING COMPLETE")
-    print("=" * 60)
-    print(f"Files: {stats['total_files']}")
-    print(f"Chunks: {stats['total_chunks']}")
-    print("Index location: ./chroma_db")
+    config = load_config()
+    bases = load_knowledge_bases(config)
+
+    parser = argparse.ArgumentParser(description="Index knowledge bases into ChromaDB")
+    parser.add_argument(
+        "--kb",
+        action="append",
+        choices=list(bases),
+        help="Knowledge base to index (repeatable; default: all configured bases)",
+    )
+    parser.add_argument("--index-path", default="./chroma_db")
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Write into the live collection instead of a shadow version",
+    )
+    parser.add_argument(
+        "--foreground",
+        action="store_true",
+        help="Index at full speed instead of yielding to interactive queries",
+    )
+    parser.add_argument("--shards", type=int, help="Split chunks over N databases (default: indexing.shards)")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-index every file instead of only those git reports as changed",
+    )
+    args = parser.parse_args()
+    indexing = config.get("indexing", {}) or {}
+    git = config.get("git", {}) or {}
+    profiler = QueryProfiler.from_config(config)
+    grace_minutes = float(indexing.get("gc_grace_minutes", 30))
+
+    for name in args.kb or list(bases):
+        indexer = CodebaseIndexer.from_knowledge_base(
+            bases[name],
+            index_path=args.index_path,
+            blue_green=not args.in_place,
+            gc_grace_seconds=grace_minutes * 60,
+            vector_store=export_method(config),
+            summaries=bool(indexing.get("summaries", True)),
+            shards=args.shards or int(indexing.get("shards", 1)),
+            scheduler=None if args.foreground else IndexScheduler.from_config(config, args.index_path),
+            use_git=git.get("enabled", True) is not False,
+            base_branch=git.get("base_branch"),
+            overlays=bool(git.get("overlays", True)),
+            full=args.full,
+            profiler=profiler,
+        )
+        stats = indexer.index_codebase()
+
+        print("\n" + "=" * 60)
+        print(f"INDEXING COMPLETE: {name} ({stats['mode']})")
+        print("=" * 60)
+        if stats.get("changed_files") is not None:
+            print(f"Changed files: {stats['changed_files']}")
+        if "total_files" in stats:
+            print(f"Files: {stats['total_files']}")
+        if "total_chunks" in stats:
+            print(f"Chunks: {stats['total_chunks']}")
+        print(f"Collection: {stats['collection']}")
+        print(f"Index location: {args.index_path}")
     print("\nYou can now use indexed_assistant.py for fast queries!")
 
 
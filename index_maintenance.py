@@ -0,0 +1,262 @@
+"""
+Index Maintenance for the Chroma Store
+Reports index health, removes orphaned/duplicate chunks and rebuilds a
+collection into a fresh one behind an alias swap.
+
+Usage:
+    python index_maintenance.py report  [--kb NAME]
+    python index_maintenance.py compact [--kb NAME] [--vacuum]
+    python index_maintenance.py rebuild [--kb NAME] [--drop-old]
+"""
+
+import argparse
+import json
+import shutil
+import sqlite3
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import chromadb
+
+from git_changes import repo_root
+from index_aliases import collect_garbage, resolve_collection, swap_alias, version_name
+from index_codebase import list_files
+from knowledge_bases import load_config, load_knowledge_bases
+from sharded_index import is_sharded
+from summaries import build_summaries, summary_collection_name
+from symbol_index import SymbolIndex, symbol_db_path
+from vector_store import MANIFEST, export_collection, store_path
+
+PAGE_SIZE = 1000
+
+
+class IndexMaintenance:
+    def __init__(self, kb: Dict, index_path: str = "./chroma_db", use_git: bool = True):
+        self.kb = kb
+        self.index_path = Path(index_path)
+        self.root = Path(kb["path"]).parent
+        # Rebuilt summaries cover the same files a build indexes
+        self.git_root = repo_root(kb["path"]) if use_git else None
+        self.client = chromadb.PersistentClient(path=str(self.index_path))
+        self.physical_name = resolve_collection(self.index_path, kb["collection"])
+        if is_sharded(self.index_path, self.physical_name):
+            raise ValueError(f"'{kb['collection']}' is sharded; rebuild it with index_codebase.py instead")
+        self.collection = self.client.get_collection(self.physical_name)
+        self._line_counts: Dict[str, int] = {}
+
+    # ---------- Scanning ----------
+
+    def iter_records(self, include_embeddings: bool = False):
+        include = ["metadatas", "documents"]
+        if include_embeddings:
+            include.append("embeddings")
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=PAGE_SIZE, offset=offset)
+            ids = page.get("ids", [])
+            if not ids:
+                return
+            embeddings = page.get("embeddings")
+            for i, chunk_id in enumerate(ids):
+                yield {
+                    "id": chunk_id,
+                    "metadata": page["metadatas"][i] or {},
+                    "document": page["documents"][i],
+                    "embedding": embeddings[i] if include_embeddings and embeddings is not None else None,
+                }
+            offset += len(ids)
+
+    def _line_count(self, file: str) -> int:
+        """Lines in a source file, -1 if it no longer exists."""
+        if file not in self._line_counts:
+            path = self.root / file
+            try:
+                with open(path, "rb") as f:
+                    self._line_counts[file] = sum(1 for _ in f)
+            except OSError:
+                self._line_counts[file] = -1
+        return self._line_counts[file]
+
+    def scan(self) -> Dict:
+        """Classify every chunk as live, orphaned or duplicate."""
+        per_file = Counter()
+        dimensions = Counter()
+        orphans: List[str] = []
+        duplicates: List[str] = []
+        seen = {}
+        for record in self.iter_records(include_embeddings=True):
+            meta = record["metadata"]
+            file = meta.get("file", "")
+            per_file[file] += 1
+            if record["embedding"] is not None:
+                dimensions[len(record["embedding"])] += 1
+
+            line_count = self._line_count(file)
+            if line_count < 0 or meta.get("start_line", 1) > max(line_count, 1):
+                orphans.append(record["id"])
+                continue
+            key = (file, meta.get("start_line"), meta.get("end_line"))
+            if key in seen:
+                duplicates.append(record["id"])
+            else:
+                seen[key] = record["id"]
+
+        return {
+            "collection": self.kb["collection"],
+            "physical_collection": self.physical_name,
+            "total_chunks": sum(per_file.values()),
+            "files": len(per_file),
+            "chunks_per_file": dict(per_file),
+            "embedding_dimensions": dict(dimensions),
+            "orphans": orphans,
+            "duplicates": duplicates,
+            "disk_bytes": sum(p.stat().st_size for p in self.index_path.rglob("*") if p.is_file()),
+        }
+
+    def _has_summaries(self) -> bool:
+        try:
+            self.client.get_collection(summary_collection_name(self.physical_name))
+            return True
+        except Exception:
+            return False
+
+    # ---------- Commands ----------
+
+    def report(self) -> Dict:
+        report = self.scan()
+        print(f"Collection: {report['collection']} -> {report['physical_collection']}")
+        print(f"Index size on disk: {report['disk_bytes'] / (1024 * 1024):.1f} MB")
+        print(f"Chunks: {report['total_chunks']} across {report['files']} files")
+        dims = report["embedding_dimensions"]
+        if len(dims) > 1:
+            print(f"⚠️ Inconsistent embedding dimensions: {dims}")
+        else:
+            print(f"Embedding dimension: {next(iter(dims), 'n/a')}")
+        print(f"Orphaned chunks: {len(report['orphans'])}")
+        print(f"Duplicate chunks: {len(report['duplicates'])}")
+        print("\nChunks per file:")
+        for file, count in sorted(report["chunks_per_file"].items(), key=lambda item: -item[1]):
+            missing = " (missing)" if self._line_count(file) < 0 else ""
+            print(f"  {count:5d}  {file}{missing}")
+        return report
+
+    def compact(self, vacuum: bool = False) -> Dict:
+        """Delete orphaned and duplicate chunks in place."""
+        report = self.scan()
+        stale = report["orphans"] + report["duplicates"]
+        for i in range(0, len(stale), PAGE_SIZE):
+            self.collection.delete(ids=stale[i : i + PAGE_SIZE])
+
+        missing_files = [f for f in report["chunks_per_file"] if self._line_count(f) < 0]
+        db_path = symbol_db_path(self.index_path, self.physical_name)
+        if db_path.exists():
+            symbols = SymbolIndex(db_path)
+            for file in missing_files:
+                symbols.remove_file(file)
+            symbols.close()
+
+        print(f"🧹 Removed {len(report['orphans'])} orphaned and {len(report['duplicates'])} duplicate chunks")
+        if vacuum:
+            self.vacuum()
+        return report
+
+    def vacuum(self):
+        """Reclaim free pages in the SQLite files (briefly locks the store)."""
+        before = sum(p.stat().st_size for p in self.index_path.rglob("*") if p.is_file())
+        for db_file in [self.index_path / "chroma.sqlite3", *self.index_path.glob("symbols_*.db")]:
+            if db_file.exists():
+                conn = sqlite3.connect(str(db_file))
+                try:
+                    conn.execute("VACUUM")
+                finally:
+                    conn.close()
+        after = sum(p.stat().st_size for p in self.index_path.rglob("*") if p.is_file())
+        print(f"🗜️ Vacuumed: {before / (1024 * 1024):.1f} MB -> {after / (1024 * 1024):.1f} MB")
+
+    def rebuild(self, drop_old: bool = False, grace_seconds: float = 1800) -> str:
+        """Copy live chunks into a fresh collection and swap the alias to it.
+
+        Queries keep using the old collection until the alias flips, so they
+        never wait on the rebuild. The old collection is retired and dropped
+        after the grace period, or immediately with `drop_old`.
+        """
+        report = self.scan()
+        skip = set(report["orphans"]) | set(report["duplicates"])
+        new_name = version_name(self.kb["collection"])
+        target = self.client.create_collection(name=new_name, metadata=self.collection.metadata)
+
+        batch = defaultdict(list)
+        copied = 0
+        for record in self.iter_records(include_embeddings=True):
+            if record["id"] in skip:
+                continue
+            batch["ids"].append(record["id"])
+            batch["documents"].append(record["document"])
+            batch["metadatas"].append(record["metadata"])
+            batch["embeddings"].append(record["embedding"])
+            if len(batch["ids"]) >= PAGE_SIZE:
+                target.add(**batch)
+                copied += len(batch["ids"])
+                batch = defaultdict(list)
+        if batch["ids"]:
+            target.add(**batch)
+            copied += len(batch["ids"])
+
+        old_symbols = symbol_db_path(self.index_path, self.physical_name)
+        if old_symbols.exists():
+            shutil.copy2(old_symbols, symbol_db_path(self.index_path, new_name))
+        if self._has_summaries():
+            files = list_files(self.kb["path"], self.kb["patterns"], self.git_root)
+            # Unchanged files keep their summary embeddings from the old version
+            build_summaries(
+                self.client, new_name, self.physical_name, files, lambda p: str(p.relative_to(self.root))
+            )
+        old_store = store_path(self.index_path, self.physical_name)
+        if (old_store / MANIFEST).exists():
+            with open(old_store / MANIFEST, "r", encoding="utf-8") as f:
+                old_manifest = json.load(f)
+            export_collection(
+                target,
+                store_path(self.index_path, new_name),
+                method=old_manifest["method"],
+                rescore=old_manifest["rescore"],
+            )
+
+        old_name = swap_alias(self.index_path, self.kb["collection"], new_name)
+        self.physical_name, self.collection = new_name, target
+        print(f"🔁 Rebuilt {copied} chunks into '{new_name}' (was '{old_name}')")
+        for name in collect_garbage(self.client, self.index_path, 0 if drop_old else grace_seconds):
+            print(f"🗑️ Dropped retired collection '{name}'")
+        return new_name
+
+
+def main():
+    config = load_config()
+    bases = load_knowledge_bases(config)
+
+    parser = argparse.ArgumentParser(description="Chroma index maintenance")
+    parser.add_argument("command", choices=["report", "compact", "rebuild"])
+    parser.add_argument("--kb", action="append", choices=list(bases), help="Knowledge base (default: all)")
+    parser.add_argument("--index-path", default="./chroma_db")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite files after compacting")
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previous collection after a rebuild")
+    args = parser.parse_args()
+    grace_minutes = float((config.get("indexing", {}) or {}).get("gc_grace_minutes", 30))
+    git_enabled = (config.get("git", {}) or {}).get("enabled", True) is not False
+
+    for name in args.kb or list(bases):
+        print("=" * 60)
+        print(f"{args.command.upper()}: {name}")
+        print("=" * 60)
+        maintenance = IndexMaintenance(bases[name], index_path=args.index_path, use_git=git_enabled)
+        if args.command == "report":
+            maintenance.report()
+        elif args.command == "compact":
+            maintenance.compact(vacuum=args.vacuum)
+        else:
+            maintenance.rebuild(drop_old=args.drop_old, grace_seconds=grace_minutes * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Background Indexing Scheduler
+Keeps index builds from competing with interactive queries for the CPU.
+
+The assistant marks queries in flight with a small heartbeat file in the
+index directory (`QueryActivity`), which works whether indexing runs in the
+GUI process or as `python index_codebase.py` next to it. The indexer asks
+`IndexScheduler` before each embedding batch: it waits while a query is in
+flight, shrinks batches while other processes keep the CPU busy, grows them
+back when the machine is idle, and sleeps between batches to honor the
+configured duty cycle. The indexing process also lowers its own priority
+and caps its math-library threads.
+"""
+
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+ACTIVITY_FILE = ".query_activity"
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 45  # a marker not refreshed for this long belongs to a crashed process
+POLL_SECONDS = 0.5
+DEFAULT_BATCH = 100
+MIN_BATCH = 8
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "ORT_NUM_THREADS")
+
+
+class QueryActivity:
+    """Marks queries in flight, visible to indexers in any process."""
+
+    def __init__(self, index_path):
+        self.path = Path(index_path) / ACTIVITY_FILE
+        self._lock = threading.Lock()
+        self._active = 0
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @contextmanager
+    def busy(self):
+        self._enter()
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def _enter(self):
+        with self._lock:
+            self._active += 1
+            if self._active > 1:
+                return
+            self._touch()
+            # The last query's heartbeat may still be sleeping; it carries on for this one
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name="query-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _exit(self):
+        with self._lock:
+            self._active -= 1
+            if self._active:
+                return
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+    def _touch(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.touch()
+        except OSError:
+            pass
+
+    def _beat(self):
+        # Long generations outlive STALE_SECONDS; keep the marker fresh until done
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                if not self._active:
+                    self._heartbeat = None
+                    return
+                self._touch()
+
+    def in_flight(self) -> bool:
+        try:
+            return time.time() - self.path.stat().st_mtime < STALE_SECONDS
+        except OSError:
+            return False
+
+
+class _CpuSampler:
+    """Share of total CPU time used by other processes since the last sample."""
+
+    def __init__(self):
+        self.cores = os.cpu_count() or 1
+        self._last = self._sample()
+
+    @staticmethod
+    def _system_times():
+        """(busy, total) CPU seconds for the whole machine, or None."""
+        system = platform.system()
+        if system == "Linux":
+            with open("/proc/stat", "r", encoding="utf-8") as f:
+                fields = [float(v) for v in f.readline().split()[1:]]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+            tick = os.sysconf("SC_CLK_TCK")
+            return (sum(fields) - idle) / tick, sum(fields) / tick
+        if system == "Windows":
+            import ctypes
+
+            idle, kernel, user = (ctypes.c_ulonglong() for _ in range(3))
+            ctypes.windll.kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user))
+            # 100 ns units; kernel time includes idle time
+            total = (kernel.value + user.value) / 1e7
+            return total - idle.value / 1e7, total
+        return None
+
+    def _sample(self):
+        try:
+            times = self._system_times()
+        except Exception:
+            times = None
+        return times, time.process_time(), time.monotonic()
+
+    def other_load(self) -> float:
+        times, own, wall = self._sample()
+        last_times, last_own, last_wall = self._last
+        self._last = (times, own, wall)
+        if times is not None and last_times is not None and times[1] > last_times[1]:
+            busy = (times[0] - last_times[0]) - (own - last_own)
+            return max(0.0, min(1.0, busy / (times[1] - last_times[1])))
+        if hasattr(os, "getloadavg"):
+            # Coarser fallback (macOS): 1-minute load average minus this process
+            elapsed = max(wall - last_wall, 1e-6)
+            own_cores = (own - last_own) / elapsed
+            return max(0.0, min(1.0, (os.getloadavg()[0] - own_cores) / self.cores))
+        return 0.0
+
+
+def lower_process_priority():
+    """Run this process below normal priority so interactive work wins."""
+    try:
+        if platform.system() == "Windows":
+            import ctypes
+
+            below_normal = 0x4000
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), below_normal)
+        else:
+            os.nice(10)
+    except Exception as e:
+        print(f"⚠️ Could not lower indexing priority: {e}")
+
+
+def limit_threads(max_threads: int):
+    """Cap math-library thread pools; effective when set before the embedding model loads."""
+    for var in _THREAD_VARS:
+        os.environ[var] = str(max_threads)
+    try:
+        import torch
+
+        torch.set_num_threads(max_threads)
+    except Exception:
+        pass
+
+
+class IndexScheduler:
+    """Paces embedding batches around interactive use.
+
+    Call `next_batch()` before each batch (it may block) and `done(seconds)`
+    after it.
+    """
+
+    def __init__(
+        self,
+        index_path,
+        max_threads: Optional[int] = None,
+        duty_cycle: float = 0.5,
+        max_cpu_load: float = 0.5,
+        batch_size: int = DEFAULT_BATCH,
+        min_batch: int = MIN_BATCH,
+        max_wait_seconds: Optional[float] = None,
+    ):
+        self.activity = QueryActivity(index_path)
+        self.max_threads = max_threads or max(1, (os.cpu_count() or 2) // 2)
+        self.duty_cycle = min(max(duty_cycle, 0.05), 1.0)
+        self.max_cpu_load = max_cpu_load
+        self.max_batch = batch_size
+        self.min_batch = min(min_batch, batch_size)
+        self.batch_size = batch_size
+        # None: wait for queries as long as they run
+        self.max_wait_seconds = max_wait_seconds
+        self.paused_seconds = 0.0
+        self._cpu = _CpuSampler()
+        self._started = False
+
+    @classmethod
+    def from_config(cls, config: Dict, index_path) -> Optional["IndexScheduler"]:
+        """Scheduler for `indexing.background`, or None when throttling is off."""
+        background = (config.get("indexing", {}) or {}).get("background", {}) or {}
+        if not background.get("enabled", True):
+            return None
+        return cls(
+            index_path,
+            max_threads=background.get("max_threads"),
+            duty_cycle=float(background.get("duty_cycle", 0.5)),
+            max_cpu_load=float(background.get("max_cpu_load", 0.5)),
+            batch_size=int(background.get("batch_size", DEFAULT_BATCH)),
+        )
+
+    def start(self):
+        """Lower this process's priority and thread counts (once, before embedding starts)."""
+        if self._started:
+            return
+        self._started = True
+        lower_process_priority()
+        limit_threads(self.max_threads)
+        print(
+            f"🐢 Background indexing: {self.max_threads} threads, {int(self.duty_cycle * 100)}% duty cycle, "
+            "pausing for queries"
+        )
+
+    def next_batch(self) -> int:
+        """Size of the next batch, after waiting out any query in flight."""
+        self.start()
+        waited = 0.0
+        announced = False
+        while self.activity.in_flight():
+            if self.max_wait_seconds is not None and waited >= self.max_wait_seconds:
+                break
+            if not announced:
+                print("⏸️ Query in progress, indexing paused")
+                announced = True
+            time.sleep(POLL_SECONDS)
+            waited += POLL_SECONDS
+        if announced:
+            print("▶️ Indexing resumed")
+            # The query just finished; start small in case a follow-up comes in
+            self.batch_size = self.min_batch
+        self.paused_seconds += waited
+
+        load = self._cpu.other_load()
+        if load > self.max_cpu_load:
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+        elif self.batch_size < self.max_batch:
+            self.batch_size = min(self.max_batch, self.batch_size * 2)
+        return self.batch_size
+
+    def done(self, seconds: float):
+        """Rest after a batch so indexing uses at most `duty_cycle` of wall time."""
+        if self.duty_cycle < 1.0:
+            rest = seconds * (1.0 - self.duty_cycle) / self.duty_cycle
+            self.paused_seconds += rest
+            time.sleep(rest)
@@ -3,12 +3,49 @@ Indexed LLM Assistant using Vector Search
 Fast semantic search with ChromaDB
 """
 
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Tuple
 
 import chromadb
 import ollama
 
+from assistant_core import stream_chat
+from context_compression import compress_blocks, compression_level, describe
+from context_tools import ContextTools, hit_outline, is_tool_prompt, run_tool_loop, tool_context
+from context_tools import describe as describe_tools
+from file_cache import get_file_cache, mentioned_symbols
+from git_changes import current_branch, overlay_name, repo_root
+from hardware_profile import runtime_options
+from index_aliases import alias_stamp, resolve_collection
+from index_scheduler import QueryActivity
+from knowledge_bases import default_selection, load_knowledge_bases
+from prompts import DEFAULT_KEEP_ALIVE, PrefillTracker, PromptTemplate, order_context_blocks
+from query_profiler import QueryProfiler
+from reranker import DEFAULT_RERANK_MODEL, Reranker
+from runtime_config import get_config
+from sharded_index import SHARD_TIMEOUT_MS, ShardedCollection, is_sharded
+from summaries import summary_collection_name
+from symbol_index import SymbolIndex, lookup_target, symbol_db_path
+from vector_store import FLAT_MAX_CHUNKS, MANIFEST, VectorStore, embed_texts, store_path
+
+SHARD_RETIRE_SECONDS = 60  # replaced shard workers finish in-flight searches first
+
+
+def _similarity(distance: float, space: str) -> float:
+    """Map a Chroma distance to cosine similarity so collections can be merged."""
+    if space == "l2":
+        # Squared L2 between unit vectors is 2 - 2cos
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+
+def _by_base(name: str, result: Dict) -> Dict:
+    """One knowledge base's search result with `degraded` keyed by its name (empty when complete)."""
+    return {"chunks": result["chunks"], "degraded": {name: result["degraded"]} if result["degraded"] else {}}
+
 
 class IndexedAssistant:
     def __init__(
@@ -16,23 +53,426 @@ class IndexedAssistant:
         model: str = "qwen2.5-coder:7b",
         index_path: str = "./chroma_db",
         top_k: int = 3,
+        knowledge_bases: Optional[List[str]] = None,
     ):
-        import yaml
-        from pathlib import Path
-        config_path = Path(__file__).parent / "config.yaml"
-        with open(config_path, "r", encoding="utf-8") as f:
-            self.config = yaml.safe_load(f)
+        self.config = get_config().data
         self.model = model
         self.top_k = top_k
+        self.index_path = Path(index_path)
+        # Tells background indexers (any process) to back off while we search or answer
+        self.activity = QueryActivity(self.index_path)
+        self.knowledge_bases = load_knowledge_bases(self.config)
+        self.selected_bases = list(knowledge_bases or default_selection(self.knowledge_bases))
+        for name in self.selected_bases:
+            if name not in self.knowledge_bases:
+                raise ValueError(f"Unknown knowledge base: {name}")
         self.client = chromadb.PersistentClient(path=index_path)
-        self.collection = self.client.get_collection(
-            self.config.get("indexing", {}).get("collection_name", "universal_knowledge")
-        )
+        self.file_cache = get_file_cache()
+        self.prefill = PrefillTracker()
+        self.last_iterative: Dict = {}
+        # Opt-in: profiles of queries slower than profiling.query_threshold_ms
+        self.profiler = QueryProfiler.from_config(self.config)
+
+        # Collections and symbol tables are opened on first use
+        self._collections: Dict[str, object] = {}
+        self._backends: Dict[str, object] = {}
+        self._symbols: Dict[str, Tuple[Optional[SymbolIndex], Optional[Path]]] = {}
+        self._summaries: Dict[str, object] = {}
+        self._counts: Dict[str, int] = {}
+        # Branch overlays (see index_codebase.py): git roots per base, overlays per (base, branch)
+        self.use_git = (self.config.get("git", {}) or {}).get("enabled", True) is not False
+        self._git_roots: Dict[str, Optional[Path]] = {}
+        self._overlays: Dict[Tuple[str, str], Optional[Dict]] = {}
+        self._load_lock = threading.Lock()
+        self._alias_stamp = alias_stamp(self.index_path)
+        self._search_pool: Optional[ThreadPoolExecutor] = None
+
+        retrieval = self.config.get("retrieval", {}) or {}
+        # "auto", "chroma", "flat" or "quantized" (stores exported by vector_store.py)
+        self.backend = retrieval.get("backend", "auto")
+        self.flat_max_chunks = int(retrieval.get("flat_max_chunks", FLAT_MAX_CHUNKS))
+        self.last_compression: Dict = {}
+        self._load_settings()
+        self.reranker: Optional[Reranker] = None
+        if retrieval.get("rerank", False):
+            self.reranker = Reranker(
+                model_name=retrieval.get("rerank_model", DEFAULT_RERANK_MODEL),
+                budget_ms=int(retrieval.get("rerank_budget_ms", 250)),
+                batch_size=int(retrieval.get("rerank_batch_size", 16)),
+            )
+            self.reranker.warm_up()
+
+        # Fail fast when the primary collection has not been indexed
+        self.get_collection(self.selected_bases[0])
+        get_config().subscribe(self.apply_config)
+
+    def _load_settings(self):
+        """Settings that can change while running (re-read by apply_config)."""
+        ollama_cfg = self.config.get("ollama", {}) or {}
+        self.host = ollama_cfg.get("host")
+        self.keep_alive = ollama_cfg.get("keep_alive", DEFAULT_KEEP_ALIVE)
+        self.timeout = ollama_cfg.get("timeout")
+        self.options = runtime_options(self.config)
+        # The primary knowledge base's template sets the (cacheable) system prefix
+        self.prompt = PromptTemplate.from_config(self.config, self.knowledge_bases[self.selected_bases[0]])
+        # "iterative": outline the top hits and let the model fetch symbols and lines itself
+        context = self.config.get("context", {}) or {}
+        self.context_mode = context.get("mode", "full")
+        self.max_lines = int(context.get("max_lines_per_file", 300))
+        iterative = context.get("iterative", {}) or {}
+        self.max_steps = int(iterative.get("max_steps", 4))
+        self.token_budget = int(iterative.get("token_budget", 4000))
+
+        retrieval = self.config.get("retrieval", {}) or {}
+        self.rerank_candidates = int(retrieval.get("candidates", 50))
+        # Search file/directory summaries first: True, False or "auto" (large bases only)
+        self.hierarchical = retrieval.get("hierarchical", "auto")
+        self.hierarchical_min_chunks = int(retrieval.get("hierarchical_min_chunks", 20000))
+        self.coarse_k = int(retrieval.get("coarse_k", 20))
+        # Context compression before prompt assembly: off, light, medium, aggressive
+        self.compression = compression_level(retrieval.get("compression", "light"))
+        self.compression_full_chunks = int(retrieval.get("compression_full_chunks", 2))
+        # Sharded indexes: shards slower than this are left out of the merge
+        self.shard_timeout_ms = int(retrieval.get("shard_timeout_ms", SHARD_TIMEOUT_MS))
+
+    def apply_config(self, config: Dict, changed: Set[str]):
+        """Pick up a reloaded config.yaml without reopening collections or shard workers.
+
+        The model is left to the caller (the GUI keeps its own selection).
+        """
+        self.config = config
+        retrieval = config.get("retrieval", {}) or {}
+        if "retrieval.top_k" in changed:
+            self.top_k = int(retrieval.get("top_k", self.top_k))
+        if "retrieval.rerank_budget_ms" in changed and self.reranker is not None:
+            self.reranker.budget_ms = int(retrieval.get("rerank_budget_ms", 250))
+        self._load_settings()
+        if "retrieval.shard_timeout_ms" in changed:
+            for collection in list(self._collections.values()):
+                if isinstance(collection, ShardedCollection):
+                    collection.timeout_s = self.shard_timeout_ms / 1000
+
+    @property
+    def collection(self):
+        return self.get_collection(self.selected_bases[0])
+
+    def refresh_index(self) -> bool:
+        """Switch to newly published index versions; True if anything changed.
 
-    def search_codebase(self, query: str, top_k: Optional[int] = None) -> List[Dict]:
+        Only the alias file is stat'ed, so this is cheap enough to run before
+        every search.
+        """
+        stamp = alias_stamp(self.index_path)
+        if stamp == self._alias_stamp:
+            return False
+        with self._load_lock:
+            if stamp == self._alias_stamp:
+                return False
+            self._alias_stamp = stamp
+            # Old handles stay valid for in-flight searches until garbage-collected;
+            # shard workers are stopped a little later for the same reason
+            for old in self._collections.values():
+                if isinstance(old, ShardedCollection):
+                    timer = threading.Timer(SHARD_RETIRE_SECONDS, old.close)
+                    timer.daemon = True
+                    timer.start()
+            self._collections = {}
+            self._backends = {}
+            self._symbols = {}
+            self._summaries = {}
+            self._counts = {}
+            self._overlays = {}
+        print("🔁 New index version detected, switching over")
+        return True
+
+    def get_collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._load_lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    physical = resolve_collection(self.index_path, self.knowledge_bases[name]["collection"])
+                    if is_sharded(self.index_path, physical):
+                        collection = ShardedCollection(self.index_path, physical, timeout_ms=self.shard_timeout_ms)
+                    else:
+                        collection = self.client.get_collection(physical)
+                    self._collections[name] = collection
+        return collection
+
+    def get_overlay(self, name: str) -> Optional[Dict]:
+        """Overlay index of the checked-out branch for a knowledge base, or None.
+
+        Only the branch name is read per call (from .git/HEAD); overlays built
+        on an older base commit are ignored until they are re-indexed.
+        """
+        if not self.use_git:
+            return None
+        if name not in self._git_roots:
+            self._git_roots[name] = repo_root(self.knowledge_bases[name]["path"])
+        root = self._git_roots[name]
+        branch = current_branch(root) if root else None
+        if not branch:
+            return None
+        key = (name, branch)
+        if key not in self._overlays:
+            overlay = self._load_overlay(name, branch)
+            with self._load_lock:
+                self._overlays.setdefault(key, overlay)
+        return self._overlays[key]
+
+    def _load_overlay(self, name: str, branch: str) -> Optional[Dict]:
+        logical = overlay_name(self.knowledge_bases[name]["collection"], branch)
+        physical = resolve_collection(self.index_path, logical)
+        db_path = symbol_db_path(self.index_path, physical)
+        if physical == logical or not db_path.exists():
+            return None
+        symbols = SymbolIndex(db_path)
+        base_symbols, _ = self.get_symbols(name)
+        base_commit = base_symbols.get_meta("git_commit") if base_symbols else None
+        if symbols.get_meta("base_commit") != base_commit:
+            print(f"⚠️ Overlay for '{branch}' predates the current '{name}' index; re-run index_codebase.py")
+            symbols.close()
+            return None
+        print(f"🌿 Searching '{name}' with the '{branch}' overlay")
+        return {
+            "branch": branch,
+            "collection": self.client.get_collection(physical),
+            "symbols": symbols,
+            "root": Path(symbols.get_meta("root", ".")),
+            "shadowed": json.loads(symbols.get_meta("shadowed", "[]")),
+        }
+
+    def get_search_backend(self, name: str):
+        """Object answering `query()` for a knowledge base: a NumPy store or Chroma.
+
+        "auto" prefers an exported flat store below `flat_max_chunks`, then a
+        quantized store, and falls back to the Chroma collection.
+        """
+        backend = self._backends.get(name)
+        if backend is None:
+            if self.backend != "chroma":
+                physical = resolve_collection(self.index_path, self.knowledge_bases[name]["collection"])
+                path = store_path(self.index_path, physical)
+                if (path / MANIFEST).exists():
+                    # Documents are read from the version the store was exported from
+                    store = VectorStore.open(path, source=lambda: self.client.get_collection(physical))
+                    if store.method == "flat":
+                        usable = self.backend == "flat" or (
+                            self.backend == "auto" and store.count <= self.flat_max_chunks
+                        )
+                    else:
+                        usable = self.backend in ("auto", "quantized")
+                    backend = store if usable else None
+            if backend is None:
+                backend = self.get_collection(name)
+            with self._load_lock:
+                backend = self._backends.setdefault(name, backend)
+        return backend
+
+    def get_summaries(self, name: str):
+        """The file/directory summary collection of a knowledge base, or None."""
+        if name not in self._summaries:
+            physical = resolve_collection(self.index_path, self.knowledge_bases[name]["collection"])
+            try:
+                summaries = self.client.get_collection(summary_collection_name(physical))
+            except Exception:
+                summaries = None
+            with self._load_lock:
+                self._summaries.setdefault(name, summaries)
+        return self._summaries[name]
+
+    def _use_hierarchy(self, name: str) -> bool:
+        if self.hierarchical is False or self.get_summaries(name) is None:
+            return False
+        if self.hierarchical == "auto":
+            if name not in self._counts:
+                backend = self.get_search_backend(name)
+                count = backend.count
+                self._counts[name] = count() if callable(count) else count
+            return self._counts[name] >= self.hierarchical_min_chunks
+        return True
+
+    def _coarse_filter(self, name: str, query_embedding: List[float]) -> Optional[Dict]:
+        """`where` filter limiting chunk search to the best-matching files and directories."""
+        results = self.get_summaries(name).query(query_embeddings=[query_embedding], n_results=self.coarse_k)
+        files, dirs = [], []
+        for meta in results.get("metadatas", [[]])[0]:
+            if meta.get("level") == "dir":
+                dirs.append(meta["dir"])
+            elif meta.get("file"):
+                files.append(meta["file"])
+        clauses = []
+        if files:
+            clauses.append({"file": {"$in": files}})
+        if dirs:
+            clauses.append({"dir": {"$in": dirs}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    def get_symbols(self, name: str) -> Tuple[Optional[SymbolIndex], Optional[Path]]:
+        """Symbol table and file root for a knowledge base, if it has one."""
+        if name not in self._symbols:
+            with self._load_lock:
+                if name not in self._symbols:
+                    physical = resolve_collection(self.index_path, self.knowledge_bases[name]["collection"])
+                    db_path = symbol_db_path(self.index_path, physical)
+                    if db_path.exists():
+                        symbols = SymbolIndex(db_path)
+                        self._symbols[name] = (symbols, Path(symbols.get_meta("root", ".")))
+                    else:
+                        self._symbols[name] = (None, None)
+        return self._symbols[name]
+
+    def find_definitions(self, names: List[str], limit: int = 3) -> List[Dict]:
+        """Exact symbol-table hits for `names`, with their source text."""
+        hits: List[Dict] = []
+        for base in self.selected_bases:
+            symbols, root = self.get_symbols(base)
+            if symbols is None:
+                continue
+            # The branch overlay answers for the files it changed
+            overlay = self.get_overlay(base)
+            tables = [(symbols, root, set(overlay["shadowed"]) if overlay else set())]
+            if overlay:
+                tables.insert(0, (overlay["symbols"], overlay["root"], set()))
+            for name in names:
+                rows = [
+                    (row, table_root)
+                    for table, table_root, hidden in tables
+                    for row in table.lookup(name, limit=limit)
+                    if row["file"] not in hidden
+                ]
+                for row, file_root in rows[:limit]:
+                    try:
+                        row["text"] = self.file_cache.read_lines(
+                            file_root / row["file"], row["start_line"], row["end_line"]
+                        )
+                    except OSError:
+                        continue
+                    row["symbol"] = name
+                    row["knowledge_base"] = base
+                    hits.append(row)
+        return hits
+
+    def answer_lookup(self, question: str) -> Optional[str]:
+        """Answer a pure "where is X defined" question from the symbol table."""
+        target = lookup_target(question)
+        if not target:
+            return None
+        hits = self.find_definitions([target], limit=5)
+        if not hits:
+            return None
+
+        parts = []
+        for hit in hits:
+            parts.append(
+                f"`{hit['qualname']}` ({hit['kind']}) is defined in {hit['file']} "
+                f"lines {hit['start_line']}-{hit['end_line']}:\n\n```python\n{hit['text'].rstrip()}\n```"
+            )
+        refs = []
+        for base in dict.fromkeys(hit["knowledge_base"] for hit in hits):
+            refs.extend(self.get_symbols(base)[0].references(target, limit=20))
+        refs = [
+            r for r in refs
+            if not any(r["file"] == h["file"] and h["start_line"] <= r["line"] <= h["end_line"] for h in hits)
+        ]
+        if refs:
+            parts.append("Referenced in: " + ", ".join(f"{r['file']}:{r['line']}" for r in refs))
+        return "\n\n".join(parts)
+
+    def search_codebase(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        bases: Optional[List[str]] = None,
+        rerank: Optional[bool] = None,
+    ) -> List[Dict]:
+        """Search the selected knowledge bases, merging results by similarity.
+
+        With reranking enabled, `candidates` chunks are over-fetched and the
+        cross-encoder picks the best `top_k` of them.
+        """
+        return self.search_results(query, top_k, bases, rerank)["chunks"]
+
+    def search_results(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        bases: Optional[List[str]] = None,
+        rerank: Optional[bool] = None,
+    ) -> Dict:
+        """`search_codebase` plus `degraded`: knowledge base -> shards left out of its results."""
+        self.refresh_index()
         k = top_k or self.top_k
-        results = self.collection.query(query_texts=[query], n_results=k)
+        use_reranker = self.reranker is not None and rerank is not False
+        if use_reranker:
+            results = self._search(query, max(k, self.rerank_candidates), bases)
+            results["chunks"] = self.reranker.rerank(query, results["chunks"], k)
+            return results
+        return self._search(query, k, bases)
+
+    def _search(self, query: str, k: int, bases: Optional[List[str]]) -> Dict:
+        names = bases or self.selected_bases
+        if len(names) == 1:
+            return _by_base(names[0], self._search_collection(names[0], query, k))
+
+        if self._search_pool is None:
+            self._search_pool = ThreadPoolExecutor(
+                max_workers=min(8, len(self.knowledge_bases)),
+                thread_name_prefix="kb-search",
+            )
+        futures = {name: self._search_pool.submit(self._search_collection, name, query, k) for name in names}
+        merged: List[Dict] = []
+        degraded: Dict[str, List[int]] = {}
+        for name, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"⚠️ Search in knowledge base '{name}' failed: {e}")
+                continue
+            merged.extend(result["chunks"])
+            degraded.update(_by_base(name, result)["degraded"])
+        merged.sort(key=lambda chunk: chunk["score"], reverse=True)
+        return {"chunks": merged[:k], "degraded": degraded}
 
+    def _search_collection(self, name: str, query: str, k: int) -> Dict:
+        """Top `k` chunks of one knowledge base, and the shards (if sharded) that missed the deadline."""
+        overlay = self.get_overlay(name)
+        shadowed = overlay["shadowed"] if overlay else None
+        backend = self.get_search_backend(name)
+        chunks, degraded = self._query_chunks(name, backend, query, k, self._use_hierarchy(name), shadowed)
+        if overlay is None:
+            return {"chunks": chunks, "degraded": degraded}
+        # Files changed on the branch come from the overlay, everything else from the base
+        overlay_chunks, _ = self._query_chunks(name, overlay["collection"], query, k)
+        merged = sorted(overlay_chunks + chunks, key=lambda chunk: chunk["score"], reverse=True)
+        return {"chunks": merged[:k], "degraded": degraded}
+
+    def _query_chunks(
+        self,
+        name: str,
+        collection,
+        query: str,
+        k: int,
+        hierarchical: bool = False,
+        shadowed: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict], List[int]]:
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        exclude = {"file": {"$nin": shadowed}} if shadowed else None
+        if hierarchical:
+            # Coarse layer first, then chunks inside the top files/directories only
+            embedding = embed_texts([query])[0].tolist()
+            where = self._coarse_filter(name, embedding)
+            combined = {"$and": [where, exclude]} if where and exclude else where or exclude
+            results = collection.query(query_embeddings=[embedding], n_results=k, where=combined)
+            if where is not None and len(results.get("ids", [[]])[0]) < k:
+                results = collection.query(query_embeddings=[embedding], n_results=k, where=exclude)
+        else:
+            results = collection.query(query_texts=[query], n_results=k, where=exclude)
+
+        # Sharded collections list the shards that failed or timed out
+        degraded = results.get("degraded", [])
         chunks: List[Dict] = []
         ids = results.get("ids", [[]])[0]
         documents = results.get("documents", [[]])[0]
@@ -43,15 +483,28 @@ class IndexedAssistant:
         for i in range(len(ids)):
             chunks.append(
                 {
+                    "id": ids[i],
                     "text": documents[i],
                     "metadata": metadatas[i],
                     "distance": dists[i],
+                    "score": _similarity(dists[i], space),
+                    "knowledge_base": name,
                 }
             )
-        return chunks
+        return chunks, degraded
 
-    def query(self, question: str, top_k: Optional[int] = None, files: Optional[List[str]] = None) -> str:
-        relevant_chunks = self.search_codebase(question, top_k)
+    def _warn_degraded(self, results: Dict) -> List[Dict]:
+        for name, shards in results["degraded"].items():
+            print(f"⚠️ '{name}' answered without shards {shards}; context may be missing matches")
+        return results["chunks"]
+
+    def context_blocks(self, query: str, top_k: Optional[int] = None, files: Optional[List[str]] = None) -> List[Dict]:
+        """Definitions of mentioned symbols plus the search hits for `query`, as context blocks.
+
+        Blocks are in rank order and already compressed at `retrieval.compression`.
+        """
+        with self.activity.busy():
+            relevant_chunks = self._warn_degraded(self.search_results(query, top_k))
 
         # Filter by specific files if provided
         if files:
@@ -61,27 +514,123 @@ class IndexedAssistant:
                 if any(file in chunk["metadata"].get("file", "") for file in files)
             ]
 
-        context = ""
+        blocks = [
+            {
+                "id": f"def:{hit['file']}:{hit['start_line']}",
+                "file": hit["file"],
+                "start_line": hit["start_line"],
+                "header": f"lines {hit['start_line']}-{hit['end_line']}, definition of {hit['qualname']}",
+                "note": f"definition of {hit['qualname']}",
+                "text": hit["text"],
+            }
+            for hit in self.find_definitions(mentioned_symbols(query))
+        ]
         for chunk in relevant_chunks:
-            file = chunk["metadata"].get("file", "")
             start = chunk["metadata"].get("start_line", "?")
-            context += f"\n\n=== {file} (lines {start}+) ===\n{chunk['text']}"
+            blocks.append(
+                {
+                    "id": chunk.get("id") or f"{chunk['metadata'].get('file', '')}:{start}",
+                    "file": chunk["metadata"].get("file", ""),
+                    "start_line": start if isinstance(start, int) else 0,
+                    "header": f"lines {start}+",
+                    "text": chunk["text"],
+                }
+            )
+        if self.compression:
+            blocks, self.last_compression = compress_blocks(blocks, self.compression, self.compression_full_chunks)
+            print(describe(self.last_compression))
+        return blocks
+
+    def prepare(self, question: str, top_k: Optional[int] = None, files: Optional[List[str]] = None) -> List[Dict]:
+        self.refresh_index()
 
-        prompt = f"""You are a helpful AI coding assistant for AetherMUD development.
-AetherMUD is a Rifts-themed MUD built on Evennia framework in Python.
+        # Pure definition lookups are answered straight from the symbol table
+        direct = self.answer_lookup(question)
+        if direct is not None:
+            return [{"role": "assistant", "content": direct}]
 
-Relevant code context (from semantic search):
-{context}
+        if self.context_mode == "iterative":
+            return self.prompt.messages(question, tool_context(self.outline(question, top_k, files), search=True))
 
-Question: {question}
+        blocks = self.context_blocks(question, top_k, files)
 
-Provide a clear, code-focused answer referencing specific files and lines when relevant."""
+        # File order rather than rank order keeps overlapping follow-ups on a shared prefix
+        context = ""
+        for block in order_context_blocks(blocks):
+            context += f"\n\n=== {block['file']} ({block['header']}) ===\n{block['text']}"
+
+        return self.prompt.messages(question, context)
+
+    def outline(self, question: str, top_k: Optional[int] = None, files: Optional[List[str]] = None) -> str:
+        """Iterative-mode context: where the top hits and mentioned definitions are, not their code."""
+        with self.activity.busy():
+            hits = self._warn_degraded(self.search_results(question, top_k))
+        if files:
+            hits = [hit for hit in hits if any(file in hit["metadata"].get("file", "") for file in files)]
+        parts = [hit_outline(hits)] if hits else []
+        definitions = [
+            f"{hit['kind']} {hit['qualname']}: {hit['file']} lines {hit['start_line']}-{hit['end_line']}"
+            for hit in self.find_definitions(mentioned_symbols(question))
+        ]
+        if definitions:
+            parts.append("Mentioned definitions:\n" + "\n".join(definitions))
+        return "\n\n".join(parts) or "(no matching code found; use search)"
 
-        response = ollama.chat(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+    def context_tools(self) -> ContextTools:
+        """Tool resolver over the selected knowledge bases' symbol tables, files and search."""
+        roots = [root for root in (self.get_symbols(base)[1] for base in self.selected_bases) if root]
+        return ContextTools(
+            self.file_cache,
+            roots,
+            symbol_lookup=lambda name: self.find_definitions([name]),
+            search=lambda query: self.search_codebase(query),
+            max_lines=self.max_lines,
         )
-        return response["message"]["content"]
+
+    def generate(self, messages: List[Dict], cancel_event=None, register_abort=None) -> str:
+        # prepare() already produced the answer for symbol lookups
+        if messages and messages[-1]["role"] == "assistant":
+            return messages[-1]["content"]
+
+        def chat(turn: List[Dict]) -> str:
+            stats = {}
+            answer = stream_chat(
+                self.model,
+                turn,
+                host=self.host,
+                cancel_event=cancel_event,
+                register_abort=register_abort,
+                keep_alive=self.keep_alive,
+                stats=stats,
+                options=self.options,
+                timeout=self.timeout,
+            )
+            self.prefill.record(turn, stats)
+            return answer
+
+        with self.activity.busy():
+            if not is_tool_prompt(messages):
+                return chat(messages)
+            answer, self.last_iterative = run_tool_loop(
+                chat, messages, self.context_tools(), self.max_steps, self.token_budget
+            )
+        print(describe_tools(self.last_iterative))
+        return answer
+
+    def query(self, question: str, top_k: Optional[int] = None, files: Optional[List[str]] = None) -> str:
+        if self.profiler is None:
+            return self.generate(self.prepare(question, top_k, files=files))
+        session = self.profiler.session("query", question)
+        status = "error"
+        try:
+            with session.stage("prepare"):
+                messages = self.prepare(question, top_k, files=files)
+            with session.stage("generate"):
+                answer = self.generate(messages)
+            status = "done"
+            return answer
+        finally:
+            session.finish(status)
 
     def get_file_chunks(self, file_path: str) -> List[Dict]:
         results = self.collection.get(where={"file": file_path})
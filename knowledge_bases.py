@@ -0,0 +1,79 @@
+"""
+Knowledge Base Configuration
+Resolves the named knowledge bases in config.yaml so the indexer and the
+assistants always agree on paths, chunking and collection names.
+
+Example config.yaml section:
+
+    knowledge_bases:
+      aethermud:
+        path: "../aethermud-code"
+        collection: "aethermud_code"
+        chunk_size: 300
+        overlap: 50
+        patterns: ["*.py"]
+        search_by_default: true
+        prompt:
+          system: "You are an assistant for the AetherMUD codebase..."
+      design-docs:
+        path: "../design-docs"
+        collection: "design_docs"
+        patterns: ["*.md", "*.txt"]
+
+When the section is missing, a single base is derived from `codebase.path`
+and `indexing.collection_name`.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from runtime_config import get_config
+
+DEFAULT_COLLECTION = "universal_knowledge"
+DEFAULT_CHUNK_SIZE = 300
+DEFAULT_OVERLAP = 50
+DEFAULT_PATTERNS = ["*.py"]
+
+
+def load_config(config_path: Optional[Path] = None) -> Dict:
+    """The shared, validated config.yaml (see runtime_config.py); an absent file yields {}."""
+    return get_config(config_path).data
+
+
+def load_knowledge_bases(config: Dict) -> Dict[str, Dict]:
+    """Normalized knowledge base definitions keyed by name, in config order."""
+    indexing = config.get("indexing", {}) or {}
+    raw = config.get("knowledge_bases")
+    if not raw:
+        raw = {
+            "default": {
+                "path": (config.get("codebase", {}) or {}).get("path", "../aethermud-code"),
+                "collection": indexing.get("collection_name", DEFAULT_COLLECTION),
+                "search_by_default": True,
+            }
+        }
+
+    bases: Dict[str, Dict] = {}
+    for name, entry in raw.items():
+        entry = entry or {}
+        if "path" not in entry:
+            raise ValueError(f"Knowledge base '{name}' has no path")
+        bases[name] = {
+            "name": name,
+            "path": entry["path"],
+            "collection": entry.get("collection", name),
+            "chunk_size": int(entry.get("chunk_size", indexing.get("chunk_size", DEFAULT_CHUNK_SIZE))),
+            "overlap": int(entry.get("overlap", indexing.get("overlap", DEFAULT_OVERLAP))),
+            "patterns": list(entry.get("patterns", DEFAULT_PATTERNS)),
+            "search_by_default": bool(entry.get("search_by_default", False)),
+            "prompt": dict(entry.get("prompt") or {}),
+        }
+        if bases[name]["overlap"] >= bases[name]["chunk_size"]:
+            raise ValueError(f"Knowledge base '{name}': overlap must be smaller than chunk_size")
+    return bases
+
+
+def default_selection(bases: Dict[str, Dict]) -> List[str]:
+    """Bases searched when the caller does not pick any: the flagged ones, else the first."""
+    selected = [name for name, kb in bases.items() if kb["search_by_default"]]
+    return selected or list(bases)[:1]
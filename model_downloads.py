@@ -0,0 +1,303 @@
+"""
+Model Download Manager
+Pulls Ollama models through `/api/pull`, several at a time, turning the
+per-layer completed/total counters into overall progress, throughput and ETA.
+
+Ollama keeps partially downloaded blobs, so re-issuing a pull continues where
+it stopped. Dropped connections are retried with backoff, and pulls that
+never finished are recorded in a state file so the next run can resume them.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+DEFAULT_HOST = "http://localhost:11434"
+STATE_FILE = ".downloads.json"
+DEFAULT_CONCURRENT_DOWNLOADS = 2
+THROUGHPUT_WINDOW = 5.0  # seconds of samples used for speed/ETA
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a pull when the manager is cancelled."""
+
+
+class PullProgress:
+    """Aggregated progress of one model pull."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.status = "queued"
+        self.layers: Dict[str, Tuple[int, int]] = {}  # digest -> (completed, total)
+        self.resumed_bytes = 0
+        self.attempts = 0
+        self.started = time.monotonic()
+        self._samples: deque = deque()  # (time, bytes downloaded this session)
+        self._downloaded = 0
+
+    @property
+    def completed(self) -> int:
+        return sum(done for done, _ in self.layers.values())
+
+    @property
+    def total(self) -> int:
+        return sum(total for _, total in self.layers.values())
+
+    def update(self, data: Dict):
+        self.status = data.get("status", self.status)
+        digest = data.get("digest")
+        if not digest or not data.get("total"):
+            return
+        completed, total = int(data.get("completed") or 0), int(data["total"])
+        if digest not in self.layers:
+            # Bytes already on disk from an earlier run are not throughput
+            if self.attempts <= 1:
+                self.resumed_bytes += completed
+            self.layers[digest] = (completed, total)
+            return
+        previous = self.layers[digest][0]
+        self.layers[digest] = (max(previous, completed), total)
+        if completed > previous:
+            self._downloaded += completed - previous
+            now = time.monotonic()
+            self._samples.append((now, self._downloaded))
+            while len(self._samples) > 2 and now - self._samples[0][0] > THROUGHPUT_WINDOW:
+                self._samples.popleft()
+
+    def bytes_per_second(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def snapshot(self) -> Dict:
+        total = self.total
+        speed = self.bytes_per_second()
+        remaining = max(0, total - self.completed)
+        return {
+            "model": self.model,
+            "status": self.status,
+            "completed": self.completed,
+            "total": total,
+            "fraction": self.completed / total if total else 0.0,
+            "bytes_per_second": speed,
+            "eta_seconds": remaining / speed if speed > 0 else None,
+            "resumed_bytes": self.resumed_bytes,
+            "attempts": self.attempts,
+        }
+
+    def describe(self) -> str:
+        snap = self.snapshot()
+        if not snap["total"]:
+            return f"{self.model}: {self.status}"
+        text = (
+            f"{self.model}: {snap['fraction'] * 100:.0f}% "
+            f"({_format_bytes(snap['completed'])} / {_format_bytes(snap['total'])})"
+        )
+        if snap["bytes_per_second"]:
+            text += f" · {_format_bytes(snap['bytes_per_second'])}/s"
+        if snap["eta_seconds"] is not None:
+            text += f" · ETA {_format_duration(snap['eta_seconds'])}"
+        return text
+
+
+class ModelDownloadManager:
+    """Runs model pulls concurrently with retry and resume."""
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        max_concurrent: int = DEFAULT_CONCURRENT_DOWNLOADS,
+        max_retries: int = 5,
+        state_path: Optional[Path] = None,
+        timeout: float = 60,
+    ):
+        self.host = host.rstrip("/")
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_retries = max_retries
+        self.state_path = Path(state_path or Path(__file__).parent / STATE_FILE)
+        self.timeout = timeout  # per read, not for the whole pull
+        self.progress: Dict[str, PullProgress] = {}
+        self._cancel = threading.Event()
+        self._state_lock = threading.Lock()
+        self._responses: Dict[str, requests.Response] = {}
+
+    # ---------- Public API ----------
+
+    def pull(self, model: str, on_progress: Optional[Callable[[PullProgress], None]] = None) -> Tuple[bool, str]:
+        """Pull one model, retrying dropped connections. Returns (success, message)."""
+        progress = self.progress.setdefault(model, PullProgress(model))
+        self._record_pending(model, progress)
+        delay = 1.0
+        failures = 0
+        while True:
+            progress.attempts += 1
+            before = progress.completed
+            try:
+                self._stream_pull(model, progress, on_progress)
+                self._clear_pending(model)
+                return True, f"Model {model} downloaded successfully"
+            except DownloadCancelled:
+                return False, f"Download of {model} cancelled (will resume next time)"
+            except requests.exceptions.HTTPError as e:
+                self._clear_pending(model)
+                return False, f"Failed to download model: {e}"
+            except ValueError as e:
+                # Error reported by the server inside the stream (e.g. unknown model)
+                self._clear_pending(model)
+                return False, f"Failed to download model: {e}"
+            except (requests.exceptions.RequestException, OSError) as e:
+                # Only consecutive attempts that made no progress count against the limit
+                if progress.completed > before:
+                    failures, delay = 1, 1.0
+                else:
+                    failures += 1
+                if failures > self.max_retries:
+                    return False, f"Error downloading model: {e} (will resume next time)"
+                progress.status = f"connection lost, retrying in {delay:.0f}s"
+                if on_progress:
+                    on_progress(progress)
+                if self._cancel.wait(delay):
+                    return False, f"Download of {model} cancelled (will resume next time)"
+                delay = min(delay * 2, 30.0)
+
+    def pull_many(
+        self,
+        models: List[str],
+        on_progress: Optional[Callable[[PullProgress], None]] = None,
+    ) -> Dict[str, Tuple[bool, str]]:
+        """Pull several models, at most `max_concurrent` at a time."""
+        models = list(dict.fromkeys(models))
+        self._cancel.clear()
+        for model in models:
+            self.progress.setdefault(model, PullProgress(model))
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="pull") as pool:
+            futures = {model: pool.submit(self.pull, model, on_progress) for model in models}
+            return {model: future.result() for model, future in futures.items()}
+
+    def interrupted(self) -> List[str]:
+        """Models whose last pull did not finish."""
+        return list(self._read_state())
+
+    def resume(self, on_progress: Optional[Callable[[PullProgress], None]] = None) -> Dict[str, Tuple[bool, str]]:
+        return self.pull_many(self.interrupted(), on_progress)
+
+    def overall(self) -> Dict:
+        """Combined progress across every tracked pull."""
+        snaps = [p.snapshot() for p in self.progress.values()]
+        completed = sum(s["completed"] for s in snaps)
+        total = sum(s["total"] for s in snaps)
+        speed = sum(s["bytes_per_second"] for s in snaps)
+        return {
+            "completed": completed,
+            "total": total,
+            "fraction": completed / total if total else 0.0,
+            "bytes_per_second": speed,
+            "eta_seconds": (total - completed) / speed if speed > 0 else None,
+        }
+
+    def cancel(self):
+        """Stop all pulls; partial downloads stay on disk for resuming."""
+        self._cancel.set()
+        for response in list(self._responses.values()):
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    # ---------- Internals ----------
+
+    def _stream_pull(self, model: str, progress: PullProgress, on_progress):
+        if self._cancel.is_set():
+            raise DownloadCancelled()
+        response = requests.post(
+            f"{self.host}/api/pull",
+            json={"name": model, "stream": True},
+            stream=True,
+            timeout=(5, self.timeout),
+        )
+        self._responses[model] = response
+        try:
+            response.raise_for_status()
+            # Layers are re-announced on every attempt; start their accounting fresh
+            progress.layers.clear()
+            saw_success = False
+            last_saved = time.monotonic()
+            for line in response.iter_lines():
+                if self._cancel.is_set():
+                    raise DownloadCancelled()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "error" in data:
+                    raise ValueError(data["error"])
+                progress.update(data)
+                saw_success = saw_success or data.get("status") == "success"
+                if on_progress:
+                    on_progress(progress)
+                if data.get("total") and time.monotonic() - last_saved > 2.0:
+                    self._record_pending(model, progress)
+                    last_saved = time.monotonic()
+            if self._cancel.is_set():
+                raise DownloadCancelled()
+            if not saw_success:
+                raise requests.exceptions.ConnectionError("pull stream ended before completion")
+        except requests.exceptions.RequestException:
+            if self._cancel.is_set():
+                raise DownloadCancelled()
+            raise
+        finally:
+            self._responses.pop(model, None)
+            response.close()
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state: Dict):
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def _record_pending(self, model: str, progress: PullProgress):
+        with self._state_lock:
+            state = self._read_state()
+            state[model] = {"completed": progress.completed, "total": progress.total, "updated": time.time()}
+            self._write_state(state)
+
+    def _clear_pending(self, model: str):
+        with self._state_lock:
+            state = self._read_state()
+            if state.pop(model, None) is not None:
+                self._write_state(state)
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
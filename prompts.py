@@ -0,0 +1,109 @@
+"""
+Prompt Templates and Prefix Reuse
+Builds chat messages so the long, unchanging part of every prompt (system
+message, then context) forms an identical prefix that the Ollama server can
+reuse from its KV cache, and measures how much prefill that saves.
+
+Templates come from `prompts:` in config.yaml and can be overridden per
+knowledge base with a `prompt:` entry. Placeholders: {app_name}, {context},
+{question}.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+DEFAULT_SYSTEM = (
+    "You are a helpful AI coding assistant for {app_name} development.\n"
+    "{app_name} is a Rifts-themed MUD built on Evennia framework in Python.\n"
+    "Provide clear, code-focused answers and reference specific files and lines when relevant."
+)
+DEFAULT_USER = "Relevant context:\n{context}\n\nQuestion: {question}"
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+class PromptTemplate:
+    def __init__(self, system: str = DEFAULT_SYSTEM, user: str = DEFAULT_USER, app_name: str = ""):
+        self.system_template = system
+        self.user_template = user
+        self.app_name = app_name
+        # Rendered once: the system message must be byte-identical on every call
+        self.system = system.format(app_name=app_name)
+
+    @classmethod
+    def from_config(cls, config: Dict, knowledge_base: Optional[Dict] = None) -> "PromptTemplate":
+        prompts = dict(config.get("prompts", {}) or {})
+        if knowledge_base and knowledge_base.get("prompt"):
+            prompts.update(knowledge_base["prompt"])
+        return cls(
+            system=prompts.get("system", DEFAULT_SYSTEM),
+            user=prompts.get("user", DEFAULT_USER),
+            app_name=(config.get("assistant", {}) or {}).get("name", "Universal Knowledge Assistant"),
+        )
+
+    def messages(self, question: str, context: str, history: Optional[List[Dict]] = None) -> List[Dict]:
+        """System message first, then prior turns, then context and question."""
+        user = self.user_template.format(app_name=self.app_name, context=context, question=question)
+        return [{"role": "system", "content": self.system}, *(history or []), {"role": "user", "content": user}]
+
+
+def order_context_blocks(blocks: List[Dict]) -> List[Dict]:
+    """Stable order for context blocks (by file, then line).
+
+    Ranking order changes from query to query; file order does not, so
+    follow-ups that retrieve overlapping chunks keep a longer shared prefix.
+    """
+    return sorted(blocks, key=lambda b: (str(b.get("file", "")), b.get("start_line") or 0))
+
+
+class PrefillTracker:
+    """Per-query prefill accounting from Ollama's final stream chunk.
+
+    The server only evaluates prompt tokens that were not already in its
+    cache, so `prompt_eval_count` below the prompt's full token count is
+    reused prefix. The full count is estimated from the highest tokens-per-
+    character ratio seen, which comes from cold (fully evaluated) prompts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens_per_char = 0.0
+        self.queries = 0
+        self.total_evaluated = 0
+        self.total_reused = 0
+        self.total_saved_ms = 0.0
+        self.last: Dict = {}
+
+    def record(self, messages: List[Dict], response: Dict) -> Dict:
+        evaluated = response.get("prompt_eval_count") or 0
+        eval_ms = (response.get("prompt_eval_duration") or 0) / 1e6
+        chars = sum(len(m.get("content", "")) for m in messages)
+        with self._lock:
+            if chars and evaluated:
+                self.tokens_per_char = max(self.tokens_per_char, evaluated / chars)
+            estimated = int(chars * self.tokens_per_char)
+            reused = max(0, estimated - evaluated)
+            ms_per_token = eval_ms / evaluated if evaluated else 0.0
+            self.last = {
+                "prompt_tokens_est": estimated,
+                "evaluated_tokens": evaluated,
+                "reused_tokens": reused,
+                "prefill_ms": round(eval_ms, 1),
+                "saved_ms_est": round(reused * ms_per_token, 1),
+            }
+            self.queries += 1
+            self.total_evaluated += evaluated
+            self.total_reused += reused
+            self.total_saved_ms += self.last["saved_ms_est"]
+            last = dict(self.last)
+        if reused:
+            print(f"♻️ Reused ~{reused} cached prompt tokens (~{last['saved_ms_est']:.0f} ms prefill saved)")
+        return last
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "evaluated_tokens": self.total_evaluated,
+                "reused_tokens": self.total_reused,
+                "saved_ms_est": round(self.total_saved_ms, 1),
+            }
@@ -0,0 +1,455 @@
+"""
+Query Profiler
+Opt-in capture of CPU profiles and allocation snapshots for slow queries and
+indexing batches, so one-off slowdowns can be explained after the fact.
+
+While profiling is enabled every query (and every embedding batch) runs under
+a profiler; captures that finish under the threshold are thrown away, slower
+ones are written to `profiling.output_dir` as
+
+    <id>.prof         pstats file (open with pstats, snakeviz, ...)
+    <id>.tracemalloc  tracemalloc snapshot taken when the capture finished
+    <id>.json         timings per stage and the top allocation growth sites
+                      since the previous slow capture
+
+The default "sample" mode walks the stacks of the profiled threads every few
+milliseconds, which is cheap and works for work spread over several threads
+(the GUI prepares on one thread and answers on another). "cprofile" records
+every call instead. Summarize captures with
+
+    python query_profiler.py list
+    python query_profiler.py show latest
+"""
+
+import argparse
+import cProfile
+import itertools
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MODES = ("sample", "cprofile")
+MAX_STACK_DEPTH = 200
+TRACE_FRAMES = 10
+TOP_SITES = 15
+LABEL_CHARS = 200
+SORT_LABELS = {"cumulative": "cumulative time", "tottime": "own time", "calls": "calls"}
+
+# Allocations made by the profiler itself are not interesting
+_SKIP_FILES = {tracemalloc.__file__, pstats.__file__, cProfile.__file__, __file__}
+
+_FrameKey = Tuple[str, int, str]  # pstats' (file, first line, function)
+
+
+class _Sampler:
+    """One background thread sampling the stacks of whichever threads are being profiled."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets: Dict[int, List[Counter]] = {}  # thread ident -> sample counters
+        self._wake = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="query-profiler", daemon=True)
+        self._thread.start()
+
+    def attach(self, ident: int, samples: Counter):
+        with self._wake:
+            self._targets.setdefault(ident, []).append(samples)
+            self._wake.notify()
+
+    def detach(self, ident: int, samples: Counter):
+        with self._wake:
+            # By identity: Counters with equal contents compare equal
+            counters = [c for c in self._targets.get(ident, []) if c is not samples]
+            if counters:
+                self._targets[ident] = counters
+            else:
+                self._targets.pop(ident, None)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._wake:
+                while not self._targets:
+                    self._wake.wait()
+                targets = {ident: list(counters) for ident, counters in self._targets.items()}
+            frames = sys._current_frames()
+            for ident, counters in targets.items():
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = _stack(frame)
+                for samples in counters:
+                    samples[stack] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler: Optional[_Sampler] = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler(interval: float) -> _Sampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _Sampler(interval)
+        return _sampler
+
+
+def _stack(frame) -> Tuple[_FrameKey, ...]:
+    keys = []
+    while frame is not None and len(keys) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        keys.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    keys.reverse()  # outermost first
+    return tuple(keys)
+
+
+def _sample_stats(samples: Counter, elapsed: float) -> Dict:
+    """Stack samples as a pstats table: "calls" are samples, `elapsed` is shared out per sample.
+
+    Samples arrive less often than the interval while the profiled thread holds
+    the GIL, so times are scaled to the measured wall time instead.
+    """
+    per_sample = elapsed / max(1, sum(samples.values()))
+    table: Dict[_FrameKey, list] = {}
+    for stack, count in samples.items():
+        seconds = count * per_sample
+        seen = set()
+        for depth, key in enumerate(stack):
+            entry = table.setdefault(key, [0, 0, 0.0, 0.0, {}])
+            if key not in seen:
+                # Recursive frames count once per sample
+                seen.add(key)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            if depth:
+                caller = stack[depth - 1]
+                own = seconds if depth == len(stack) - 1 else 0.0
+                cc, nc, tt, ct = entry[4].get(caller, (0, 0, 0.0, 0.0))
+                entry[4][caller] = (cc + count, nc + count, tt + own, ct + seconds)
+        if stack:
+            table[stack[-1]][2] += seconds
+    return {key: (cc, nc, tt, ct, callers) for key, (cc, nc, tt, ct, callers) in table.items()}
+
+
+class _StatsSource:
+    """Adapter letting pstats.Stats load a prebuilt stats table."""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfileSession:
+    """Profile of one query or batch, possibly spread over several threads.
+
+    Wrap each piece of work in `stage(name)` (from whichever thread runs it)
+    and call `finish()` once at the end.
+    """
+
+    def __init__(self, profiler: "QueryProfiler", kind: str, query_id: str, label: str, threshold_ms: float):
+        self.profiler = profiler
+        self.kind = kind
+        self.id = query_id
+        self.label = label[:LABEL_CHARS]
+        self.threshold_ms = threshold_ms
+        self.created_at = time.time()
+        self.stages: Dict[str, float] = {}
+        self._parts: List[object] = []  # cProfile.Profile or _StatsSource per stage
+        self._lock = threading.Lock()
+        # Traced bytes when the first stage starts; snapshots are only taken for slow captures
+        self._memory_start_bytes: Optional[int] = None
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.profiler.memory and tracemalloc.is_tracing():
+            with self._lock:
+                if self._memory_start_bytes is None:
+                    self._memory_start_bytes = tracemalloc.get_traced_memory()[0]
+        profile = None
+        samples: Optional[Counter] = None
+        if self.profiler.mode == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active (Python 3.12+ allows one); sample instead
+                profile = None
+        if profile is None:
+            samples = Counter()
+            self.profiler.sampler.attach(threading.get_ident(), samples)
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+                part = profile
+            else:
+                self.profiler.sampler.detach(threading.get_ident(), samples)
+                part = _StatsSource(_sample_stats(samples, elapsed))
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+                # A stage shorter than the sample interval has no samples, which pstats refuses to load
+                if not (isinstance(part, _StatsSource) and not part.stats):
+                    self._parts.append(part)
+
+    @property
+    def seconds(self) -> float:
+        return sum(self.stages.values())
+
+    def finish(self, status: str = "done") -> Optional[Path]:
+        """Write the capture if it exceeded the threshold; returns the report path."""
+        with self._lock:
+            if self._finished:
+                return None
+            self._finished = True
+        if self.seconds * 1000 < self.threshold_ms or not self._parts:
+            return None
+        try:
+            return self.profiler.save(self, status)
+        except Exception as e:
+            print(f"⚠️ Could not save profile {self.id}: {e}")
+            return None
+
+
+class QueryProfiler:
+    """Creates profile sessions and stores the slow ones."""
+
+    def __init__(
+        self,
+        output_dir="./profiles",
+        query_threshold_ms: float = 5000,
+        index_threshold_ms: float = 10000,
+        mode: str = "sample",
+        sample_interval_ms: float = 5,
+        memory: bool = True,
+        keep: int = 50,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}' (use {', '.join(MODES)})")
+        self.output_dir = Path(output_dir)
+        self.query_threshold_ms = query_threshold_ms
+        self.index_threshold_ms = index_threshold_ms
+        self.mode = mode
+        self.memory = memory
+        self.keep = keep
+        self.sampler = _get_sampler(sample_interval_ms / 1000)
+        self._ids = itertools.count(1)
+        # (description, snapshot) that the next slow capture's growth is measured against
+        self._baseline: Optional[Tuple[str, tracemalloc.Snapshot]] = None
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+            self._baseline = ("profiling started", tracemalloc.take_snapshot())
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["QueryProfiler"]:
+        """Profiler for the `profiling` section, or None when profiling is off."""
+        profiling = config.get("profiling", {}) or {}
+        if not profiling.get("enabled", False):
+            return None
+        profiler = cls(
+            output_dir=profiling.get("output_dir", "./profiles"),
+            query_threshold_ms=float(profiling.get("query_threshold_ms", 5000)),
+            index_threshold_ms=float(profiling.get("index_threshold_ms", 10000)),
+            mode=profiling.get("mode", "sample"),
+            sample_interval_ms=float(profiling.get("sample_interval_ms", 5)),
+            memory=bool(profiling.get("memory", True)),
+            keep=int(profiling.get("keep", 50)),
+        )
+        print(
+            f"🔬 Profiling queries over {profiler.query_threshold_ms:.0f} ms and index batches over "
+            f"{profiler.index_threshold_ms:.0f} ms into {profiler.output_dir}"
+        )
+        return profiler
+
+    def session(self, kind: str, label: str = "", query_id=None, threshold_ms: Optional[float] = None) -> ProfileSession:
+        if threshold_ms is None:
+            threshold_ms = self.index_threshold_ms if kind == "index" else self.query_threshold_ms
+        suffix = query_id if query_id is not None else next(self._ids)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{suffix}"
+        return ProfileSession(self, kind, name, label, threshold_ms)
+
+    @contextmanager
+    def capture(self, kind: str, label: str = "", query_id=None, threshold_ms: Optional[float] = None):
+        """Profile the enclosed block as a single-stage session."""
+        session = self.session(kind, label, query_id, threshold_ms)
+        status = "error"
+        try:
+            with session.stage(kind):
+                yield session
+            status = "done"
+        finally:
+            session.finish(status)
+
+    def save(self, session: ProfileSession, status: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        base = self.output_dir / session.id
+        stats = pstats.Stats(session._parts[0])
+        for part in session._parts[1:]:
+            stats.add(part)
+        stats.dump_stats(str(base) + ".prof")
+
+        memory = None
+        if session._memory_start_bytes is not None and tracemalloc.is_tracing():
+            end_bytes = tracemalloc.get_traced_memory()[0]
+            end = tracemalloc.take_snapshot()
+            end.dump(str(base) + ".tracemalloc")
+            since, baseline = self._baseline or ("", None)
+            growth = [
+                diff
+                for diff in (end.compare_to(baseline, "lineno") if baseline is not None else [])
+                if diff.size_diff > 0 and diff.traceback[0].filename not in _SKIP_FILES
+            ]
+            self._baseline = (f"capture {session.id}", end)
+            memory = {
+                "start_bytes": session._memory_start_bytes,
+                "end_bytes": end_bytes,
+                "growth_since": since,
+                "top_growth": [
+                    {
+                        "site": f"{diff.traceback[0].filename}:{diff.traceback[0].lineno}",
+                        "size_diff": diff.size_diff,
+                        "count_diff": diff.count_diff,
+                    }
+                    for diff in growth[:TOP_SITES]
+                ],
+            }
+
+        report = {
+            "id": session.id,
+            "kind": session.kind,
+            "label": session.label,
+            "status": status,
+            "created_at": session.created_at,
+            "seconds": round(session.seconds, 3),
+            "threshold_ms": session.threshold_ms,
+            "mode": self.mode,
+            "sample_interval_ms": round(self.sampler.interval * 1000, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in session.stages.items()},
+            "memory": memory,
+        }
+        report_path = base.with_suffix(".json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"🔬 Slow {session.kind} ({session.seconds:.1f} s): profile saved as {session.id}")
+        self._prune()
+        return report_path
+
+    def _prune(self):
+        reports = sorted(self.output_dir.glob("*.json"))
+        for report in reports[: max(0, len(reports) - self.keep)]:
+            for suffix in (".json", ".prof", ".tracemalloc"):
+                report.with_suffix(suffix).unlink(missing_ok=True)
+
+
+# ---------- CLI ----------
+
+
+def list_reports(output_dir) -> List[Dict]:
+    """Saved capture reports, newest first."""
+    reports = []
+    for path in sorted(Path(output_dir).glob("*.json"), reverse=True):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return reports
+
+
+def find_report(output_dir, query_id: str) -> Dict:
+    """Report by id, unique id fragment, or "latest"."""
+    reports = list_reports(output_dir)
+    if not reports:
+        raise FileNotFoundError(f"No profiles in {output_dir}")
+    if query_id == "latest":
+        return reports[0]
+    matches = [report for report in reports if query_id in report["id"]]
+    if len(matches) != 1:
+        raise ValueError(f"'{query_id}' matches {len(matches)} profiles")
+    return matches[0]
+
+
+def summarize(output_dir, report: Dict, top: int = 20, sort: str = "cumulative") -> str:
+    """Hot spots and allocation sites of one capture, as text."""
+    import io
+
+    base = Path(output_dir) / report["id"]
+    stages = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in report["stages"].items())
+    lines = [
+        f"🔬 {report['id']}: {report['kind']} took {report['seconds']:.2f} s ({stages}), {report['status']}",
+    ]
+    if report.get("label"):
+        lines.append(f"  {report['label']}")
+    if report["mode"] == "sample":
+        lines.append(f"  Sampled every {report['sample_interval_ms']} ms: ncalls are sample counts")
+
+    out = io.StringIO()
+    stats = pstats.Stats(str(base) + ".prof", stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    lines.append(f"\nTop {top} functions by {SORT_LABELS[sort]}:")
+    lines.append(out.getvalue().split("\n\n", 1)[-1].rstrip())
+
+    memory = report.get("memory")
+    if memory:
+        lines.append(
+            f"\nMemory traced: {memory['start_bytes'] / 1024 / 1024:.1f} MB → {memory['end_bytes'] / 1024 / 1024:.1f} MB"
+        )
+        if memory["top_growth"]:
+            lines.append(f"Top allocation growth since {memory.get('growth_since') or 'the capture started'}:")
+            for site in memory["top_growth"][:top]:
+                lines.append(f"  {site['size_diff'] / 1024:+10.1f} KiB {site['count_diff']:+8d} blocks  {site['site']}")
+        snapshot_path = Path(str(base) + ".tracemalloc")
+        if snapshot_path.exists():
+            lines.append("Largest live allocation sites at the end:")
+            snapshot = tracemalloc.Snapshot.load(str(snapshot_path))
+            live = [stat for stat in snapshot.statistics("lineno") if stat.traceback[0].filename not in _SKIP_FILES]
+            for stat in live[:top]:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines)
+
+
+def main():
+    from knowledge_bases import load_config
+
+    profiling = load_config().get("profiling", {}) or {}
+    parser = argparse.ArgumentParser(description="Summarize profiles of slow queries and indexing batches")
+    parser.add_argument("--dir", default=profiling.get("output_dir", "./profiles"), help="Profile directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List saved captures, newest first")
+    show_cmd = sub.add_parser("show", help="Hot spots and allocation sites of one capture")
+    show_cmd.add_argument("id", help="Capture id, a unique part of it, or 'latest'")
+    show_cmd.add_argument("--top", type=int, default=20)
+    show_cmd.add_argument("--sort", choices=list(SORT_LABELS), default="cumulative")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        reports = list_reports(args.dir)
+        if not reports:
+            print(f"No profiles in {args.dir}")
+        for report in reports:
+            label = f"  {report['label'][:60]}" if report.get("label") else ""
+            print(f"{report['id']:<40} {report['seconds']:8.2f} s  {report['status']:<9}{label}")
+        return
+    print(summarize(args.dir, find_report(args.dir, args.id), top=args.top, sort=args.sort))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Query Work Queue
+Runs GUI questions one at a time with cancellation, prefetching retrieval for
+queued questions while the current answer is still being generated.
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, List, Optional
+
+from assistant_core import QueryCancelled
+
+
+class QueryJob:
+    """A single queued question and its cancellation state."""
+
+    def __init__(self, job_id: int, question: str, files: Optional[List[str]] = None):
+        self.id = job_id
+        self.question = question
+        self.files = files
+        self.state = "queued"  # queued | retrieving | generating | done | cancelled | error
+        self.cancel_event = threading.Event()
+        self.prepared = None  # Future holding the prepared chat messages
+        self.profile = None  # ProfileSession when profiling is enabled
+        self._abort: Optional[Callable[[], None]] = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.prepared is not None:
+            self.prepared.cancel()
+        abort = self._abort
+        if abort is not None:
+            try:
+                abort()
+            except Exception:
+                pass
+
+    def stage(self, name: str):
+        """Profile a piece of this job's work (no-op when profiling is off)."""
+        return self.profile.stage(name) if self.profile is not None else nullcontext()
+
+    def _register_abort(self, abort: Callable[[], None]):
+        self._abort = abort
+        if self.cancel_event.is_set():
+            self.cancel()
+
+
+class QueryQueue:
+    """Single-answer work queue around an assistant.
+
+    The assistant must provide ``prepare(question, files=...)`` (retrieval and
+    prompt assembly) and ``generate(messages, cancel_event, register_abort)``.
+    Retrieval for every submitted question starts immediately on a retrieval
+    executor, so it overlaps with the answer currently being decoded; the
+    generation worker then answers questions strictly in submission order.
+
+    Callbacks run on the worker thread; GUI callers should marshal them onto
+    the main loop themselves. With a `profiler`, each job's retrieval and
+    generation are profiled together and slow jobs are saved under the job id.
+    """
+
+    def __init__(
+        self,
+        assistant,
+        on_result: Callable[[QueryJob, str], None],
+        on_error: Callable[[QueryJob, Exception], None],
+        on_change: Optional[Callable[[], None]] = None,
+        profiler=None,
+    ):
+        self.assistant = assistant
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_change = on_change or (lambda: None)
+        self.profiler = profiler
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending: List[QueryJob] = []
+        self._active: Optional[QueryJob] = None
+        self._jobs: "queue.Queue[Optional[QueryJob]]" = queue.Queue()
+        self._retrieval = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-retrieval")
+        self._worker = threading.Thread(target=self._run, name="query-worker", daemon=True)
+        self._closed = False
+        self._worker.start()
+
+    # ---------- Public API ----------
+
+    def submit(self, question: str, files: Optional[List[str]] = None) -> QueryJob:
+        job = QueryJob(next(self._ids), question, files)
+        if self.profiler is not None:
+            job.profile = self.profiler.session("query", question, query_id=job.id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Query queue is shut down")
+            self._pending.append(job)
+        job.prepared = self._retrieval.submit(self._prepare, job)
+        self._jobs.put(job)
+        self.on_change()
+        return job
+
+    @property
+    def active(self) -> Optional[QueryJob]:
+        return self._active
+
+    def pending(self) -> List[QueryJob]:
+        """Jobs waiting behind the active one, in answer order."""
+        with self._lock:
+            return list(self._pending)
+
+    def position(self, job: QueryJob) -> int:
+        """1-based queue position, 0 for the active job, -1 if finished."""
+        if job is self._active:
+            return 0
+        with self._lock:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return -1
+
+    def cancel(self, job_id: Optional[int] = None) -> bool:
+        """Cancel a job by id, or the active job when no id is given."""
+        with self._lock:
+            candidates = ([self._active] if self._active else []) + self._pending
+            if job_id is None:
+                target = candidates[0] if candidates else None
+            else:
+                target = next((j for j in candidates if j.id == job_id), None)
+            if target is None:
+                return False
+            if target in self._pending:
+                self._pending.remove(target)
+                target.state = "cancelled"
+        target.cancel()
+        self.on_change()
+        return True
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = ([self._active] if self._active else []) + self._pending
+            for job in self._pending:
+                job.state = "cancelled"
+            self._pending.clear()
+        for job in jobs:
+            job.cancel()
+        self.on_change()
+
+    def shutdown(self, timeout: float = 2.0):
+        """Cancel everything and stop the worker threads."""
+        with self._lock:
+            self._closed = True
+        self.cancel_all()
+        self._jobs.put(None)
+        self._retrieval.shutdown(wait=False, cancel_futures=True)
+        self._worker.join(timeout)
+
+    # ---------- Worker ----------
+
+    def _prepare(self, job: QueryJob):
+        if job.cancel_event.is_set():
+            raise QueryCancelled()
+        if job.state == "queued":
+            job.state = "retrieving"
+        with job.stage("prepare"):
+            return self.assistant.prepare(job.question, files=job.files)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                if job not in self._pending:
+                    continue  # cancelled while queued
+                self._pending.remove(job)
+                self._active = job
+            self.on_change()
+            try:
+                messages = job.prepared.result()
+                job.state = "generating"
+                self.on_change()
+                with job.stage("generate"):
+                    answer = self.assistant.generate(
+                        messages,
+                        cancel_event=job.cancel_event,
+                        register_abort=job._register_abort,
+                    )
+                job.state = "done"
+                self.on_result(job, answer)
+            except (QueryCancelled, CancelledError):
+                job.state = "cancelled"
+            except Exception as e:
+                if job.cancel_event.is_set():
+                    job.state = "cancelled"
+                else:
+                    job.state = "error"
+                    self.on_error(job, e)
+            finally:
+                if job.profile is not None:
+                    job.profile.finish(job.state)
+                with self._lock:
+                    self._active = None
+                self.on_change()
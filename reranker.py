@@ -0,0 +1,127 @@
+"""
+Cross-Encoder Reranking
+Rescores over-fetched search candidates with a small local CPU cross-encoder,
+within a hard per-query time budget.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Reranker:
+    """Reorders search results by cross-encoder relevance.
+
+    Scoring runs on a background worker. When it does not finish inside
+    `budget_ms`, the caller gets the original ANN order immediately and the
+    worker keeps going, so its scores are cached for the next identical
+    (query, chunk) pair.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        budget_ms: int = 250,
+        batch_size: int = 16,
+        cache_size: int = 8192,
+        max_chars: int = 2000,
+    ):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.max_chars = max_chars
+        self._model = None
+        self._model_error: Optional[Exception] = None
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.last_stats: Dict = {}
+
+    def warm_up(self):
+        """Load the model in the background so the first query stays in budget."""
+        self._worker.submit(self._get_model)
+
+    def rerank(self, query: str, chunks: List[Dict], top_k: int) -> List[Dict]:
+        """Return the `top_k` best chunks, or ANN order when over budget."""
+        started = time.perf_counter()
+        if len(chunks) <= 1 or self._model_error is not None:
+            return chunks[:top_k]
+
+        future = self._worker.submit(self._score, query, chunks)
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000.0)
+        except TimeoutError:
+            # Drop it if still queued behind an earlier query; a running batch
+            # finishes in the background and fills the cache
+            future.cancel()
+            self.last_stats = {"reranked": False, "reason": "budget", "ms": self.budget_ms}
+            return chunks[:top_k]
+        except Exception as e:
+            print(f"⚠️ Reranking failed, using search order: {e}")
+            self.last_stats = {"reranked": False, "reason": str(e)}
+            return chunks[:top_k]
+
+        order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        ranked = []
+        for i in order[:top_k]:
+            chunk = dict(chunks[i])
+            chunk["rerank_score"] = scores[i]
+            ranked.append(chunk)
+        self.last_stats = {
+            "reranked": True,
+            "candidates": len(chunks),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        return ranked
+
+    # ---------- Internals ----------
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None and self._model_error is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception as e:
+                    self._model_error = e
+                    print(f"⚠️ Cross-encoder unavailable ({self.model_name}): {e}")
+            if self._model_error is not None:
+                raise self._model_error
+            return self._model
+
+    def _key(self, query: str, chunk: Dict) -> Tuple[str, str]:
+        chunk_id = chunk.get("id") or hashlib.md5(chunk["text"].encode()).hexdigest()
+        return query, chunk_id
+
+    def _score(self, query: str, chunks: List[Dict]) -> List[float]:
+        keys = [self._key(query, chunk) for chunk in chunks]
+        scores: List[Optional[float]] = []
+        with self._cache_lock:
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            model = self._get_model()
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start : start + self.batch_size]
+                pairs = [(query, chunks[i]["text"][: self.max_chars]) for i in batch]
+                for i, score in zip(batch, model.predict(pairs, batch_size=self.batch_size)):
+                    scores[i] = float(score)
+                with self._cache_lock:
+                    for i in batch:
+                        self._cache[keys[i]] = scores[i]
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return scores
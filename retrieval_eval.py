@@ -0,0 +1,292 @@
+"""
+Retrieval Evaluation
+Scores search against a labeled question set (question -> expected file and
+line ranges): recall@k, MRR, average context tokens and retrieval latency.
+A sweep builds temporary indexes for several chunk_size/overlap settings in
+parallel and recommends the cheapest setting that reaches a target recall.
+
+Labeled set (YAML or JSON):
+
+    - question: "Where is combat damage calculated?"
+      expected:
+        - file: "world/combat.py"      # matched as a path suffix
+          lines: [120, 180]            # optional; omit to accept any chunk of the file
+
+Usage:
+    python retrieval_eval.py eval  --cases eval_cases.yaml [--kb NAME] [--top-k 1 3 5]
+    python retrieval_eval.py sweep --cases eval_cases.yaml [--kb NAME] \\
+        --chunk-sizes 100 200 300 --overlaps 20 50 --top-k 3 5 --target-recall 0.8
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import yaml
+
+from knowledge_bases import load_config, load_knowledge_bases
+
+CHARS_PER_TOKEN = 4
+
+
+def load_cases(path: str) -> List[Dict]:
+    """Labeled cases with expected ranges normalized to {file, start, end}."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+    if raw is not None and not isinstance(raw, list):
+        raise ValueError(f"{path} must be a list of cases")
+    cases = []
+    for i, entry in enumerate(raw or []):
+        if entry is None:
+            continue
+        if not isinstance(entry, dict) or not entry.get("question") or not entry.get("expected"):
+            raise ValueError(f"Case {i} needs a question and at least one expected range")
+        expected = []
+        for item in entry["expected"]:
+            lines = item.get("lines") or [1, None]
+            file = item["file"].replace("\\", "/")
+            if file.startswith("./"):
+                file = file[2:]
+            expected.append({"file": file, "start": int(lines[0]), "end": lines[1]})
+        cases.append({"question": entry["question"], "expected": expected})
+    if not cases:
+        raise ValueError(f"{path} has no cases; add at least one question with an expected range")
+    return cases
+
+
+def _matches(chunk: Dict, expected: Dict) -> bool:
+    meta = chunk.get("metadata") or {}
+    file = str(meta.get("file", "")).replace("\\", "/")
+    if not (file == expected["file"] or file.endswith("/" + expected["file"])):
+        return False
+    start, end = meta.get("start_line", 1), meta.get("end_line", meta.get("start_line", 1))
+    return start <= (expected["end"] or end) and end >= expected["start"]
+
+
+def _estimate_tokens(chunks: List[Dict]) -> int:
+    return sum(len(chunk.get("text") or "") for chunk in chunks) // CHARS_PER_TOKEN
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def evaluate(search: Callable[[str, int], List[Dict]], cases: List[Dict], top_ks: List[int]) -> Dict:
+    """Run every case once at the largest k; smaller k are prefixes of that ranking.
+
+    `search(question, k)` returns ranked chunks with `text` and file/line metadata.
+    """
+    max_k = max(top_ks)
+    recall = {k: [] for k in top_ks}
+    tokens = {k: [] for k in top_ks}
+    reciprocal_ranks = []
+    latencies = []
+    misses = []
+
+    for case in cases:
+        started = time.perf_counter()
+        chunks = search(case["question"], max_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        first_hit = next(
+            (rank for rank, chunk in enumerate(chunks, start=1) if any(_matches(chunk, e) for e in case["expected"])),
+            None,
+        )
+        reciprocal_ranks.append(1.0 / first_hit if first_hit else 0.0)
+        if first_hit is None:
+            misses.append(case["question"])
+        for k in top_ks:
+            top = chunks[:k]
+            found = sum(1 for e in case["expected"] if any(_matches(chunk, e) for chunk in top))
+            recall[k].append(found / len(case["expected"]))
+            tokens[k].append(_estimate_tokens(top))
+
+    return {
+        "cases": len(cases),
+        "recall": {k: round(statistics.mean(v), 3) for k, v in recall.items()},
+        "mrr": round(statistics.mean(reciprocal_ranks), 3),
+        "avg_context_tokens": {k: round(statistics.mean(v)) for k, v in tokens.items()},
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 1),
+            "p50": round(_percentile(latencies, 50), 1),
+            "p95": round(_percentile(latencies, 95), 1),
+        },
+        "misses": misses,
+    }
+
+
+def print_report(title: str, report: Dict):
+    print(f"\n📊 {title} ({report['cases']} questions)")
+    print(f"  MRR: {report['mrr']:.3f}")
+    for k, value in report["recall"].items():
+        print(f"  recall@{k}: {value:.3f}   avg context: {report['avg_context_tokens'][k]} tokens")
+    lat = report["latency_ms"]
+    print(f"  latency: mean {lat['mean']} ms, p50 {lat['p50']} ms, p95 {lat['p95']} ms")
+    if report["misses"]:
+        print(f"  ⚠️ {len(report['misses'])} questions with no relevant chunk")
+
+
+# ---------- Current index ----------
+
+
+def evaluate_current(
+    kb_name: str, cases: List[Dict], top_ks: List[int], index_path: str, rerank: Optional[bool] = None
+) -> Dict:
+    from indexed_assistant import IndexedAssistant
+
+    assistant = IndexedAssistant(index_path=index_path, knowledge_bases=[kb_name])
+    return evaluate(lambda q, k: assistant.search_codebase(q, k, rerank=rerank), cases, top_ks)
+
+
+# ---------- Parameter sweep ----------
+
+
+def _sweep_one(kb: Dict, chunk_size: int, overlap: int, cases: List[Dict], top_ks: List[int], workdir: str) -> Dict:
+    """Build a throwaway index for one setting and evaluate it (runs in a worker process)."""
+    import chromadb
+
+    from index_codebase import CodebaseIndexer
+
+    index_path = Path(tempfile.mkdtemp(prefix=f"eval_{chunk_size}_{overlap}_", dir=workdir))
+    try:
+        indexer = CodebaseIndexer(
+            codebase_path=kb["path"],
+            index_path=str(index_path),
+            chunk_size=chunk_size,
+            overlap=overlap,
+            collection_name="eval",
+            patterns=kb["patterns"],
+            blue_green=False,
+            vector_store=None,
+        )
+        started = time.perf_counter()
+        stats = indexer.index_codebase()
+        build_s = time.perf_counter() - started
+
+        collection = chromadb.PersistentClient(path=str(index_path)).get_collection("eval")
+
+        def search(question: str, k: int) -> List[Dict]:
+            results = collection.query(query_texts=[question], n_results=k)
+            return [
+                {"text": doc, "metadata": meta}
+                for doc, meta in zip(results["documents"][0], results["metadatas"][0])
+            ]
+
+        report = evaluate(search, cases, top_ks)
+        report.update(
+            {"chunk_size": chunk_size, "overlap": overlap, "chunks": stats["total_chunks"], "build_s": round(build_s, 1)}
+        )
+        return report
+    finally:
+        shutil.rmtree(index_path, ignore_errors=True)
+
+
+def sweep(
+    kb: Dict,
+    cases: List[Dict],
+    chunk_sizes: List[int],
+    overlaps: List[int],
+    top_ks: List[int],
+    workers: int = 2,
+) -> List[Dict]:
+    """Evaluate every valid chunk_size/overlap pair, building the indexes in parallel."""
+    settings = [(size, overlap) for size in chunk_sizes for overlap in overlaps if overlap < size]
+    workdir = tempfile.mkdtemp(prefix="retrieval_eval_")
+    reports = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_sweep_one, kb, size, overlap, cases, top_ks, workdir): (size, overlap)
+                for size, overlap in settings
+            }
+            for future in as_completed(futures):
+                size, overlap = futures[future]
+                try:
+                    reports.append(future.result())
+                    print(f"✅ chunk_size={size} overlap={overlap} done")
+                except Exception as e:
+                    print(f"❌ chunk_size={size} overlap={overlap} failed: {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    reports.sort(key=lambda r: (r["chunk_size"], r["overlap"]))
+    return reports
+
+
+def recommend(reports: List[Dict], target_recall: float) -> Optional[Dict]:
+    """Smallest prompt (then lowest latency) among settings reaching `target_recall`."""
+    options = [
+        {
+            "chunk_size": r["chunk_size"],
+            "overlap": r["overlap"],
+            "top_k": k,
+            "recall": recall,
+            "avg_context_tokens": r["avg_context_tokens"][k],
+            "latency_p50_ms": r["latency_ms"]["p50"],
+        }
+        for r in reports
+        for k, recall in r["recall"].items()
+        if recall >= target_recall
+    ]
+    if not options:
+        return None
+    return min(options, key=lambda o: (o["avg_context_tokens"], o["latency_p50_ms"]))
+
+
+def main():
+    config = load_config()
+    bases = load_knowledge_bases(config)
+
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency")
+    parser.add_argument("command", choices=["eval", "sweep"])
+    parser.add_argument("--cases", required=True, help="Labeled questions (YAML or JSON)")
+    parser.add_argument("--kb", choices=list(bases), default=next(iter(bases)))
+    parser.add_argument("--index-path", default="./chroma_db")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--no-rerank", action="store_true", help="Evaluate ANN order only")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 200, 300])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[20, 50])
+    parser.add_argument("--target-recall", type=float, default=0.8)
+    parser.add_argument("--workers", type=int, default=2, help="Indexes built in parallel")
+    parser.add_argument("--json", help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    cases = load_cases(args.cases)
+    top_ks = sorted(set(args.top_k))
+
+    if args.command == "eval":
+        result = evaluate_current(args.kb, cases, top_ks, args.index_path, rerank=False if args.no_rerank else None)
+        print_report(f"Current index: {args.kb}", result)
+    else:
+        reports = sweep(bases[args.kb], cases, args.chunk_sizes, args.overlaps, top_ks, workers=args.workers)
+        for report in reports:
+            print_report(
+                f"chunk_size={report['chunk_size']} overlap={report['overlap']} "
+                f"({report['chunks']} chunks, built in {report['build_s']} s)",
+                report,
+            )
+        best = recommend(reports, args.target_recall)
+        if best:
+            print(
+                f"\n🏆 Cheapest setting with recall ≥ {args.target_recall}: chunk_size={best['chunk_size']}, "
+                f"overlap={best['overlap']}, top_k={best['top_k']} "
+                f"(recall {best['recall']:.3f}, ~{best['avg_context_tokens']} tokens, p50 {best['latency_p50_ms']} ms)"
+            )
+        else:
+            print(f"\n⚠️ No setting reached recall {args.target_recall}")
+        result = {"settings": reports, "recommendation": best}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
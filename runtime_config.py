@@ -0,0 +1,330 @@
+"""
+Runtime Configuration
+One parsed and validated copy of config.yaml, shared by every component.
+
+`get_config()` reads the file once per process and checks it against
+SCHEMA, so a mistyped value stops startup with a message naming the key
+instead of failing in the middle of a query. Long-running processes (the
+GUI) call `watch()`: the file's mtime is polled and a valid edit replaces
+the shared values in one step. Components that `subscribe()` are handed the
+new values and the changed keys and re-read what can change live
+(SAFE_KEYS: model, host, timeouts, top_k, templates, ...). Other changes are
+reported as needing a restart; loaded indexes, Chroma clients and worker
+processes are never torn down by a reload.
+"""
+
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import yaml
+
+from context_compression import LEVELS as COMPRESSION_LEVELS
+
+DEFAULT_PATH = Path(__file__).parent / "config.yaml"
+POLL_SECONDS = 2.0
+
+_NUMBER = (int, float)
+
+
+class ConfigError(ValueError):
+    """config.yaml is unreadable or has invalid values."""
+
+
+def _at_least(minimum):
+    return lambda value: None if value >= minimum else f"must be at least {minimum}"
+
+
+def _between(low, high):
+    return lambda value: None if low <= value <= high else f"must be between {low} and {high}"
+
+
+def _one_of(*choices):
+    return lambda value: None if value in choices else "must be one of " + ", ".join(map(repr, choices))
+
+
+def _compression(value) -> Optional[str]:
+    if isinstance(value, (bool, int)):
+        return None
+    return _one_of(*COMPRESSION_LEVELS)(value.lower())
+
+
+def _template(value: str) -> Optional[str]:
+    try:
+        value.format(app_name="", context="", question="")
+    except (KeyError, IndexError, ValueError) as e:
+        return f"is not a valid template ({e!r}); placeholders are {{app_name}}, {{context}}, {{question}}"
+    return None
+
+
+# Dotted key -> (accepted types, extra check). Missing or null keys use the
+# component's default; keys not listed here are not checked.
+SCHEMA: Dict[str, Tuple[tuple, Optional[Callable]]] = {
+    "assistant.name": ((str,), None),
+    "models.default": ((str,), None),
+    "models.balanced": ((str,), None),
+    "models.fast": ((str,), None),
+    "codebase.path": ((str,), None),
+    "context.max_lines_per_file": ((int,), _at_least(1)),
+    "context.context_window": ((int,), _at_least(512)),
+    "context.mode": ((str,), _one_of("full", "iterative")),
+    "context.iterative.max_steps": ((int,), _at_least(0)),
+    "context.iterative.token_budget": ((int,), _at_least(1)),
+    "ollama.host": ((str,), None),
+    "ollama.timeout": (_NUMBER, _at_least(1)),
+    "ollama.keep_alive": ((str, int), None),
+    "ollama.num_thread": ((int,), _at_least(1)),
+    "ollama.max_concurrent_downloads": ((int,), _at_least(1)),
+    "prompts.system": ((str,), _template),
+    "prompts.user": ((str,), _template),
+    "retrieval.top_k": ((int,), _at_least(1)),
+    "retrieval.backend": ((str,), _one_of("auto", "chroma", "flat", "quantized")),
+    "retrieval.flat_max_chunks": ((int,), _at_least(1)),
+    "retrieval.rerank": ((bool,), None),
+    "retrieval.candidates": ((int,), _at_least(1)),
+    "retrieval.rerank_budget_ms": (_NUMBER, _at_least(1)),
+    "retrieval.rerank_batch_size": ((int,), _at_least(1)),
+    "retrieval.compression": ((str, bool, int), _compression),
+    "retrieval.compression_full_chunks": ((int,), _at_least(0)),
+    "retrieval.hierarchical": ((bool, str), _one_of(True, False, "auto")),
+    "retrieval.hierarchical_min_chunks": ((int,), _at_least(0)),
+    "retrieval.coarse_k": ((int,), _at_least(1)),
+    "retrieval.shard_timeout_ms": (_NUMBER, _at_least(1)),
+    "indexing.collection_name": ((str,), None),
+    "indexing.gc_grace_minutes": (_NUMBER, _at_least(0)),
+    "indexing.vector_store": ((str,), _one_of("auto", "flat", "int8", "pq")),
+    "indexing.summaries": ((bool,), None),
+    "indexing.shards": ((int,), _at_least(1)),
+    "indexing.background.enabled": ((bool,), None),
+    "indexing.background.max_threads": ((int,), _at_least(1)),
+    "indexing.background.duty_cycle": (_NUMBER, _between(0.05, 1.0)),
+    "indexing.background.max_cpu_load": (_NUMBER, _between(0.0, 1.0)),
+    "indexing.background.batch_size": ((int,), _at_least(1)),
+    "git.enabled": ((bool,), None),
+    "git.base_branch": ((str,), None),
+    "git.overlays": ((bool,), None),
+    "profiling.enabled": ((bool,), None),
+    "profiling.query_threshold_ms": (_NUMBER, _at_least(0)),
+    "profiling.index_threshold_ms": (_NUMBER, _at_least(0)),
+    "profiling.mode": ((str,), _one_of("sample", "cprofile")),
+    "profiling.sample_interval_ms": (_NUMBER, _at_least(0.1)),
+    "profiling.memory": ((bool,), None),
+    "profiling.output_dir": ((str,), None),
+    "profiling.keep": ((int,), _at_least(1)),
+    "chat.enabled": ((bool,), None),
+    "chat.max_turns": ((int,), _at_least(1)),
+    "chat.rewrite": ((str,), _one_of("heuristic", "model")),
+    "hardware.target_latency_s": (_NUMBER, _at_least(0.1)),
+}
+
+# Keys (or whole sections) components re-read on reload; everything else needs a restart
+SAFE_KEYS = (
+    "assistant.name",
+    "models.default",
+    "ollama.host",
+    "ollama.timeout",
+    "ollama.keep_alive",
+    "ollama.num_thread",
+    "context.context_window",
+    "context.max_lines_per_file",
+    "context.mode",
+    "context.iterative",
+    "prompts",
+    "retrieval.top_k",
+    "retrieval.candidates",
+    "retrieval.rerank_budget_ms",
+    "retrieval.compression",
+    "retrieval.compression_full_chunks",
+    "retrieval.hierarchical",
+    "retrieval.hierarchical_min_chunks",
+    "retrieval.coarse_k",
+    "retrieval.shard_timeout_ms",
+    "chat.max_turns",
+    "chat.rewrite",
+    "hardware",  # only read by hardware_profile.py runs
+)
+
+
+def _lookup(data: Dict, dotted: str):
+    node = data
+    for part in dotted.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def validate(data: Dict) -> List[str]:
+    """Problems in a parsed config, one message per bad key (empty when valid)."""
+    errors = []
+    sections = {key.rsplit(".", 1)[0] for key in SCHEMA}
+    for section in sorted(sections):
+        value = _lookup(data, section)
+        if value is not None and not isinstance(value, dict):
+            errors.append(f"{section}: must be a mapping, got {type(value).__name__}")
+    for key, (types, check) in SCHEMA.items():
+        value = _lookup(data, key)
+        if value is None:
+            continue
+        # YAML booleans are ints to Python; only accept them where bool is listed
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            expected = " or ".join(t.__name__ for t in types)
+            errors.append(f"{key}: expected {expected}, got {value!r}")
+            continue
+        problem = check(value) if check else None
+        if problem:
+            errors.append(f"{key}: {value!r} {problem}")
+    return errors
+
+
+def _flatten(data, prefix: str = "") -> Dict[str, object]:
+    if not isinstance(data, dict):
+        return {prefix: data}
+    flat = {}
+    for key, value in data.items():
+        flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def changed_keys(old: Dict, new: Dict) -> Set[str]:
+    """Dotted keys whose values differ between two configs."""
+    before, after = _flatten(old), _flatten(new)
+    return {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+
+
+def is_safe(key: str) -> bool:
+    return any(key == safe or key.startswith(safe + ".") for safe in SAFE_KEYS)
+
+
+def section(config: Dict, name: str) -> Dict:
+    """A config section as a dict (empty when missing or null)."""
+    return config.get(name, {}) or {}
+
+
+class RuntimeConfig:
+    """The shared config: `data` is replaced, never mutated, on reload."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], Optional[Callable]]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stamp = self._read_stamp()
+        self.data = self._load()
+
+    def _read_stamp(self) -> Tuple[int, int]:
+        try:
+            st = self.path.stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return 0, 0
+
+    def _load(self) -> Dict:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise ConfigError(f"{self.path} is not valid YAML: {e}")
+        if not isinstance(data, dict):
+            raise ConfigError(f"{self.path} must contain a mapping of sections")
+        errors = validate(data)
+        if errors:
+            raise ConfigError(f"Invalid settings in {self.path}:\n  " + "\n  ".join(errors))
+        return data
+
+    def require(self, *keys: str):
+        """Fail fast when settings a component cannot default are missing."""
+        missing = [key for key in keys if _lookup(self.data, key) is None]
+        if missing:
+            raise ConfigError(f"{self.path} is missing required settings: {', '.join(missing)}")
+
+    def get(self, dotted: str, default=None):
+        value = _lookup(self.data, dotted)
+        return default if value is None else value
+
+    # ---------- Hot reload ----------
+
+    def subscribe(self, callback: Callable[[Dict, Set[str]], None]):
+        """Call `callback(data, changed_keys)` after each applied reload.
+
+        Bound methods are held weakly, so subscribing does not keep an
+        assistant alive.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+        with self._lock:
+            self._listeners.append(ref)
+
+    def reload(self) -> Set[str]:
+        """Re-read the file if it changed; returns the keys applied live."""
+        stamp = self._read_stamp()
+        if stamp == self._stamp:
+            return set()
+        self._stamp = stamp
+        try:
+            data = self._load()
+        except ConfigError as e:
+            print(f"⚠️ Ignoring config change: {e}")
+            return set()
+        changed = changed_keys(self.data, data)
+        if not changed:
+            return set()
+        safe = {key for key in changed if is_safe(key)}
+        restart = sorted(changed - safe)
+        self.data = data
+        if safe:
+            print(f"♻️ Applied config changes: {', '.join(sorted(safe))}")
+        if restart:
+            print(f"⚠️ Restart to apply: {', '.join(restart)}")
+        if not safe:
+            return safe
+        with self._lock:
+            self._listeners = [ref for ref in self._listeners if ref() is not None]
+            listeners = [ref() for ref in self._listeners]
+        for listener in listeners:
+            if listener is None:
+                continue
+            try:
+                listener(data, safe)
+            except Exception as e:
+                print(f"⚠️ Config listener failed: {e}")
+        return safe
+
+    def watch(self, interval: float = POLL_SECONDS):
+        """Poll the file in a daemon thread and apply valid edits (idempotent)."""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name="config-watch", daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️ Config reload failed: {e}")
+
+
+_configs: Dict[Path, RuntimeConfig] = {}
+_configs_lock = threading.Lock()
+
+
+def get_config(path=None) -> RuntimeConfig:
+    """Process-wide config for `path` (default: config.yaml next to this file)."""
+    path = Path(path or DEFAULT_PATH).resolve()
+    with _configs_lock:
+        config = _configs.get(path)
+        if config is None:
+            config = RuntimeConfig(path)
+            _configs[path] = config
+        return config
+
+
+def touched(changed: Iterable[str], *prefixes: str) -> bool:
+    """True if any changed key is one of `prefixes` or inside it."""
+    return any(key == prefix or key.startswith(prefix + ".") for key in changed for prefix in prefixes)
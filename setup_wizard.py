@@ -4,25 +4,72 @@ Handles all backend operations for the first-run setup wizard.
 """
 
 import os
+import re
 import sys
 import subprocess
-import json
+import threading
+import importlib.util
+from importlib import metadata
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import requests
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from PIL import Image
 
+from hardware_profile import benchmark_models, choose_profile, probe_hardware
+from model_downloads import DEFAULT_CONCURRENT_DOWNLOADS, ModelDownloadManager
+from runtime_config import ConfigError, get_config
+
+# Import name -> distribution name, checked against the minimums in requirements.txt
+REQUIRED_PACKAGES = {
+    'ollama': 'ollama',
+    'yaml': 'pyyaml',
+    'customtkinter': 'customtkinter',
+    'PIL': 'pillow',
+    'chromadb': 'chromadb',
+    'sentence_transformers': 'sentence-transformers',
+}
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    """Numeric prefix of a version string ('2.2.0rc1' -> (2, 2, 0))."""
+    parts = []
+    for piece in version.split('.'):
+        match = re.match(r'\d+', piece)
+        if not match:
+            break
+        parts.append(int(match.group()))
+    return tuple(parts)
+
 
 class SetupWizardBackend:
     """Backend logic for the setup wizard."""
     
-    def __init__(self):
+    def __init__(self, max_concurrent_downloads: Optional[int] = None):
         self.script_dir = Path(__file__).parent
         self.config_path = self.script_dir / "config.yaml"
         self.setup_complete_marker = self.script_dir / ".setup_complete"
         self.ollama_host = "http://localhost:11434"
+        # Parallel model pulls: the wizard option, else ollama.max_concurrent_downloads from a previous setup
+        self.max_concurrent_downloads = max_concurrent_downloads or self._configured_concurrency()
+        self.downloads = ModelDownloadManager(self.ollama_host, max_concurrent=self.max_concurrent_downloads)
+        # Environment check results, kept for the session
+        self._check_cache: Dict[str, object] = {}
+        self._check_lock = threading.Lock()
         
+    def _configured_concurrency(self) -> int:
+        try:
+            ollama_cfg = get_config(self.config_path).data.get("ollama", {}) or {}
+        except ConfigError:
+            return DEFAULT_CONCURRENT_DOWNLOADS  # a broken config is rewritten by this wizard
+        return int(ollama_cfg.get("max_concurrent_downloads", DEFAULT_CONCURRENT_DOWNLOADS))
+
+    def set_max_concurrent_downloads(self, count: int):
+        """Change how many models download at once (applies to the next batch)."""
+        self.max_concurrent_downloads = max(1, int(count))
+        self.downloads.max_concurrent = self.max_concurrent_downloads
+
     def is_setup_complete(self) -> bool:
         """Check if setup has been completed before."""
         return self.setup_complete_marker.exists()
@@ -33,65 +80,114 @@ class SetupWizardBackend:
     
     # ========== DEPENDENCY CHECKS ==========
     
+    def check_environment(self, refresh: bool = False) -> Dict:
+        """
+        Run the Ollama probe and the package check concurrently.
+        Results are cached for the session; pass refresh=True to re-check.
+        Returns: {'ollama': (ok, message), 'models': [...], 'packages': (all_installed, missing)}
+        """
+        if refresh:
+            self.invalidate_checks()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            ollama_future = pool.submit(self._probe_ollama)
+            packages_future = pool.submit(self.check_python_packages)
+            ollama_ok, ollama_msg, models = ollama_future.result()
+            return {
+                'ollama': (ollama_ok, ollama_msg),
+                'models': models,
+                'packages': packages_future.result(),
+            }
+
+    def invalidate_checks(self, *keys: str):
+        """Forget cached check results ('ollama', 'packages'; all when none given)."""
+        with self._check_lock:
+            for key in keys or list(self._check_cache):
+                self._check_cache.pop(key, None)
+
+    def _cached(self, key: str, compute):
+        with self._check_lock:
+            if key in self._check_cache:
+                return self._check_cache[key]
+        value = compute()
+        with self._check_lock:
+            self._check_cache[key] = value
+        return value
+
+    def _probe_ollama(self) -> Tuple[bool, str, List[str]]:
+        """One /api/tags request answers both reachability and installed models."""
+        def probe():
+            try:
+                response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
+                if response.status_code != 200:
+                    return False, f"Ollama responded with status {response.status_code}", []
+                data = response.json()
+                models = [model.get('name') for model in data.get('models', []) if model.get('name')]
+                # Preserve order and remove duplicates
+                return True, "Ollama is running", list(dict.fromkeys(models))
+            except requests.exceptions.ConnectionError:
+                return False, "Ollama is not running. Please start Ollama or install it from https://ollama.ai", []
+            except Exception as e:
+                return False, f"Error checking Ollama: {str(e)}", []
+
+        result = self._cached('ollama', probe)
+        if not result[0]:
+            # Don't pin a failure for the session; the user may start Ollama next
+            self.invalidate_checks('ollama')
+        return result
+
     def check_ollama_installed(self) -> Tuple[bool, str]:
         """
         Check if Ollama is installed and running.
         Returns: (is_installed, message)
         """
-        try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
-            if response.status_code == 200:
-                return True, "Ollama is running"
-            else:
-                return False, f"Ollama responded with status {response.status_code}"
-        except requests.exceptions.ConnectionError:
-            return False, "Ollama is not running. Please start Ollama or install it from https://ollama.ai"
-        except Exception as e:
-            return False, f"Error checking Ollama: {str(e)}"
+        ok, message, _ = self._probe_ollama()
+        return ok, message
     
     def get_installed_models(self) -> List[str]:
         """
         Get list of installed Ollama models.
         Returns: List of model names
         """
-        try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
-            if response.status_code == 200:
-                data = response.json()
-                models = [model.get('name') for model in data.get('models', []) if model.get('name')]
-                # Preserve order and remove duplicates
-                return list(dict.fromkeys(models))
-            return []
-        except Exception:
-            return []
+        return list(self._probe_ollama()[2])
     
     def check_python_packages(self) -> Tuple[bool, List[str]]:
         """
-        Check if required Python packages are installed.
+        Check if required Python packages are installed and recent enough.
+        Uses package metadata only, so nothing heavy is imported.
         Returns: (all_installed, missing_packages)
         """
-        required_packages = [
-            'ollama',
-            'yaml',
-            'customtkinter',
-            'PIL',
-            'chromadb',
-            'sentence_transformers'
-        ]
-        
-        missing = []
-        for package in required_packages:
-            try:
-                if package == 'yaml':
-                    __import__('yaml')
-                elif package == 'PIL':
-                    __import__('PIL')
-                else:
-                    __import__(package)
-            except ImportError:
-                missing.append(package)
-        
-        return len(missing) == 0, missing
+        def check():
+            minimums = self._required_versions()
+            missing = []
+            for package, distribution in REQUIRED_PACKAGES.items():
+                try:
+                    found = importlib.util.find_spec(package) is not None
+                except (ImportError, ValueError):
+                    found = False
+                if not found:
+                    missing.append(package)
+                    continue
+                try:
+                    installed = metadata.version(distribution)
+                except metadata.PackageNotFoundError:
+                    continue  # importable without metadata (e.g. vendored); accept it
+                minimum = minimums.get(distribution)
+                if minimum and _version_tuple(installed) < _version_tuple(minimum):
+                    missing.append(f"{package} ({installed} < {minimum})")
+            return len(missing) == 0, missing
+
+        return self._cached('packages', check)
+
+    def _required_versions(self) -> Dict[str, str]:
+        """Minimum versions from requirements.txt, keyed by lowercase distribution name."""
+        minimums = {}
+        requirements_path = self.script_dir / "requirements.txt"
+        if requirements_path.exists():
+            for line in requirements_path.read_text(encoding="utf-8").splitlines():
+                match = re.match(r'\s*([A-Za-z0-9_.\-]+)\s*>=\s*([\w.]+)', line)
+                if match:
+                    minimums[match.group(1).lower()] = match.group(2)
+        return minimums
     
     def install_python_packages(self, progress_callback=None) -> Tuple[bool, str]:
         """
@@ -114,6 +210,7 @@ class SetupWizardBackend:
                 timeout=300  # 5 minute timeout
             )
             
+            self.invalidate_checks('packages')
             if result.returncode == 0:
                 return True, "Dependencies installed successfully"
             else:
@@ -125,43 +222,68 @@ class SetupWizardBackend:
     
     # ========== MODEL MANAGEMENT ==========
     
-    def download_model(self, model_name: str, progress_callback=None) -> Tuple[bool, str]:
+    def download_model(self, model_name: str, progress_callback=None, on_progress=None) -> Tuple[bool, str]:
         """
-        Download an Ollama model.
+        Download an Ollama model (resuming a previous partial pull).
         Returns: (success, message)
         """
-        try:
+        results = self.download_models([model_name], progress_callback, on_progress)
+        return results[model_name]
+
+    def download_models(self, model_names: List[str], progress_callback=None, on_progress=None) -> Dict[str, Tuple[bool, str]]:
+        """
+        Download several models concurrently.
+        `progress_callback` gets a status line, `on_progress` the overall
+        progress dict (fraction, bytes_per_second, eta_seconds).
+        Returns: {model_name: (success, message)}
+        """
+        if progress_callback:
+            progress_callback(f"Downloading {', '.join(model_names)}... This may take several minutes.")
+
+        def report(progress):
             if progress_callback:
-                progress_callback(f"Downloading {model_name}... This may take several minutes.")
-            
-            # Start the pull
-            response = requests.post(
-                f"{self.ollama_host}/api/pull",
-                json={"name": model_name},
-                stream=True,
-                timeout=1800  # 30 minute timeout for large models
-            )
-            
-            if response.status_code == 200:
-                # Stream the response to track progress
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            if progress_callback and 'status' in data:
-                                progress_callback(f"{model_name}: {data['status']}")
-                        except json.JSONDecodeError:
-                            pass
-                
-                return True, f"Model {model_name} downloaded successfully"
-            else:
-                return False, f"Failed to download model: {response.text}"
+                progress_callback(progress.describe())
+            if on_progress:
+                on_progress(self.downloads.overall())
+
+        try:
+            return self.downloads.pull_many(model_names, report)
         except Exception as e:
-            return False, f"Error downloading model: {str(e)}"
+            return {name: (False, f"Error downloading model: {str(e)}") for name in model_names}
+        finally:
+            self.invalidate_checks('ollama')
+
+    def interrupted_downloads(self) -> List[str]:
+        """Models whose download was interrupted and can be resumed."""
+        return self.downloads.interrupted()
+
+    def cancel_downloads(self):
+        """Stop running downloads; they resume on the next attempt."""
+        self.downloads.cancel()
     
     def get_recommended_model(self) -> str:
-        """Get the recommended model name."""
-        return "qwen2.5-coder:3b"
+        """Get the recommended model name for this machine's memory."""
+        return self.recommend_profile(benchmark=False)['model']
+
+    def recommend_profile(self, model: Optional[str] = None, benchmark: bool = True) -> Dict:
+        """
+        Pick model, context window, threads and top_k for this machine.
+        With `benchmark`, installed models (or just `model`) are timed through
+        the Ollama API first; results are cached for the session.
+        Returns: profile dict (see hardware_profile.choose_profile)
+        """
+        hardware = self._cached('hardware', probe_hardware)
+        candidates = [model] if model else None
+        benchmarks = {}
+        if benchmark:
+            installed = self.get_installed_models()
+            to_run = [m for m in (candidates or installed) if m in installed]
+            key = f"benchmarks:{','.join(to_run)}"
+            benchmarks = self._cached(key, lambda: benchmark_models(self.ollama_host, to_run, hardware['physical_cores']))
+        profile = choose_profile(hardware, benchmarks, candidates=candidates or list(benchmarks) or None)
+        profile['hardware'] = hardware
+        profile['benchmarks'] = benchmarks
+        return profile
 
     def resolve_paths(self, models_location: Optional[str], database_location: Optional[str], install_dir: Optional[str]) -> Tuple[str, str, str]:
         """
@@ -217,6 +339,7 @@ class SetupWizardBackend:
         try:
             # Resolve and normalize paths
             ml, db, inst = self.resolve_paths(models_location, database_location, install_dir)
+            profile = self.recommend_profile(model=selected_model)
 
             cfg = {
                 'assistant': {
@@ -239,11 +362,22 @@ class SetupWizardBackend:
                 },
                 'context': {
                     'max_lines_per_file': 300,
-                    'context_window': 16384
+                    'context_window': profile['context_window']
                 },
                 'ollama': {
                     'host': self.ollama_host,
-                    'timeout': 60
+                    'timeout': 60,
+                    'num_thread': profile['num_thread'],
+                    'max_concurrent_downloads': self.max_concurrent_downloads
+                },
+                'retrieval': {
+                    'top_k': profile['top_k']
+                },
+                'hardware': {
+                    'target_latency_s': profile['target_latency_s'],
+                    'estimated_latency_s': profile.get('estimated_latency_s'),
+                    'probe': profile['hardware'],
+                    'benchmarks': profile['benchmarks']
                 },
                 'indexing': {
                     'collection_name': 'universal_knowledge',
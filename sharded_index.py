@@ -0,0 +1,313 @@
+"""
+Sharded Index
+Splits a knowledge base's chunks over N independent Chroma databases by a
+hash of the file path, so no single PersistentClient has to hold the whole
+corpus and one query can use several cores.
+
+Each shard is served by its own long-lived worker process that keeps the
+shard open. A query is embedded once, sent to every shard, and the per-shard
+top-k lists are merged with a heap. Shards that miss the deadline are left
+out (the result lists them under "degraded") instead of holding up the answer.
+
+Layout: <index_path>/shards/<physical collection>/<NN>/ plus shards.json.
+"""
+
+import hashlib
+import heapq
+import json
+import multiprocessing
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SHARD_DIR = "shards"
+SHARD_MANIFEST = "shards.json"
+SHARD_COLLECTION = "chunks"
+SHARD_TIMEOUT_MS = 1500
+STARTUP_TIMEOUT_S = 60.0  # first answer includes process start and opening the shard
+
+
+def shard_root(index_path, physical: str) -> Path:
+    return Path(index_path) / SHARD_DIR / physical
+
+
+def is_sharded(index_path, physical: str) -> bool:
+    return (shard_root(index_path, physical) / SHARD_MANIFEST).exists()
+
+
+def shard_of(rel_file: str, shards: int) -> int:
+    """Shard holding a file's chunks; stable across platforms and runs."""
+    key = rel_file.replace("\\", "/").encode("utf-8")
+    return int(hashlib.md5(key).hexdigest()[:8], 16) % shards
+
+
+def drop_shards(index_path, physical: str):
+    root = shard_root(index_path, physical)
+    if root.exists():
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _shard_path(root: Path, shard: int) -> Path:
+    return root / f"{shard:02d}"
+
+
+# ---------- Build side ----------
+
+
+class ShardWriter:
+    """Collection-like writer that routes each chunk to its file's shard."""
+
+    def __init__(self, root, shards: int, metadata: Optional[Dict] = None):
+        import chromadb
+
+        self.root = Path(root)
+        manifest_path = self.root / SHARD_MANIFEST
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)["shards"]
+            if existing != shards:
+                raise ValueError(
+                    f"Index has {existing} shards, not {shards}; rebuild without --in-place to reshard"
+                )
+        self.shards = shards
+        self.metadata = metadata or {}
+        self.name = self.root.name
+        self._collections = []
+        for shard in range(shards):
+            client = chromadb.PersistentClient(path=str(_shard_path(self.root, shard)))
+            self._collections.append(client.get_or_create_collection(name=SHARD_COLLECTION, metadata=metadata))
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        groups: Dict[int, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            groups.setdefault(shard_of(meta["file"], self.shards), []).append(i)
+        for shard, rows in groups.items():
+            self._collections[shard].upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+
+    def count(self) -> int:
+        return sum(collection.count() for collection in self._collections)
+
+    def write_manifest(self) -> Dict:
+        """Mark the shard set complete; readers only open shards with a manifest."""
+        manifest = {
+            "shards": self.shards,
+            "collection": SHARD_COLLECTION,
+            "space": (self.metadata or {}).get("hnsw:space", "l2"),
+            "counts": [collection.count() for collection in self._collections],
+        }
+        tmp = self.root / (SHARD_MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        tmp.replace(self.root / SHARD_MANIFEST)
+        return manifest
+
+
+# ---------- Worker processes ----------
+
+_shard = None  # the collection this worker process serves
+
+
+def _open_shard(path: str, collection_name: str):
+    global _shard
+    import chromadb
+
+    _shard = chromadb.PersistentClient(path=path).get_collection(collection_name)
+
+
+def _shard_count() -> int:
+    return _shard.count()
+
+
+def _shard_query(query_embeddings: List[List[float]], n_results: int, where: Optional[Dict]) -> Dict:
+    return _shard.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+
+def _shard_get(kwargs: Dict) -> Dict:
+    return _shard.get(**kwargs)
+
+
+# ---------- Search side ----------
+
+
+def _merge(merged: Dict[str, list], parts: List[Dict]):
+    """Append `get()` results to `merged`, key by key."""
+    for part in parts:
+        for key, values in part.items():
+            if values is not None and key != "included":
+                merged.setdefault(key, []).extend(list(values))
+
+
+class ShardedCollection:
+    """Chroma-like `query()`/`get()`/`count()` over a shard set.
+
+    Every shard runs in a single-worker process pool that is started once
+    and reused; a crashed worker is replaced on the next call.
+    """
+
+    def __init__(self, index_path, physical: str, timeout_ms: int = SHARD_TIMEOUT_MS):
+        self.root = shard_root(index_path, physical)
+        with open(self.root / SHARD_MANIFEST, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.name = physical
+        self.metadata = {"hnsw:space": self.manifest.get("space", "l2")}
+        self.shards = self.manifest["shards"]
+        self.timeout_s = timeout_ms / 1000
+        self._lock = threading.Lock()
+        # Spawned rather than forked: the parent may be running GUI and Chroma threads
+        self._context = multiprocessing.get_context("spawn")
+        self._pools: List[Optional[ProcessPoolExecutor]] = [None] * self.shards
+        self._ready = [False] * self.shards
+        self._stragglers: Dict[int, object] = {}  # shard -> future that missed its deadline
+        for shard in self._live_shards():
+            # Warm up: start the worker and open the shard before the first query
+            self._submit(shard, _shard_count)
+
+    def _live_shards(self) -> List[int]:
+        counts = self.manifest.get("counts") or [1] * self.shards
+        return [shard for shard in range(self.shards) if counts[shard] > 0]
+
+    def _pool(self, shard: int) -> ProcessPoolExecutor:
+        with self._lock:
+            pool = self._pools[shard]
+            if pool is None:
+                pool = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=self._context,
+                    initializer=_open_shard,
+                    initargs=(str(_shard_path(self.root, shard)), self.manifest["collection"]),
+                )
+                self._pools[shard] = pool
+                self._ready[shard] = False
+            return pool
+
+    def _submit(self, shard: int, fn, *args):
+        try:
+            future = self._pool(shard).submit(fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self._pools[shard] = None
+            future = self._pool(shard).submit(fn, *args)
+
+        def mark_ready(done, shard=shard):
+            if not done.cancelled() and done.exception() is None:
+                self._ready[shard] = True
+
+        future.add_done_callback(mark_ready)
+        return future
+
+    def _gather(self, fn, *args, shards: Optional[List[int]] = None) -> Tuple[List[Dict], List[int]]:
+        """Run `fn` on the given shards; results of shards that answered in time, and the shards that did not."""
+        shards = self._live_shards() if shards is None else shards
+        # Don't queue more work behind a shard still busy with a timed-out request
+        busy = [shard for shard in shards if shard in self._stragglers and not self._stragglers[shard].done()]
+        shards = [shard for shard in shards if shard not in busy]
+        cold = not all(self._ready[shard] for shard in shards)
+        futures = {self._submit(shard, fn, *args): shard for shard in shards}
+        done, pending = wait(futures, timeout=STARTUP_TIMEOUT_S if cold else self.timeout_s)
+        for future in pending:
+            self._stragglers[futures[future]] = future
+
+        results, degraded = [], busy + [futures[f] for f in pending]
+        for future in (f for f in futures if f in done):  # shard order, so get() pages line up
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    with self._lock:
+                        self._pools[futures[future]] = None
+                print(f"⚠️ Shard {futures[future]} failed: {e}")
+                degraded.append(futures[future])
+        if pending or busy:
+            slow = sorted(busy + [futures[f] for f in pending])
+            print(f"⚠️ Shards {slow} timed out; results may be incomplete")
+        return results, sorted(degraded)
+
+    def count(self) -> int:
+        return sum(self.manifest.get("counts") or [])
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+    ) -> Dict:
+        """Top `n_results` per query across all shards, merged by distance.
+
+        `degraded` lists the shards left out because they failed or timed out.
+        """
+        if query_embeddings is None:
+            from vector_store import embed_texts
+
+            # Embed once here instead of once per shard
+            query_embeddings = embed_texts(query_texts)
+        query_embeddings = [list(map(float, e)) for e in query_embeddings]
+        partials, degraded = self._gather(_shard_query, query_embeddings, n_results, where)
+
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "degraded": degraded}
+        for qi in range(len(query_embeddings)):
+            hits = (
+                (distance, part["ids"][qi][j], part["documents"][qi][j], part["metadatas"][qi][j])
+                for part in partials
+                for j, distance in enumerate(part["distances"][qi])
+            )
+            best = heapq.nsmallest(n_results, hits, key=lambda hit: hit[0])
+            out["distances"].append([hit[0] for hit in best])
+            out["ids"].append([hit[1] for hit in best])
+            out["documents"].append([hit[2] for hit in best])
+            out["metadatas"].append([hit[3] for hit in best])
+        return out
+
+    def get(self, **kwargs) -> Dict:
+        """Chroma `get()` fanned out over shards (one shard for an exact file filter).
+
+        Rows come shard by shard; a `limit`/`offset` page only reads the
+        shards it overlaps, and only the rows of the page from them.
+        """
+        limit, offset = kwargs.pop("limit", None), kwargs.pop("offset", None) or 0
+        where = kwargs.get("where") or {}
+        shards = self._live_shards()
+        if isinstance(where.get("file"), str):
+            shards = [shard_of(where["file"], self.shards)]
+        merged: Dict[str, list] = {}
+        if limit is None and not offset:
+            _merge(merged, self._gather(_shard_get, kwargs, shards=shards)[0])
+            return merged
+        for shard in shards:
+            if limit is not None and limit <= 0:
+                break
+            if offset:
+                size = self._matches(shard, kwargs)
+                if size <= offset:
+                    offset -= size
+                    continue
+            page = dict(kwargs, offset=offset, limit=limit)
+            parts = self._gather(_shard_get, page, shards=[shard])[0]
+            _merge(merged, parts)
+            offset = 0
+            if limit is not None:
+                limit -= sum(len(part["ids"]) for part in parts)
+        return merged
+
+    def _matches(self, shard: int, kwargs: Dict) -> int:
+        """Rows of `shard` a `get()` with these arguments returns."""
+        if not any(kwargs.get(key) for key in ("ids", "where", "where_document")):
+            parts = self._gather(_shard_count, shards=[shard])[0]
+            return parts[0] if parts else 0
+        parts = self._gather(_shard_get, dict(kwargs, include=[]), shards=[shard])[0]
+        return len(parts[0]["ids"]) if parts else 0
+
+    def close(self):
+        """Stop the workers once their queued searches are done."""
+        with self._lock:
+            pools, self._pools = self._pools, [None] * self.shards
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False)
@@ -0,0 +1,200 @@
+"""
+File and Directory Summaries
+A coarse retrieval layer next to each chunk collection: one short extractive
+summary per file (path, module docstring, top-level definitions or headings)
+and one per directory (its files and their main symbols), embedded into
+`<collection>__summaries`.
+
+Searching this layer first narrows the chunk search to a handful of files
+and directories. Summaries are keyed by content hash, so a rebuild copies
+unchanged ones (embeddings included) from the previous version and only
+embeds what changed, in batches.
+"""
+
+import ast
+import hashlib
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SUMMARY_SUFFIX = "__summaries"
+SUMMARY_BATCH = 64
+MAX_SUMMARY_CHARS = 1500
+PAGE_SIZE = 1000
+
+
+def summary_collection_name(physical: str) -> str:
+    return f"{physical}{SUMMARY_SUFFIX}"
+
+
+def summarize_file(rel_path: str, source: str) -> str:
+    """Path, leading docstring/comment and top-level definitions of one file."""
+    lines = [f"File: {rel_path}"]
+    if rel_path.endswith(".py"):
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            doc = ast.get_docstring(tree)
+            if doc:
+                lines.append(doc.strip().split("\n\n")[0])
+            for node in tree.body:
+                if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                    kind = "class" if isinstance(node, ast.ClassDef) else "def"
+                    entry = f"{kind} {node.name}"
+                    node_doc = ast.get_docstring(node)
+                    if node_doc:
+                        entry += f": {node_doc.strip().splitlines()[0]}"
+                    if isinstance(node, ast.ClassDef):
+                        methods = [
+                            n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                        ]
+                        if methods:
+                            entry += f" (methods: {', '.join(methods[:12])})"
+                    lines.append(entry)
+            return "\n".join(lines)[:MAX_SUMMARY_CHARS]
+
+    # Other text: headings, else the first non-empty lines
+    text_lines = [line.strip() for line in source.splitlines() if line.strip()]
+    headings = [line for line in text_lines if line.startswith("#")]
+    lines.extend((headings or text_lines)[:20])
+    return "\n".join(lines)[:MAX_SUMMARY_CHARS]
+
+
+def summarize_dir(rel_dir: str, file_summaries: Dict[str, str]) -> str:
+    """Directory listing with the main definitions of each file."""
+    lines = [f"Directory: {rel_dir}"]
+    for rel_path in sorted(file_summaries):
+        names = [
+            line.split(":")[0].split(" (")[0]
+            for line in file_summaries[rel_path].splitlines()[1:]
+            if line.startswith(("class ", "def "))
+        ]
+        entry = Path(rel_path).name
+        if names:
+            entry += f": {', '.join(n.split(' ', 1)[1] for n in names[:8])}"
+        lines.append(entry)
+    return "\n".join(lines)[:MAX_SUMMARY_CHARS]
+
+
+def _read_previous(client, name: Optional[str]) -> Dict[str, Dict]:
+    """Existing summaries keyed by id, with hash, document and embedding."""
+    if not name:
+        return {}
+    try:
+        collection = client.get_collection(name)
+    except Exception:
+        return {}
+    previous = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas", "documents", "embeddings"], limit=PAGE_SIZE, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            return previous
+        for i, summary_id in enumerate(ids):
+            previous[summary_id] = {
+                "metadata": page["metadatas"][i] or {},
+                "document": page["documents"][i],
+                "embedding": page["embeddings"][i],
+            }
+        offset += len(ids)
+
+
+def build_summaries(
+    client,
+    target: str,
+    previous: Optional[str],
+    files: List[Path],
+    relative_file,
+    batch_size: int = SUMMARY_BATCH,
+    scheduler=None,
+    changed=None,
+) -> Dict:
+    """(Re)build the summary layer for chunk collection `target`.
+
+    `previous` is the physical collection the build replaces (may equal
+    `target` for in-place builds); its unchanged summaries are reused.
+    `relative_file(path)` gives the path stored in chunk metadata; file and
+    dir values are kept in that exact form so chunk filters match.
+    An `IndexScheduler` paces the embedding batches when given. With a
+    `changed` set of paths (from git), other files reuse their previous
+    summary without being read.
+    """
+    reuse = _read_previous(client, summary_collection_name(previous) if previous else None)
+    name = summary_collection_name(target)
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+    file_summaries: Dict[str, str] = {}
+    file_hashes: Dict[str, str] = {}
+    records = []  # (id, document, metadata)
+    for path in files:
+        rel = relative_file(path)
+        old = reuse.get(f"file:{rel}")
+        if changed is not None and path not in changed and old:
+            file_hashes[rel] = old["metadata"].get("hash", "")
+            file_summaries[rel] = old["document"]
+            records.append((f"file:{rel}", old["document"], {"level": "file", "file": rel, "hash": file_hashes[rel]}))
+            continue
+        try:
+            data = path.read_bytes()
+        except OSError:
+            continue
+        digest = hashlib.md5(data).hexdigest()
+        file_hashes[rel] = digest
+        if old and old["metadata"].get("hash") == digest:
+            summary = old["document"]
+        else:
+            summary = summarize_file(rel, data.decode("utf-8", errors="replace"))
+        file_summaries[rel] = summary
+        records.append((f"file:{rel}", summary, {"level": "file", "file": rel, "hash": digest}))
+
+    by_dir: Dict[str, Dict[str, str]] = defaultdict(dict)
+    for rel, summary in file_summaries.items():
+        # Same form as the chunks' "dir" metadata, so filters match exactly
+        by_dir[str(Path(rel).parent)][rel] = summary
+    for rel_dir, children in by_dir.items():
+        digest = hashlib.md5("".join(file_hashes[f] for f in sorted(children)).encode()).hexdigest()
+        old = reuse.get(f"dir:{rel_dir}")
+        summary = old["document"] if old and old["metadata"].get("hash") == digest else summarize_dir(rel_dir, children)
+        records.append((f"dir:{rel_dir}", summary, {"level": "dir", "dir": rel_dir, "hash": digest}))
+
+    reused = [r for r in records if r[0] in reuse and reuse[r[0]]["metadata"].get("hash") == r[2]["hash"]]
+    reused_ids = {r[0] for r in reused}
+    fresh = [r for r in records if r[0] not in reused_ids]
+    for i in range(0, len(reused), PAGE_SIZE):
+        batch = reused[i : i + PAGE_SIZE]
+        collection.add(
+            ids=[r[0] for r in batch],
+            documents=[r[1] for r in batch],
+            metadatas=[r[2] for r in batch],
+            embeddings=[reuse[r[0]]["embedding"] for r in batch],
+        )
+    # New or changed summaries are embedded by Chroma, one batch per call
+    i = 0
+    while i < len(fresh):
+        size = min(batch_size, scheduler.next_batch()) if scheduler else batch_size
+        batch = fresh[i : i + size]
+        started = time.perf_counter()
+        collection.add(
+            ids=[r[0] for r in batch],
+            documents=[r[1] for r in batch],
+            metadatas=[r[2] for r in batch],
+        )
+        if scheduler:
+            scheduler.done(time.perf_counter() - started)
+        i += len(batch)
+    return {"files": len(file_summaries), "dirs": len(by_dir), "embedded": len(fresh), "reused": len(reused)}
+
+
+def drop_summaries(client, physical: str):
+    try:
+        client.delete_collection(summary_collection_name(physical))
+    except Exception:
+        pass
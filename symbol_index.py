@@ -0,0 +1,218 @@
+"""
+Symbol and Definition Index
+SQLite table of qualified Python names -> file, line range and chunk ID,
+plus name references, for exact lookups that skip embedding search.
+"""
+
+import ast
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    qualname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file TEXT NOT NULL,
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    chunk_id TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_qualname ON symbols (qualname);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_file ON symbols (file);
+CREATE TABLE IF NOT EXISTS refs (
+    name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_name ON refs (name);
+CREATE INDEX IF NOT EXISTS refs_file ON refs (file);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Only explicit definition questions: "where is X defined", "definition of X".
+# "find X" or "show me X" usually means a concept ("find bugs") and goes to the model.
+_KIND = r"(?:the\s+)?(?:class\s+|function\s+|method\s+)?"
+_NAME = r"`?([A-Za-z_][\w.]*)`?(?:\s+(?:class|function|method))?"
+_LOOKUP_RE = re.compile(
+    r"^\s*(?:(?:where\s+(?:is|are)\s+|where's\s+)" + _KIND + _NAME + r"\s+defined"
+    r"|(?:(?:what\s+is|where\s+is|show(?:\s+me)?)\s+)?(?:the\s+)?definition\s+of\s+" + _KIND + _NAME
+    + r")\s*\??\s*$",
+    re.IGNORECASE,
+)
+
+
+def symbol_db_path(index_path, collection: str) -> Path:
+    """Symbol table file for one collection inside the index directory."""
+    return Path(index_path) / f"symbols_{collection}.db"
+
+
+def parse_symbols(source: str) -> List[Dict]:
+    """Classes and functions in a module with qualified names and line ranges."""
+    tree = ast.parse(source)
+    symbols: List[Dict] = []
+
+    def visit(node, prefix: str):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = f"{prefix}.{child.name}" if prefix else child.name
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if prefix and isinstance(node, ast.ClassDef) else "function"
+                start = min([d.lineno for d in child.decorator_list] + [child.lineno])
+                symbols.append(
+                    {
+                        "qualname": qualname,
+                        "name": child.name,
+                        "kind": kind,
+                        "start_line": start,
+                        "end_line": getattr(child, "end_lineno", None) or child.lineno,
+                    }
+                )
+                visit(child, qualname)
+
+    visit(tree, "")
+    return symbols
+
+
+def parse_references(source: str) -> List[Dict]:
+    """Names and attribute names used in a module, one row per line."""
+    tree = ast.parse(source)
+    seen = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            seen.add((node.id, node.lineno))
+        elif isinstance(node, ast.Attribute):
+            seen.add((node.attr, node.lineno))
+    return [{"name": name, "line": line} for name, line in sorted(seen)]
+
+
+def lookup_target(question: str) -> Optional[str]:
+    """The symbol a pure "where is X defined" question asks about, if any."""
+    match = _LOOKUP_RE.match(question)
+    if match is None:
+        return None
+    return (match.group(1) or match.group(2)).rstrip(".")
+
+
+class SymbolIndex:
+    """Symbol table stored in an SQLite file next to the vector index."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    # ---------- Building ----------
+
+    def add_file(self, file: str, source: str, chunk_id_for_line: Callable[[int], str]) -> int:
+        """Replace the rows for `file`; returns the number of symbols stored."""
+        try:
+            symbols = parse_symbols(source)
+            refs = parse_references(source)
+        except (SyntaxError, ValueError):
+            symbols, refs = [], []
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM symbols WHERE file = ?", (file,))
+            self._conn.execute("DELETE FROM refs WHERE file = ?", (file,))
+            self._conn.executemany(
+                "INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        s["qualname"],
+                        s["name"],
+                        s["kind"],
+                        file,
+                        s["start_line"],
+                        s["end_line"],
+                        chunk_id_for_line(s["start_line"]),
+                    )
+                    for s in symbols
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO refs VALUES (?, ?, ?)",
+                [(r["name"], file, r["line"]) for r in refs],
+            )
+        return len(symbols)
+
+    def remove_file(self, file: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM symbols WHERE file = ?", (file,))
+            self._conn.execute("DELETE FROM refs WHERE file = ?", (file,))
+
+    def copy_from(self, db_path, skip_files=()):
+        """Copy every row of another symbol table, except those of `skip_files`."""
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS source", (str(db_path),))
+            try:
+                with self._conn:
+                    self._conn.execute("INSERT INTO symbols SELECT * FROM source.symbols")
+                    self._conn.execute("INSERT INTO refs SELECT * FROM source.refs")
+            finally:
+                self._conn.execute("DETACH DATABASE source")
+        for file in skip_files:
+            self.remove_file(file)
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    # ---------- Queries ----------
+
+    def lookup(self, name: str, limit: int = 10) -> List[Dict]:
+        """Definitions matching a qualified name, a dotted suffix or a bare name."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM symbols WHERE qualname = ? LIMIT ?", (name, limit)
+            ).fetchall()
+            if not rows and "." in name:
+                rows = self._conn.execute(
+                    "SELECT * FROM symbols WHERE name = ? AND qualname LIKE ? ESCAPE '\\' LIMIT ?",
+                    (name.rsplit(".", 1)[-1], "%." + _escape_like(name), limit),
+                ).fetchall()
+            if not rows:
+                rows = self._conn.execute(
+                    "SELECT * FROM symbols WHERE name = ? LIMIT ?", (name, limit)
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def references(self, name: str, limit: int = 50) -> List[Dict]:
+        bare = name.rsplit(".", 1)[-1]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file, line FROM refs WHERE name = ? ORDER BY file, line LIMIT ?",
+                (bare, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,56 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base for local Ollama stand-ins: subclasses implement `respond(path, body)`."""
+
+    protocol_version = "HTTP/1.0"  # the body ends when the connection closes, like a dropped stream
+
+    def do_POST(self):
+        import json
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.respond(self.path, body)
+
+    def do_GET(self):
+        self.respond(self.path, {})
+
+    def send_json_lines(self, lines):
+        import json
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in lines:
+            self.wfile.write((json.dumps(line) + "\n").encode())
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Start a handler class on a free local port; yields a function returning the base URL."""
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,50 @@
+from context_compression import compress_blocks
+
+MID_DOCSTRING = '''    rest of a docstring that started in the previous chunk
+    and another line
+    """
+    x = compute()
+    return x
+
+
+def other():
+    """Other function.
+
+    Details that go on.
+    And on.
+    """
+    return 1
+'''
+
+
+def test_chunk_starting_inside_docstring_keeps_code():
+    block = {"file": "a.py", "start_line": 40, "text": MID_DOCSTRING}
+    (out,), _ = compress_blocks([block], "medium")
+    text = out["text"]
+    assert "    x = compute()\n" in text
+    assert "def other():" in text
+    assert "return 1" in text
+    assert '"""Other function. ..."""' in text
+    assert "Details that go on." not in text
+
+
+def test_string_after_if_is_not_a_docstring():
+    text = 'def f():\n    if x:\n        """not a\n\n        docstring\n        at all\n        """\n    return 1\n'
+    (out,), _ = compress_blocks([{"file": "a.py", "start_line": 10, "text": text}], "medium")
+    assert "docstring" in out["text"]
+
+
+def test_module_docstring_trimmed_only_at_top_of_file():
+    text = '"""Module doc.\n\nMore.\nMore.\n"""\nimport os\n'
+    (out,), _ = compress_blocks([{"file": "b.py", "start_line": 1, "text": text}], "medium")
+    assert out["text"].startswith('"""Module doc. ..."""')
+    assert "import os" in out["text"]
+
+
+def test_definition_blocks_are_sent_whole():
+    text = "def f():\n    # comment\n    '''Doc\n\n    long\n    long\n    '''\n    return 1\n"
+    definition = {"file": "c.py", "start_line": 5, "text": text, "note": "definition of f"}
+    hit = {"file": "c.py", "start_line": 5, "text": text}
+    out, report = compress_blocks([definition, hit], "aggressive", full_chunks=0)
+    assert out == [definition]
+    assert report["dropped"] == 1
@@ -0,0 +1,88 @@
+from context_tools import FINAL_NOTE, ContextTools, ScriptedModel, outlined_files, run_tool_loop, tool_context
+from file_cache import FileCache
+
+TRANSCRIPT = '''class ChatTranscript:
+    """Messages of one chat."""
+
+    def __init__(self):
+        self.messages = []
+
+    def older_page(self):
+        return self.messages[:10]
+
+
+def split_chunks(text):
+    return [text]
+'''
+
+SYMBOL = '{"tool": "symbol", "name": "ChatTranscript.older_page"}'
+
+
+def _setup(tmp_path, files=("transcript.py",)):
+    (tmp_path / "transcript.py").write_text(TRANSCRIPT, encoding="utf-8")
+    (tmp_path / "big.txt").write_text("\n".join(f"line {i} " + "x" * 60 for i in range(1, 301)), encoding="utf-8")
+    outline = ContextTools(FileCache(), [tmp_path]).outline(list(files))
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": tool_context(outline)}]
+    tools = ContextTools(FileCache(), [tmp_path], outlined=outlined_files(messages))
+    return messages, tools
+
+
+def test_qualified_lookup_in_outlined_files(tmp_path):
+    _, tools = _setup(tmp_path)
+    for name in ("ChatTranscript.older_page", "transcript.ChatTranscript.older_page", "ChatTranscript.older_page()"):
+        result = tools.call({"tool": "symbol", "name": name})
+        assert result.startswith("=== transcript.py (lines 7-8, ChatTranscript.older_page) ===")
+        assert "return self.messages[:10]" in result
+    assert tools.call({"tool": "symbol", "name": "split_chunks"}).startswith("=== transcript.py (lines 11-12")
+
+
+def test_missing_member_points_at_the_class(tmp_path):
+    _, tools = _setup(tmp_path)
+    result = tools.call({"tool": "symbol", "name": "ChatTranscript.page"})
+    assert result.startswith("[symbol ChatTranscript.page] not found")
+    assert "ChatTranscript is in transcript.py lines 1-8 and defines __init__, older_page" in result
+
+
+def test_steps_exhausted_adds_final_note(tmp_path):
+    messages, tools = _setup(tmp_path)
+    model = ScriptedModel([SYMBOL, SYMBOL, "The first page."])
+    answer, stats = run_tool_loop(model, messages, tools, max_steps=2)
+    assert answer == "The first page."
+    assert stats["model_calls"] == 3 and stats["tool_calls"] == 2
+    assert FINAL_NOTE not in model.prompts[1][-1]["content"]
+    assert model.prompts[2][-1]["content"].endswith(FINAL_NOTE)
+
+
+def test_calls_after_final_note_keep_prose(tmp_path):
+    messages, tools = _setup(tmp_path)
+    model = ScriptedModel([SYMBOL, "It returns the first ten.\n" + SYMBOL])
+    answer, stats = run_tool_loop(model, messages, tools, max_steps=1)
+    assert answer == "It returns the first ten."
+    assert stats["tool_calls"] == 1
+
+
+def test_results_truncated_at_token_budget(tmp_path):
+    messages, tools = _setup(tmp_path)
+    fetch = '{"tool": "lines", "file": "big.txt", "start": 1, "end": 300}'
+    model = ScriptedModel([fetch + "\n" + fetch, "Done."])
+    answer, stats = run_tool_loop(model, messages, tools, max_steps=4, token_budget=200)
+    assert answer == "Done."
+    # The first result used the whole budget, so the second call was not run
+    assert stats["tool_calls"] == 1
+    results = model.prompts[1][-1]["content"]
+    assert "... (truncated: context budget reached)" in results
+    assert "line 300 " not in results
+    assert results.endswith(FINAL_NOTE)
+
+
+def test_bad_tool_calls_are_reported_to_the_model(tmp_path):
+    messages, tools = _setup(tmp_path)
+    bad = '{"tool": "lines", "start": 1}\n{"tool": "lines", "file": "transcript.py", "start": "x"}\n{"tool": "grep"}'
+    model = ScriptedModel([bad, "Sorry."])
+    answer, stats = run_tool_loop(model, messages, tools)
+    assert answer == "Sorry."
+    results = model.prompts[1][-1]["content"]
+    assert '[lines] invalid call {"tool": "lines", "start": 1}' in results
+    assert "[lines] invalid call" in results.split("\n\n")[2]
+    assert "[grep] unknown tool; use symbol, lines" in results
+    assert stats["tool_calls"] == 3
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("ollama")
+
+from conversation import ConversationalAssistant, is_follow_up  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["what about its damage?", "Where is it called?", "What does that do?", "and the tests", "Who calls them"],
+)
+def test_follow_ups(question):
+    assert is_follow_up(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Explain the login flow",
+        "Where is this config loaded from disk?",
+        "Where is it defined in Combat.resolve?",
+        "What does load_config do with it?",
+        "How does SpellBook work?",
+        "List commands",
+    ],
+)
+def test_new_subjects(question):
+    assert not is_follow_up(question)
+
+
+class Assistant:
+    config = {}
+
+    def refresh_index(self):
+        pass
+
+    def answer_lookup(self, question):
+        return None
+
+    def context_blocks(self, query, files=None):
+        return []
+
+
+def test_topic_follows_new_subjects():
+    chat = ConversationalAssistant(Assistant())
+    assert chat.prepare("Where are spells loaded from disk at startup?").search_query.startswith("Where are")
+    assert chat.prepare("Explain the login flow").search_query == "Explain the login flow"
+    follow_up = chat.prepare("What calls it?").search_query
+    assert follow_up == "Explain the login flow What calls it?"
+    chat.prepare("How is gold taxed in the economy?")
+    question = "Where is this config loaded from disk?"
+    assert chat.prepare(question).search_query == question
@@ -0,0 +1,23 @@
+from file_cache import FileCache
+
+SOURCE = (
+    "# page one\n"
+    "\f\n"
+    "x = '\u2028'  # a line separator inside a string\n"
+    "\n"
+    "def resolve(attacker):\n"
+    "    damage = attacker.strength\v\n"
+    "    return damage\n"
+    "\n"
+    "y = 1\n"
+)
+
+
+def test_symbol_ranges_count_only_newlines(tmp_path):
+    path = tmp_path / "combat.py"
+    path.write_text(SOURCE, encoding="utf-8", newline="")
+    cache = FileCache()
+    assert cache.line_count(path) == 9
+    assert cache.symbol_ranges(path, ["resolve"], context=0) == [(5, 7)]
+    assert cache.read_lines(path, 5, 7).startswith("def resolve(attacker):")
+    assert cache.symbol_ranges(path, ["combat.resolve"], context=3) == [(2, 9)]
@@ -0,0 +1,174 @@
+import shutil
+import subprocess
+
+import pytest
+
+from git_changes import changed_files, dirty_files, head_commit, overlay_name
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / "code"
+    (repo / "src").mkdir(parents=True)
+    _git(repo, "init", "-b", "main")
+    _git(repo, "config", "user.email", "dev@example.com")
+    _git(repo, "config", "user.name", "dev")
+    for i in range(3):
+        (repo / "src" / f"m{i}.py").write_text(f"def func{i}():\n    return {i}\n")
+    (repo / ".gitignore").write_text("ignored.py\n")
+    (repo / "ignored.py").write_text("x = 1\n")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-m", "init")
+    return repo
+
+
+def test_changed_files_include_edits_deletions_and_untracked(repo):
+    since = head_commit(repo)
+    (repo / "src" / "m0.py").write_text("def edited():\n    pass\n")
+    (repo / "src" / "m1.py").unlink()
+    (repo / "src" / "new.py").write_text("def new():\n    pass\n")
+    (repo / "notes.txt").write_text("not matched\n")
+    expected = {repo / "src" / "m0.py", repo / "src" / "m1.py", repo / "src" / "new.py"}
+    assert changed_files(repo, since, ["*.py"]) == expected
+    assert dirty_files(repo, ["*.py"]) == expected
+
+
+def test_changed_files_unknown_commit(repo):
+    assert changed_files(repo, "0" * 40, ["*.py"]) is None
+
+
+def test_reverted_edits_are_invisible_to_the_diff(repo):
+    # Why the indexer records dirty files: after a revert the diff no longer shows them
+    since = head_commit(repo)
+    (repo / "src" / "m0.py").write_text("def edited():\n    pass\n")
+    (repo / "src" / "new.py").write_text("def new():\n    pass\n")
+    dirty = dirty_files(repo, ["*.py"])
+    _git(repo, "checkout", "--", "src/m0.py")
+    (repo / "src" / "new.py").unlink()
+    assert changed_files(repo, since, ["*.py"]) == set()
+    assert dirty == {repo / "src" / "m0.py", repo / "src" / "new.py"}
+
+
+def test_overlay_name_fits_versioned_collection_names():
+    name = overlay_name("universal_knowledge", "feature/" + "x" * 80)
+    assert len(name) + len("__20260101000000_abcd") <= 63
+
+
+# ---------- Indexer (needs Chroma) ----------
+
+
+def _indexer(repo, index_path, **kwargs):
+    from index_codebase import CodebaseIndexer
+
+    settings = dict(
+        chunk_size=4,
+        overlap=1,
+        collection_name="kb",
+        patterns=["*.py"],
+        vector_store=None,
+        summaries=False,
+        gc_grace_seconds=0,
+    )
+    return CodebaseIndexer(repo, index_path, **{**settings, **kwargs})
+
+
+def _indexed(index_path, logical="kb"):
+    """file -> concatenated chunk text of the live version of `logical`."""
+    import chromadb
+
+    from index_aliases import resolve_collection
+
+    client = chromadb.PersistentClient(path=str(index_path))
+    collection = client.get_collection(resolve_collection(index_path, logical))
+    page = collection.get(include=["documents", "metadatas"])
+    files = {}
+    for doc, meta in sorted(zip(page["documents"], page["metadatas"]), key=lambda pair: pair[1]["start_line"]):
+        files[meta["file"]] = files.get(meta["file"], "") + doc
+    return files
+
+
+def test_update_reindexes_only_the_diff(repo, tmp_path):
+    pytest.importorskip("chromadb")
+    index_path = tmp_path / "index"
+    assert _indexer(repo, index_path).index_codebase()["mode"] == "full"
+    assert _indexer(repo, index_path).index_codebase()["changed_files"] == 0
+
+    (repo / "src" / "m0.py").write_text("def edited():\n    pass\n")
+    (repo / "src" / "m1.py").unlink()
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-m", "edit")
+    stats = _indexer(repo, index_path).index_codebase()
+    assert (stats["mode"], stats["changed_files"]) == ("update", 2)
+    files = _indexed(index_path)
+    assert sorted(files) == ["code/src/m0.py", "code/src/m2.py"]
+    assert "edited" in files["code/src/m0.py"]
+
+
+def test_reverted_dirty_files_are_reindexed(repo, tmp_path):
+    pytest.importorskip("chromadb")
+    index_path = tmp_path / "index"
+    _indexer(repo, index_path).index_codebase()
+    original = _indexed(index_path)
+
+    (repo / "src" / "m0.py").write_text("def uncommitted():\n    pass\n")
+    (repo / "src" / "new.py").write_text("def untracked():\n    pass\n")
+    assert _indexer(repo, index_path).index_codebase()["changed_files"] == 2
+    assert "untracked" in _indexed(index_path)["code/src/new.py"]
+
+    _git(repo, "checkout", "--", "src/m0.py")
+    (repo / "src" / "new.py").unlink()
+    stats = _indexer(repo, index_path).index_codebase()
+    assert (stats["mode"], stats["changed_files"]) == ("update", 2)
+    assert _indexed(index_path) == original
+    assert _indexer(repo, index_path).index_codebase()["changed_files"] == 0
+
+
+def test_branch_is_indexed_as_overlay(repo, tmp_path):
+    pytest.importorskip("chromadb")
+    index_path = tmp_path / "index"
+    _indexer(repo, index_path).index_codebase()
+    base = _indexed(index_path)
+
+    _git(repo, "checkout", "-b", "feature/x")
+    (repo / "src" / "m0.py").write_text("def feature():\n    pass\n")
+    (repo / "src" / "m2.py").unlink()
+    stats = _indexer(repo, index_path).index_codebase()
+    assert (stats["mode"], stats["branch"], stats["changed_files"]) == ("overlay", "feature/x", 2)
+    overlay = _indexed(index_path, overlay_name("kb", "feature/x"))
+    assert sorted(overlay) == ["code/src/m0.py"]
+    assert "feature" in overlay["code/src/m0.py"]
+    # The base index is untouched
+    assert _indexed(index_path) == base
+
+
+def test_chunking_changes_force_a_full_build(repo, tmp_path):
+    pytest.importorskip("chromadb")
+    index_path = tmp_path / "index"
+    _indexer(repo, index_path).index_codebase()
+
+    stats = _indexer(repo, index_path, chunk_size=2).index_codebase()
+    assert (stats["mode"], stats["chunk_size"]) == ("full", 2)
+    assert _indexer(repo, index_path, chunk_size=2).index_codebase()["changed_files"] == 0
+
+    # A newly added pattern picks up files the diff would never report, even on a branch
+    (repo / "README.md").write_text("# Code\n")
+    _git(repo, "add", "README.md")
+    _git(repo, "commit", "-m", "docs")
+    _git(repo, "checkout", "-b", "feature/docs")
+    stats = _indexer(repo, index_path, chunk_size=2, patterns=["*.py", "*.md"]).index_codebase()
+    assert stats["mode"] == "full"
+    assert "code/README.md" in _indexed(index_path)
+
+
+def test_list_files_respects_gitignore_inside_a_work_tree(repo):
+    pytest.importorskip("chromadb")
+    from index_codebase import list_files
+
+    assert repo / "ignored.py" not in list_files(repo, ["*.py"], git_root=repo)
+    assert repo / "ignored.py" in list_files(repo, ["*.py"])
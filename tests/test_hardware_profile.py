@@ -0,0 +1,89 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from conftest import StubHandler  # noqa: E402
+from hardware_profile import benchmark_models, choose_profile, runtime_options  # noqa: E402
+
+# Tokens per second the stub server reports: (prefill, generation)
+SPEEDS = {
+    "qwen2.5-coder:7b": (50, 4),
+    "qwen2.5-coder:3b": (300, 50),
+    "qwen2.5-coder:1.5b": (400, 50),
+}
+PROMPT_TOKENS = 600
+
+
+class GenerateHandler(StubHandler):
+    requests = []
+
+    def respond(self, path, body):
+        assert path == "/api/generate" and body["stream"] is False
+        self.requests.append(body)
+        prefill, generate = SPEEDS[body["model"]]
+        payload = {
+            "model": body["model"],
+            "response": "It finds the target.",
+            "prompt_eval_count": PROMPT_TOKENS,
+            "prompt_eval_duration": int(PROMPT_TOKENS / prefill * 1e9),
+            "eval_count": 32,
+            "eval_duration": int(32 / generate * 1e9),
+            "load_duration": int(0.5e9),
+        }
+        self.send_json_lines([payload])
+
+
+def _hardware(ram_gb):
+    return {"available_ram_gb": ram_gb, "total_ram_gb": ram_gb * 2, "physical_cores": 6, "logical_cores": 12}
+
+
+@pytest.fixture
+def benchmarks(stub_server):
+    GenerateHandler.requests = []
+    host = stub_server(GenerateHandler)
+    results = benchmark_models(host, list(SPEEDS), num_thread=6)
+    assert [body["options"]["num_thread"] for body in GenerateHandler.requests] == [6, 6, 6]
+    return results
+
+
+def test_benchmark_measures_speeds(benchmarks):
+    assert benchmarks["qwen2.5-coder:3b"]["prefill_tps"] == 300.0
+    assert benchmarks["qwen2.5-coder:3b"]["generate_tps"] == 50.0
+    assert benchmarks["qwen2.5-coder:7b"]["load_s"] == 0.5
+
+
+def test_profile_meets_latency_target(benchmarks):
+    # 7b is too slow, 3b meets 10 s with three 50-line chunks (1500 prompt tokens: 5 s + 4 s)
+    profile = choose_profile(_hardware(16), benchmarks, target_latency_s=10, chunk_lines=50)
+    assert profile["model"] == "qwen2.5-coder:3b"
+    assert profile["top_k"] == 3
+    assert profile["estimated_latency_s"] == 9.0
+    assert profile["num_thread"] == 6
+    # Spare memory goes to the largest context window
+    assert profile["context_window"] == 32768
+
+
+def test_profile_context_limited_by_memory(benchmarks):
+    # 3 GB free: 7b does not fit, 3b fits with at most an 8k context
+    profile = choose_profile(_hardware(3), benchmarks, target_latency_s=10, chunk_lines=50)
+    assert (profile["model"], profile["top_k"], profile["context_window"]) == ("qwen2.5-coder:3b", 3, 8192)
+
+
+def test_unreachable_target_falls_back_to_fastest(benchmarks):
+    profile = choose_profile(_hardware(16), benchmarks, target_latency_s=2, chunk_lines=50)
+    assert (profile["model"], profile["top_k"]) == ("qwen2.5-coder:1.5b", 2)
+    assert profile["estimated_latency_s"] == 6.8
+
+
+def test_runtime_options_from_profile():
+    config = {"context": {"context_window": 8192}, "ollama": {"num_thread": 6}}
+    assert runtime_options(config) == {"num_ctx": 8192, "num_thread": 6}
+
+
+def test_unknown_models_sized_by_parameter_count():
+    # "3b" is a substring of "13b"; the 13b model must not be sized like the 3b tier
+    profile = choose_profile(_hardware(4), candidates=["codellama:13b", "qwen2.5-coder:1.5b"])
+    assert profile["model"] == "qwen2.5-coder:1.5b"
+    # With room for it, the larger model wins, but its KV cache limits the context
+    profile = choose_profile(_hardware(16), candidates=["codellama:13b", "qwen2.5-coder:1.5b"])
+    assert (profile["model"], profile["context_window"]) == ("codellama:13b", 8192)
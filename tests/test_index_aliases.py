@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from index_aliases import collect_garbage, read_aliases, set_alias, swap_alias, version_name
+from symbol_index import symbol_db_path
+
+
+class Client:
+    """The one Chroma client call garbage collection makes."""
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete_collection(self, name):
+        self.deleted.append(name)
+
+
+def test_version_names_differ_within_one_second():
+    names = {version_name("kb") for _ in range(50)}
+    assert len(names) == 50
+    assert all(name.startswith("kb__") for name in names)
+
+
+def test_locked_symbol_table_is_retried_on_next_run(tmp_path, monkeypatch):
+    set_alias(tmp_path, "kb", "kb__v1")
+    swap_alias(tmp_path, "kb", "kb__v2")
+    db_path = symbol_db_path(tmp_path, "kb__v1")
+    db_path.write_text("")
+
+    real_unlink = Path.unlink
+
+    def locked(path, missing_ok=False):
+        if path == db_path:
+            raise PermissionError("in use by another process")
+        return real_unlink(path, missing_ok=missing_ok)
+
+    monkeypatch.setattr(Path, "unlink", locked)
+    assert collect_garbage(Client(), tmp_path, grace_seconds=0) == []
+    assert db_path.exists()
+
+    monkeypatch.setattr(Path, "unlink", real_unlink)
+    assert collect_garbage(Client(), tmp_path, grace_seconds=0) == ["kb__v1"]
+    assert not db_path.exists()
+    assert read_aliases(tmp_path) == {"kb": "kb__v2"}
@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from index_aliases import alias_stamp, resolve_collection, set_alias  # noqa: E402
+from index_bundles import (  # noqa: E402
+    _install_symbols,
+    _localize_page,
+    _record_hash,
+    compatibility_error,
+    export_bundle,
+    import_bundle,
+    installed_bundle,
+    read_manifest,
+)
+from summaries import summary_collection_name  # noqa: E402
+from symbol_index import SymbolIndex, symbol_db_path  # noqa: E402
+
+FILES = ("a.py", "b.py", "c.py")
+KB = {"collection": "kb", "path": "/work/code", "chunk_size": 40, "overlap": 5, "patterns": ["*.py"]}
+
+
+def _client(index_path):
+    import chromadb
+
+    return chromadb.PersistentClient(path=str(index_path))
+
+
+def _record(file, n=0):
+    return f"code/{file}:{n}", f"def {file.split('/')[-1][:-3]}_{n}(): pass", {"file": f"code/{file}", "dir": "code"}
+
+
+def _put(collection, records):
+    ids, documents, metadatas = map(list, zip(*records))
+    rng = np.random.default_rng(len(ids))
+    collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=rng.normal(size=(len(ids), 8)))
+
+
+@pytest.fixture
+def source(tmp_path):
+    """An index of three files with summaries and a symbol table, served as 'kb'."""
+    index_path = tmp_path / "source"
+    client = _client(index_path)
+    collection = client.create_collection("kb__v1")
+    _put(collection, [_record(name) for name in FILES])
+    summaries = client.create_collection(summary_collection_name("kb__v1"))
+    _put(summaries, [(f"file:code/{name}", f"File: code/{name}", {"file": f"code/{name}"}) for name in FILES])
+    symbols = SymbolIndex(symbol_db_path(index_path, "kb__v1"))
+    symbols.add_file("code/a.py", "def a_0():\n    pass\n", lambda line: "code/a.py:0")
+    symbols.close()
+    set_alias(index_path, "kb", "kb__v1")
+    return index_path
+
+
+def test_record_hash_ignores_metadata_key_order():
+    assert _record_hash("text", {"a": 1, "b": 2}) == _record_hash("text", {"b": 2, "a": 1})
+    assert _record_hash("text", {"a": 1}) != _record_hash("text", {"a": 2})
+    assert _record_hash("text", None) == _record_hash("text", {})
+
+
+def test_probe_compatibility():
+    local = {"function": "chromadb.default", "dim": 2, "probe": [1.0, 0.0]}
+    assert compatibility_error(dict(local), local) is None
+    assert "dims" in compatibility_error(dict(local, dim=3), local)
+    assert "probe similarity" in compatibility_error(dict(local, probe=[0.0, 1.0]), local)
+
+
+@pytest.mark.skipif(os.sep != "/", reason="localizes Windows paths on a POSIX system")
+def test_windows_paths_are_localized(tmp_path):
+    page = {
+        "ids": ["file:code\\world\\room.py", "dir:code\\world", "code\\world\\room.py:3"],
+        "metadatas": [{"file": "code\\world\\room.py", "dir": "code\\world"}, {"dir": "code\\world"}, {}],
+    }
+    page = _localize_page(page, "\\")
+    assert page["ids"][:2] == ["file:code/world/room.py", "dir:code/world"]
+    assert page["metadatas"][0] == {"file": "code/world/room.py", "dir": "code/world"}
+
+    built = SymbolIndex(tmp_path / "built.db")
+    built.add_file("code\\world\\room.py", "def enter():\n    pass\n", lambda line: "chunk")
+    built.close()
+    with open(tmp_path / "built.db", "rb") as f:
+        _install_symbols(f, tmp_path / "installed.db", "\\", tmp_path)
+    installed = SymbolIndex(tmp_path / "installed.db")
+    assert installed.lookup("enter")[0]["file"] == "code/world/room.py"
+    assert installed.get_meta("root") == str(tmp_path.resolve())
+    installed.close()
+
+
+def test_full_and_delta_round_trip(source, tmp_path):
+    full = tmp_path / "full.idx.tgz"
+    manifest = export_bundle(_client(source), source, KB, full)
+    assert (manifest["kind"], manifest["records"]) == ("full", 3)
+    assert manifest["summaries"] and manifest["symbols"]
+
+    target = tmp_path / "target"
+    client = _client(target)
+    stats = import_bundle(client, target, full, kb=KB, gc_grace_seconds=0)
+    live = resolve_collection(target, "kb")
+    assert (stats["total_chunks"], stats["physical_collection"]) == (3, live)
+    assert installed_bundle(target, "kb") == manifest["bundle_id"]
+    assert client.get_collection(summary_collection_name(live)).count() == 3
+    symbols = SymbolIndex(symbol_db_path(target, live))
+    assert symbols.lookup("a_0")[0]["file"] == "code/a.py"
+    assert symbols.get_meta("root") == "/work"
+    symbols.close()
+
+    # Edit a.py, delete c.py (and its summary), add d.py
+    source_client = _client(source)
+    collection = source_client.get_collection("kb__v1")
+    _put(collection, [_record("a.py", 1), _record("d.py")])
+    collection.delete(ids=["code/c.py:0"])
+    source_client.get_collection(summary_collection_name("kb__v1")).delete(ids=["file:code/c.py"])
+    delta = tmp_path / "delta.idx.tgz"
+    manifest = export_bundle(source_client, source, KB, delta, base=str(full))
+    assert (manifest["kind"], manifest["records"], manifest["deleted"]) == ("delta", 2, 1)
+    assert set(read_manifest(delta)["hashes"]) == {"code/a.py:0", "code/a.py:1", "code/b.py:0", "code/d.py:0"}
+
+    # A delta only applies on top of its base bundle
+    with pytest.raises(ValueError, match="Delta applies to bundle"):
+        import_bundle(_client(tmp_path / "empty"), tmp_path / "empty", delta, kb=KB)
+
+    stamp = alias_stamp(target)
+    stats = import_bundle(client, target, delta, kb=KB, in_place=True, gc_grace_seconds=0)
+    assert (stats["physical_collection"], stats["total_chunks"], stats["deleted_chunks"]) == (live, 4, 1)
+    assert alias_stamp(target) != stamp  # running assistants reopen summaries and symbols
+    summaries = client.get_collection(summary_collection_name(live)).get()["ids"]
+    assert sorted(summaries) == ["file:code/a.py", "file:code/b.py"]
+    assert sorted(client.get_collection(live).get()["ids"]) == sorted(read_manifest(delta)["hashes"])
@@ -0,0 +1,35 @@
+import threading
+import time
+
+import index_scheduler
+from index_scheduler import QueryActivity
+
+
+def _heartbeats():
+    return [t for t in threading.enumerate() if t.name == "query-heartbeat"]
+
+
+def test_back_to_back_queries_share_one_heartbeat(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_scheduler, "HEARTBEAT_SECONDS", 0.2)
+    activity = QueryActivity(tmp_path)
+    for _ in range(20):
+        with activity.busy():
+            assert activity.in_flight()
+        assert not activity.in_flight()
+    assert len(_heartbeats()) == 1
+
+    # Once idle, the heartbeat exits and the next query starts a new one
+    time.sleep(0.5)
+    assert _heartbeats() == []
+    with activity.busy():
+        assert len(_heartbeats()) == 1
+
+
+def test_heartbeat_keeps_long_queries_fresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_scheduler, "HEARTBEAT_SECONDS", 0.05)
+    activity = QueryActivity(tmp_path)
+    with activity.busy():
+        first = activity.path.stat().st_mtime_ns
+        time.sleep(0.3)
+        assert activity.path.stat().st_mtime_ns > first
+    assert not activity.path.exists()
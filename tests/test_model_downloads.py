@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from conftest import StubHandler  # noqa: E402
+from model_downloads import ModelDownloadManager  # noqa: E402
+
+LAYER = "sha256:aaaa"
+SIZE = 1000
+
+
+def _pull_server(drops, dropped_progress=300):
+    """A /api/pull stand-in: the first `drops` requests stop mid-stream, later ones finish.
+
+    A dropped request advances its model by `dropped_progress` bytes; partial
+    bytes are kept between requests, as Ollama keeps partial blobs.
+    """
+
+    class Handler(StubHandler):
+        state = {"requests": 0, "active": 0, "max_active": 0, "completed": {}}
+        lock = threading.Lock()
+
+        def respond(self, path, body):
+            assert path == "/api/pull" and body["stream"]
+            with self.lock:
+                self.state["requests"] += 1
+                attempt = self.state["requests"]
+                self.state["active"] += 1
+                self.state["max_active"] = max(self.state["max_active"], self.state["active"])
+            try:
+                done = self.state["completed"].get(body["name"], 0)
+                lines = [
+                    {"status": "pulling manifest"},
+                    {"status": "pulling", "digest": LAYER, "total": SIZE, "completed": done},
+                ]
+                if attempt <= drops:
+                    # Connection lost part way: maybe some progress, never "success"
+                    done = min(SIZE, done + dropped_progress)
+                    lines.append({"status": "pulling", "digest": LAYER, "total": SIZE, "completed": done})
+                else:
+                    time.sleep(0.1)
+                    while done < SIZE:
+                        done = min(SIZE, done + 250)
+                        lines.append({"status": "pulling", "digest": LAYER, "total": SIZE, "completed": done})
+                    lines.append({"status": "success"})
+                self.state["completed"][body["name"]] = done
+                self.send_json_lines(lines)
+            finally:
+                with self.lock:
+                    self.state["active"] -= 1
+
+    return Handler
+
+
+def test_dropped_stream_is_retried_and_resumes(stub_server, tmp_path):
+    handler = _pull_server(drops=1)
+    manager = ModelDownloadManager(stub_server(handler), state_path=tmp_path / "state.json")
+    updates = []
+    ok, message = manager.pull("tiny:1b", on_progress=lambda p: updates.append(p.snapshot()))
+    assert ok, message
+    assert handler.state["requests"] == 2
+    progress = manager.progress["tiny:1b"]
+    assert progress.attempts == 2
+    assert (progress.completed, progress.total) == (SIZE, SIZE)
+    assert any(u["status"].startswith("connection lost") for u in updates)
+    assert manager.interrupted() == []
+
+
+def test_interrupted_pull_resumes_in_next_run(stub_server, tmp_path):
+    state_path = tmp_path / "state.json"
+    handler = _pull_server(drops=1, dropped_progress=400)
+    manager = ModelDownloadManager(stub_server(handler), max_retries=0, state_path=state_path)
+    ok, message = manager.pull("tiny:1b")
+    assert not ok and "will resume" in message
+    assert manager.interrupted() == ["tiny:1b"]
+
+    # Next run: the server is healthy and the 400 bytes from before are still on disk
+    later = ModelDownloadManager(stub_server(handler), state_path=state_path)
+    results = later.resume()
+    assert results == {"tiny:1b": (True, "Model tiny:1b downloaded successfully")}
+    assert later.progress["tiny:1b"].resumed_bytes == 400
+    assert later.interrupted() == []
+
+
+def test_concurrency_limit(stub_server, tmp_path):
+    handler = _pull_server(drops=0)
+    manager = ModelDownloadManager(stub_server(handler), max_concurrent=2, state_path=tmp_path / "state.json")
+    results = manager.pull_many([f"model{i}:1b" for i in range(5)])
+    assert all(ok for ok, _ in results.values())
+    assert handler.state["max_active"] == 2
+    assert manager.overall()["fraction"] == 1.0
@@ -0,0 +1,58 @@
+import json
+import time
+import tracemalloc
+
+import pytest
+
+import query_profiler
+from query_profiler import QueryProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    tracing = tracemalloc.is_tracing()
+    yield QueryProfiler(output_dir=tmp_path, query_threshold_ms=50, sample_interval_ms=1)
+    if not tracing:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    taken = []
+    take = tracemalloc.take_snapshot
+
+    def counting():
+        taken.append(1)
+        return take()
+
+    monkeypatch.setattr(query_profiler.tracemalloc, "take_snapshot", counting)
+    return taken
+
+
+def test_fast_queries_take_no_snapshot(profiler, snapshots):
+    for i in range(5):
+        with profiler.capture("query", f"question {i}"):
+            sum(range(1000))
+    assert snapshots == []
+    assert list(profiler.output_dir.glob("*.json")) == []
+
+
+def test_slow_query_reports_growth_since_previous_capture(profiler, snapshots):
+    kept = []
+    for i in range(2):
+        session = profiler.session("query", f"slow {i}")
+        # Too short to be sampled; must not stop the capture from being saved
+        with session.stage("prepare"):
+            pass
+        with session.stage("generate"):
+            kept.append([bytearray(1024) for _ in range(200)])
+            time.sleep(0.1)
+        assert session.finish() is not None
+    assert len(snapshots) == 2
+
+    first, second = (json.loads(path.read_text()) for path in sorted(profiler.output_dir.glob("*.json")))
+    assert first["memory"]["growth_since"] == "profiling started"
+    assert second["memory"]["growth_since"] == f"capture {first['id']}"
+    assert second["memory"]["end_bytes"] > second["memory"]["start_bytes"]
+    assert any("test_query_profiler.py" in site["site"] for site in second["memory"]["top_growth"])
+    assert (profiler.output_dir / f"{second['id']}.tracemalloc").exists()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("ollama")
+
+from query_queue import QueryQueue  # noqa: E402
+
+
+class Assistant:
+    """Answers a question with its upper-cased text.
+
+    Retrieval for questions in `hold` blocks until their event is set;
+    questions starting with "slow" stream until aborted.
+    """
+
+    def __init__(self):
+        self.prepared = []
+        self.hold = {}
+        self.aborted = threading.Event()
+
+    def prepare(self, question, files=None):
+        self.prepared.append(question)
+        if question in self.hold:
+            self.hold[question].wait(5)
+        return [{"role": "user", "content": question}]
+
+    def generate(self, messages, cancel_event=None, register_abort=None):
+        question = messages[-1]["content"]
+        if question.startswith("slow"):
+            register_abort(self.aborted.set)
+            if self.aborted.wait(5):
+                raise ConnectionError("connection closed")
+        return question.upper()
+
+
+@pytest.fixture
+def queue():
+    assistant = Assistant()
+    results, errors = [], []
+    work = QueryQueue(
+        assistant,
+        on_result=lambda job, answer: results.append((job.id, answer)),
+        on_error=lambda job, e: errors.append((job.id, e)),
+    )
+    work.results, work.errors = results, errors
+    yield work
+    work.shutdown()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_answers_in_submission_order(queue):
+    jobs = [queue.submit(question) for question in ("one", "two", "three")]
+    _wait_for(lambda: len(queue.results) == 3)
+    assert queue.results == [(1, "ONE"), (2, "TWO"), (3, "THREE")]
+    assert [job.state for job in jobs] == ["done"] * 3
+    assert queue.active is None and queue.pending() == []
+
+
+def test_cancel_before_prepare_skips_retrieval(queue):
+    release = queue.assistant.hold["first"] = threading.Event()
+    queue.submit("first")
+    _wait_for(lambda: queue.assistant.prepared == ["first"])
+    second = queue.submit("second")
+    assert queue.position(second) == 2
+    assert queue.cancel(second.id)
+    release.set()
+    _wait_for(lambda: queue.results)
+    queue.submit("third")
+    _wait_for(lambda: len(queue.results) == 2)
+    assert second.state == "cancelled"
+    assert queue.assistant.prepared == ["first", "third"]
+    assert queue.results == [(1, "FIRST"), (3, "THIRD")]
+
+
+def test_cancel_after_prepare_aborts_generation(queue):
+    job = queue.submit("slow question")
+    _wait_for(lambda: job.state == "generating" and job._abort is not None)
+    assert queue.position(job) == 0
+    assert queue.cancel()
+    _wait_for(lambda: job.state == "cancelled")
+    assert queue.assistant.aborted.is_set()
+    assert queue.results == [] and queue.errors == []
+
+
+def test_shutdown_cancels_work_and_rejects_new_questions(queue):
+    active = queue.submit("slow question")
+    waiting = queue.submit("after")
+    _wait_for(lambda: active.state == "generating")
+    queue.shutdown()
+    assert not queue._worker.is_alive()
+    assert (active.state, waiting.state) == ("cancelled", "cancelled")
+    assert queue.results == []
+    with pytest.raises(RuntimeError):
+        queue.submit("too late")
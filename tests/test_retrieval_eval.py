@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("yaml")
+
+from retrieval_eval import evaluate, load_cases  # noqa: E402
+
+
+def test_load_cases_normalizes_expected(tmp_path):
+    path = tmp_path / "cases.yaml"
+    path.write_text(
+        '- question: "Where is damage calculated?"\n'
+        "  expected:\n"
+        '    - file: "./world/combat.py"\n'
+        "      lines: [120, 180]\n"
+        '    - file: "world\\\\rules.py"\n',
+        encoding="utf-8",
+    )
+    assert load_cases(str(path)) == [
+        {
+            "question": "Where is damage calculated?",
+            "expected": [
+                {"file": "world/combat.py", "start": 120, "end": 180},
+                {"file": "world/rules.py", "start": 1, "end": None},
+            ],
+        }
+    ]
+
+
+@pytest.mark.parametrize("content", ["", "# all cases commented out\n", "[]\n", "-\n-\n"])
+def test_empty_case_set_is_rejected(tmp_path, content):
+    path = tmp_path / "cases.yaml"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(ValueError, match="has no cases"):
+        load_cases(str(path))
+
+
+def test_evaluate_scores_recall_and_mrr():
+    cases = [{"question": "q", "expected": [{"file": "world/combat.py", "start": 120, "end": 180}]}]
+    chunks = [
+        {"text": "x" * 40, "metadata": {"file": "world/rules.py", "start_line": 1, "end_line": 50}},
+        {"text": "y" * 40, "metadata": {"file": "src/world/combat.py", "start_line": 150, "end_line": 200}},
+    ]
+    report = evaluate(lambda question, k: chunks[:k], cases, [1, 2])
+    assert report["recall"] == {1: 0.0, 2: 1.0}
+    assert report["mrr"] == 0.5
+    assert report["avg_context_tokens"] == {1: 10, 2: 20}
@@ -0,0 +1,97 @@
+import gc
+import os
+
+import pytest
+
+pytest.importorskip("yaml")
+
+from runtime_config import RuntimeConfig, changed_keys, validate  # noqa: E402
+
+
+def test_booleans_are_not_accepted_as_numbers():
+    assert validate({"retrieval": {"top_k": True}}) == ["retrieval.top_k: expected int, got True"]
+    assert validate({"ollama": {"timeout": False}}) == ["ollama.timeout: expected int or float, got False"]
+    assert validate({"retrieval": {"rerank": 1}}) == ["retrieval.rerank: expected bool, got 1"]
+    assert validate({"retrieval": {"top_k": 3, "rerank": True}, "ollama": {"timeout": 2.5}}) == []
+
+
+def test_templates_must_only_use_known_placeholders():
+    assert validate({"prompts": {"user": "{context}\n\n{question} as {{json}}"}}) == []
+    (error,) = validate({"prompts": {"system": "Help with {project}"}})
+    assert error.startswith("prompts.system: 'Help with {project}' is not a valid template")
+    assert validate({"prompts": {"user": "unclosed {context"}})
+
+
+def test_sections_must_be_mappings():
+    assert validate({"retrieval": 5}) == ["retrieval: must be a mapping, got int"]
+    # Null sections fall back to the defaults
+    assert validate({"retrieval": None, "indexing": {"background": None}}) == []
+
+
+def test_changed_keys_are_dotted():
+    old = {"retrieval": {"top_k": 3, "rerank": False}, "models": {"default": "a"}}
+    new = {"retrieval": {"top_k": 5, "rerank": False}, "chat": {"enabled": True}}
+    assert changed_keys(old, new) == {"retrieval.top_k", "models.default", "chat.enabled"}
+
+
+def _write(path, text):
+    stamp = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text)
+    # Same-size edits within the file system's timestamp resolution still count as changes
+    os.utime(path, ns=(stamp + 10**9, stamp + 10**9))
+
+
+class Listener:
+    def __init__(self):
+        self.calls = []
+
+    def on_change(self, data, changed):
+        self.calls.append(changed)
+
+
+def test_reload_ignores_invalid_edits(tmp_path):
+    path = tmp_path / "config.yaml"
+    _write(path, "retrieval:\n  top_k: 3\n")
+    config = RuntimeConfig(path)
+    listener = Listener()
+    config.subscribe(listener.on_change)
+
+    _write(path, "retrieval:\n  top_k: 0\n")
+    assert config.reload() == set()
+    _write(path, "retrieval: [unclosed\n")
+    assert config.reload() == set()
+    assert config.get("retrieval.top_k") == 3 and listener.calls == []
+
+    _write(path, "retrieval:\n  top_k: 5\n")
+    assert config.reload() == {"retrieval.top_k"}
+    assert config.get("retrieval.top_k") == 5
+    assert listener.calls == [{"retrieval.top_k"}]
+    assert config.reload() == set()  # unchanged file
+
+
+def test_restart_only_changes_do_not_notify(tmp_path):
+    path = tmp_path / "config.yaml"
+    _write(path, "indexing:\n  shards: 1\n")
+    config = RuntimeConfig(path)
+    listener = Listener()
+    config.subscribe(listener.on_change)
+    _write(path, "indexing:\n  shards: 4\n")
+    assert config.reload() == set()
+    assert config.get("indexing.shards") == 4 and listener.calls == []
+
+
+def test_bound_methods_are_held_weakly(tmp_path):
+    path = tmp_path / "config.yaml"
+    _write(path, "retrieval:\n  top_k: 3\n")
+    config = RuntimeConfig(path)
+    calls = []
+    dropped = Listener()
+    config.subscribe(dropped.on_change)
+    config.subscribe(lambda data, changed: calls.append(changed))
+    del dropped
+    gc.collect()
+
+    _write(path, "retrieval:\n  top_k: 4\n")
+    assert config.reload() == {"retrieval.top_k"}
+    assert calls == [{"retrieval.top_k"}]  # plain functions stay subscribed
+    assert len(config._listeners) == 1
@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sharded_index import ShardedCollection, _shard_count, _shard_get, _shard_query, shard_of
+
+
+def test_shard_of_is_stable_and_spreads_files():
+    assert shard_of("src\\world\\room.py", 4) == shard_of("src/world/room.py", 4)
+    assert shard_of("src/world/room.py", 4) == shard_of("src/world/room.py", 4)
+    shards = [shard_of(f"src/m{i}.py", 4) for i in range(400)]
+    assert set(shards) == {0, 1, 2, 3}
+    assert min(shards.count(shard) for shard in range(4)) > 50
+
+
+class Shard:
+    """Stands in for one worker process: answers count/query/get over (id, distance) rows."""
+
+    def __init__(self, rows, delay=0.0):
+        self.rows = rows
+        self.delay = delay
+        self.rows_read = 0
+
+    def __call__(self, fn, *args):
+        time.sleep(self.delay)
+        if fn is _shard_count:
+            return len(self.rows)
+        if fn is _shard_query:
+            embeddings, n_results, where = args
+            best = sorted(self.rows, key=lambda row: row[1])[:n_results]
+            return {
+                "ids": [[row[0] for row in best]] * len(embeddings),
+                "documents": [[f"doc {row[0]}" for row in best]] * len(embeddings),
+                "metadatas": [[{"file": "f.py"} for _ in best]] * len(embeddings),
+                "distances": [[row[1] for row in best]] * len(embeddings),
+            }
+        assert fn is _shard_get
+        (kwargs,) = args
+        offset, limit = kwargs.get("offset") or 0, kwargs.get("limit")
+        rows = self.rows[offset:None if limit is None else offset + limit]
+        self.rows_read += len(rows)
+        return {"ids": [row[0] for row in rows], "documents": None, "included": []}
+
+
+class StubCollection(ShardedCollection):
+    """ShardedCollection whose shards are `Shard` stubs on threads instead of processes."""
+
+    def __init__(self, shards, timeout_ms=100):
+        self.shards = len(shards)
+        self.manifest = {"counts": [len(shard.rows) for shard in shards]}
+        self.timeout_s = timeout_ms / 1000
+        self._lock = threading.Lock()
+        self._ready = [True] * self.shards
+        self._stragglers = {}
+        self._stubs = shards
+        self._threads = ThreadPoolExecutor(max_workers=2 * self.shards)
+
+    def _submit(self, shard, fn, *args):
+        return self._threads.submit(self._stubs[shard], fn, *args)
+
+
+def test_query_merges_shard_results_by_distance():
+    collection = StubCollection([Shard([("a", 0.1), ("c", 0.5)]), Shard([("b", 0.2), ("d", 0.9)])])
+    result = collection.query(query_embeddings=[[0.0], [1.0]], n_results=3)
+    assert result["ids"] == [["a", "b", "c"], ["a", "b", "c"]]
+    assert result["distances"][0] == [0.1, 0.2, 0.5]
+    assert result["documents"][0][1] == "doc b"
+    assert result["degraded"] == []
+
+
+def test_slow_shard_is_left_out_and_reported():
+    slow = Shard([("b", 0.2)], delay=0.5)
+    collection = StubCollection([Shard([("a", 0.1), ("c", 0.5)]), slow], timeout_ms=50)
+    started = time.perf_counter()
+    result = collection.query(query_embeddings=[[0.0]], n_results=2)
+    assert time.perf_counter() - started < 0.4
+    assert (result["ids"], result["degraded"]) == ([["a", "c"]], [1])
+    # While it is still busy with the timed-out request, the shard is skipped outright
+    assert collection.query(query_embeddings=[[0.0]], n_results=2)["degraded"] == [1]
+
+
+def test_get_pages_read_only_their_rows():
+    shards = [Shard([(f"s{s}-{i}", 0.0) for i in range(rows)]) for s, rows in enumerate([5, 0, 7])]
+    collection = StubCollection(shards)
+    everything = collection.get()["ids"]
+    assert len(everything) == 12
+    for shard in shards:
+        shard.rows_read = 0
+
+    pages = [collection.get(limit=4, offset=offset)["ids"] for offset in range(0, 12, 4)]
+    assert sum(pages, []) == everything
+    assert sum(shard.rows_read for shard in shards) == 12
+    assert collection.get(limit=4, offset=12) == {}
@@ -0,0 +1,110 @@
+from summaries import build_summaries, summarize_dir, summarize_file, summary_collection_name
+
+SOURCE = '''"""Room handling.
+
+Longer description that is left out.
+"""
+
+
+class Room:
+    """A place players can be."""
+
+    def enter(self):
+        pass
+
+    def leave(self):
+        pass
+
+
+def load_rooms(path):
+    pass
+'''
+
+
+def test_summarize_python_file():
+    summary = summarize_file("world/rooms.py", SOURCE)
+    assert summary.splitlines() == [
+        "File: world/rooms.py",
+        "Room handling.",
+        "class Room: A place players can be. (methods: enter, leave)",
+        "def load_rooms",
+    ]
+
+
+def test_summarize_text_file_and_broken_python():
+    assert summarize_file("README.md", "intro\n# Title\ntext\n## Usage\n") == "File: README.md\n# Title\n## Usage"
+    assert summarize_file("bad.py", "def (:\n") == "File: bad.py\ndef (:"
+
+
+def test_summarize_dir_lists_main_definitions():
+    summary = summarize_dir("world", {"world/rooms.py": summarize_file("world/rooms.py", SOURCE), "world/x.md": "File"})
+    assert summary.splitlines() == ["Directory: world", "rooms.py: Room, load_rooms", "x.md"]
+
+
+class Collection:
+    def __init__(self):
+        self.records = {}
+        self.embedded = []  # ids Chroma had to embed
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        for i, record_id in enumerate(ids):
+            if embeddings is None:
+                self.embedded.append(record_id)
+            embedding = embeddings[i] if embeddings is not None else [float(len(documents[i]))]
+            self.records[record_id] = (documents[i], metadatas[i], embedding)
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = sorted(self.records)[offset : offset + limit]
+        return {
+            "ids": ids,
+            "documents": [self.records[i][0] for i in ids],
+            "metadatas": [self.records[i][1] for i in ids],
+            "embeddings": [self.records[i][2] for i in ids],
+        }
+
+
+class Client:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist")
+        return self.collections[name]
+
+    def create_collection(self, name, metadata=None):
+        self.collections[name] = Collection()
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        self.get_collection(name)
+        del self.collections[name]
+
+
+def test_unchanged_files_reuse_their_embeddings(tmp_path):
+    (tmp_path / "world").mkdir()
+    (tmp_path / "main.py").write_text("def main():\n    pass\n")
+    (tmp_path / "world" / "rooms.py").write_text(SOURCE)
+    (tmp_path / "world" / "items.py").write_text("class Item:\n    pass\n")
+    files = sorted(tmp_path.rglob("*.py"))
+    client = Client()
+
+    def relative(path):
+        return str(path.relative_to(tmp_path))
+
+    stats = build_summaries(client, "kb__v1", None, files, relative)
+    assert (stats["files"], stats["dirs"], stats["embedded"], stats["reused"]) == (3, 2, 5, 0)
+
+    (tmp_path / "world" / "items.py").write_text("class Item:\n    weight = 1\n")
+    stats = build_summaries(client, "kb__v2", "kb__v1", files, relative)
+    # The edited file and its directory are embedded again; main.py and "." keep theirs
+    assert (stats["embedded"], stats["reused"]) == (2, 3)
+    new = client.get_collection(summary_collection_name("kb__v2"))
+    assert sorted(new.embedded) == ["dir:world", "file:world/items.py"]
+    old = client.get_collection(summary_collection_name("kb__v1"))
+    assert new.records["file:main.py"] == old.records["file:main.py"]
+
+    # With the changed set from git, other files are not even read
+    (tmp_path / "main.py").unlink()
+    stats = build_summaries(client, "kb__v3", "kb__v2", files, relative, changed={tmp_path / "world" / "rooms.py"})
+    assert (stats["files"], stats["embedded"]) == (3, 0)
@@ -0,0 +1,26 @@
+import pytest
+
+from symbol_index import lookup_target
+
+
+@pytest.mark.parametrize(
+    "question, target",
+    [
+        ("where is CombatHandler defined?", "CombatHandler"),
+        ("Where is the class CombatHandler defined", "CombatHandler"),
+        ("where's world.combat.resolve defined", "world.combat.resolve"),
+        ("definition of resolve", "resolve"),
+        ("What is the definition of `CombatHandler.resolve`?", "CombatHandler.resolve"),
+        ("show me the definition of damage", "damage"),
+    ],
+)
+def test_definition_questions_are_lookups(question, target):
+    assert lookup_target(question) == target
+
+
+@pytest.mark.parametrize(
+    "question",
+    ["find damage", "find bugs", "show me damage", "locate CombatHandler", "where is damage", "where is damage handled"],
+)
+def test_other_questions_go_to_the_model(question):
+    assert lookup_target(question) is None
@@ -0,0 +1,100 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from vector_store import VectorStore, export_collection, export_method
+
+
+class Collection:
+    """Chroma's paging API over in-memory vectors."""
+
+    name = "kb__v1"
+
+    def __init__(self, vectors, files):
+        self.vectors = vectors
+        self.files = files
+
+    def count(self):
+        return len(self.vectors)
+
+    def get(self, ids=None, include=None, limit=None, offset=0, **kwargs):
+        if ids is not None:
+            rows = [int(chunk_id[2:]) for chunk_id in ids]
+        else:
+            rows = range(offset, min(offset + (limit or self.count()), self.count()))
+        return {
+            "ids": [f"id{i}" for i in rows],
+            "documents": [f"chunk {i}" for i in rows],
+            "metadatas": [
+                {"file": self.files[i], "dir": "src", "start_line": i, "end_line": i + 9, "chunk_index": i % 50}
+                for i in rows
+            ],
+            "embeddings": [self.vectors[i] for i in rows],
+        }
+
+
+@pytest.fixture(params=["flat", "int8"])
+def store(request, tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(33_000, 8)).astype(np.float32)  # more rows than SQLite allows bound parameters
+    files = [f"f{i % 7}.py" for i in range(len(vectors))]
+    collection = Collection(vectors, files)
+    export_collection(collection, tmp_path / "store", method=request.param)
+    return VectorStore.open(tmp_path / "store", source=lambda: collection), vectors
+
+
+def test_store_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        VectorStore(tmp_path)
+
+
+def test_fetch_and_row_ids_cover_large_stores(store):
+    store, vectors = store
+    rows = list(range(store.count))
+    records = store.fetch(rows)
+    assert len(records) == store.count
+    assert records[1234]["id"] == "id1234"
+    assert records[1234]["document"] == "chunk 1234"
+    ids = store.row_ids()
+    assert len(ids) == store.count and ids["id32999"] == 32999
+
+
+def test_search_finds_exact_vector_with_filter(store):
+    store, vectors = store
+    (hits,) = store.search(vectors[42], k=3)
+    assert hits[0][0] == 42
+    (hits,) = store.search(vectors[42], k=3, where={"file": {"$in": ["f1.py"]}})
+    assert all(store.fetch([row])[row]["metadata"]["file"] == "f1.py" for row, _ in hits)
+
+
+def test_store_is_smaller_than_float32_vectors(tmp_path):
+    vectors = np.random.default_rng(0).normal(size=(8000, 128)).astype(np.float32)
+    collection = Collection(vectors, ["f.py"] * len(vectors))
+    export_collection(collection, tmp_path / "int8", method="int8")
+    export_collection(collection, tmp_path / "pq", method="pq")
+    assert not (tmp_path / "int8" / "float16.npy").exists()
+    # Documents stay in Chroma
+    records = sqlite3.connect(str(tmp_path / "int8" / "records.db"))
+    assert [row[1] for row in records.execute("PRAGMA table_info(records)")] == ["row", "id", "metadata"]
+    records.close()
+
+    def size(path):
+        return sum(p.stat().st_size for p in path.iterdir())
+
+    # Metadata columns and ids included; the scan codes alone are ~4x and ~16x smaller
+    assert vectors.nbytes / size(tmp_path / "int8") > 3
+    assert vectors.nbytes / size(tmp_path / "pq") > 5
+
+    store = VectorStore.open(tmp_path / "int8", source=lambda: collection)
+    assert store.fetch([5])[5]["metadata"] == collection.get(ids=["id5"])["metadatas"][0]
+    result = store.query(query_embeddings=[vectors[7], vectors[9]], n_results=2)
+    assert [ids[0] for ids in result["ids"]] == ["id7", "id9"]
+    assert [docs[0] for docs in result["documents"]] == ["chunk 7", "chunk 9"]
+
+
+def test_export_is_opt_in():
+    assert export_method({}) is None
+    assert export_method({"indexing": {"vector_store": None}, "retrieval": {"backend": "auto"}}) is None
+    assert export_method({"retrieval": {"backend": "quantized"}}) == "int8"
+    assert export_method({"indexing": {"vector_store": "pq"}, "retrieval": {"backend": "chroma"}}) == "pq"
@@ -0,0 +1,85 @@
+"""
+Chat Transcript Model
+Stores chat messages separately from the text widget so the GUI only has to
+render a bounded window of recent messages.
+"""
+
+from typing import Dict, List
+
+
+class ChatTranscript:
+    """Message store with a sliding render window.
+
+    The widget only ever shows ``messages[render_start:]``. New messages are
+    appended at the end, ``trim()`` drops the oldest rendered messages once the
+    window is exceeded and ``older_page()`` brings a page of older messages
+    back when the user scrolls to the top.
+    """
+
+    def __init__(self, window_size: int = 40, page_size: int = 10, max_messages: int = 2000):
+        self.window_size = window_size
+        self.page_size = page_size
+        self.max_messages = max_messages
+        self.messages: List[Dict] = []
+        self.render_start = 0
+        # Absolute id of messages[0]; ids stay stable when old messages are dropped
+        self._first_id = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, content: str, role: str = "assistant") -> int:
+        """Store a message and return its id."""
+        self.messages.append({"role": role, "content": content})
+        if len(self.messages) > self.max_messages:
+            overflow = len(self.messages) - self.max_messages
+            del self.messages[:overflow]
+            self._first_id += overflow
+            self.render_start = max(0, self.render_start - overflow)
+        return self._first_id + len(self.messages) - 1
+
+    def get(self, message_id: int) -> Dict:
+        return self.messages[message_id - self._first_id]
+
+    def rendered_ids(self) -> List[int]:
+        return [self._first_id + i for i in range(self.render_start, len(self.messages))]
+
+    def has_older(self) -> bool:
+        return self.render_start > 0
+
+    def older_page(self) -> List[int]:
+        """Extend the window upwards by one page; returns ids newest-first."""
+        new_start = max(0, self.render_start - self.page_size)
+        ids = [self._first_id + i for i in range(self.render_start - 1, new_start - 1, -1)]
+        self.render_start = new_start
+        return ids
+
+    def trim(self) -> List[int]:
+        """Shrink the window back to ``window_size``; returns ids to un-render."""
+        excess = len(self.messages) - self.render_start - self.window_size
+        if excess <= 0:
+            return []
+        ids = [self._first_id + i for i in range(self.render_start, self.render_start + excess)]
+        self.render_start += excess
+        return ids
+
+    def text(self) -> str:
+        """Full transcript text, including messages no longer rendered."""
+        return "\n\n".join(m["content"] for m in self.messages)
+
+    @staticmethod
+    def split_chunks(text: str, chunk_chars: int = 2000) -> List[str]:
+        """Split text into render chunks, preferring line boundaries."""
+        if len(text) <= chunk_chars:
+            return [text]
+        chunks: List[str] = []
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + chunk_chars)
+            if end < len(text):
+                newline = text.rfind("\n", start, end)
+                if newline > start:
+                    end = newline + 1
+            chunks.append(text[start:end])
+            start = end
+        return chunks
@@ -0,0 +1,667 @@
+"""
+Compact Vector Store
+Memory-mapped NumPy alternative to the Chroma HNSW index. Embeddings are
+exported from a Chroma collection and searched by brute force, either
+exactly ("flat": one matmul over the normalized float32 matrix) or over
+int8/product-quantized codes, 4x/16x smaller than float32. Optionally the
+best candidates are re-scored against float16 copies of the vectors. The
+store keeps ids and metadata only; chunk text is read from Chroma by id.
+
+Usage:
+    python vector_store.py build     [--kb NAME] [--method auto|flat|int8|pq] [--rescore none|float16]
+    python vector_store.py benchmark [--kb NAME] [--queries 100] [--k 10]
+"""
+
+import abc
+import argparse
+import json
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from knowledge_bases import load_config, load_knowledge_bases
+
+STORE_DIR = "vectors"
+MANIFEST = "manifest.json"
+RECORDS_DB = "records.db"
+SCAN_BLOCK = 65536
+FETCH_BATCH = 500  # rows per SELECT; SQLite caps the number of bound parameters
+PAGE_SIZE = 1000
+FLAT_MAX_CHUNKS = 300_000  # "auto" uses exact flat search up to this size
+MASK_CACHE_SIZE = 64
+SUBSET_SCAN_FRACTION = 0.25  # narrower filters score only their own rows
+INT_MISSING = np.iinfo(np.int64).min  # integer column rows without the field (int32 min once narrowed)
+
+
+def choose_method(count: int, flat_max_chunks: int = FLAT_MAX_CHUNKS) -> str:
+    return "flat" if count <= flat_max_chunks else "int8"
+
+
+def export_method(config: Dict) -> Optional[str]:
+    """Store a build should export: `indexing.vector_store`, else what `retrieval.backend` asks for.
+
+    None (the default) exports nothing and the assistant searches Chroma.
+    """
+    method = (config.get("indexing", {}) or {}).get("vector_store")
+    if method:
+        return method
+    backend = (config.get("retrieval", {}) or {}).get("backend", "auto")
+    return {"flat": "flat", "quantized": "int8"}.get(backend)
+
+
+def store_path(index_path, physical: str) -> Path:
+    """Directory holding the exported store for one physical collection."""
+    return Path(index_path) / STORE_DIR / physical
+
+
+def drop_store(index_path, physical: str):
+    """Remove a store left by an earlier build; it would no longer match the collection."""
+    shutil.rmtree(store_path(index_path, physical), ignore_errors=True)
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
+
+
+# ---------- Query embedding ----------
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed with Chroma's default embedding function, L2-normalized."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                from chromadb.utils import embedding_functions
+
+                _embedder = embedding_functions.DefaultEmbeddingFunction()
+    vectors = np.asarray(_embedder(texts), dtype=np.float32)
+    return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# ---------- Export ----------
+
+
+def _iter_pages(collection):
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            return
+        yield page
+        offset += len(ids)
+
+
+def _train_pq(vectors: np.ndarray, subspaces: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """k-means codebooks of shape (subspaces, centroids, sub_dim)."""
+    rng = np.random.default_rng(seed)
+    n, dim = vectors.shape
+    sub_dim = dim // subspaces
+    centroids = min(256, n)
+    codebooks = np.zeros((subspaces, centroids, sub_dim), dtype=np.float32)
+    for m in range(subspaces):
+        sub = vectors[:, m * sub_dim : (m + 1) * sub_dim]
+        centers = sub[rng.choice(n, centroids, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _nearest(sub, centers)
+            for c in range(centroids):
+                members = sub[assign == c]
+                if len(members):
+                    centers[c] = members.mean(axis=0)
+        codebooks[m] = centers
+    return codebooks
+
+
+def _nearest(sub: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    dists = (sub * sub).sum(1, keepdims=True) - 2 * sub @ centers.T + (centers * centers).sum(1)
+    return dists.argmin(axis=1)
+
+
+def export_collection(
+    collection,
+    out_dir,
+    method: str = "int8",
+    rescore: str = "none",
+    pq_subspaces: Optional[int] = None,
+    keep_float32: bool = False,
+) -> Dict:
+    """Write a Chroma collection out as a memory-mapped store.
+
+    `method` is "flat" (exact float32), "int8" or "pq" (quantized scan
+    codes), or "auto" to pick by size; `rescore="float16"` adds float16
+    copies of the vectors (2 bytes per dimension) to re-score the best
+    candidates of a quantized scan. Documents stay in Chroma. String
+    metadata fields are stored as integer-coded columns so filters become
+    precomputed boolean masks.
+    """
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    count = collection.count()
+    if method == "auto":
+        method = choose_method(count)
+    if method == "flat":
+        rescore = "none"
+    records = sqlite3.connect(str(tmp_dir / RECORDS_DB))
+    records.execute("CREATE TABLE records (row INTEGER PRIMARY KEY, id TEXT, metadata TEXT)")
+
+    # Stage normalized float32 vectors on disk; codes are derived from them
+    staging = None
+    row = 0
+    column_values: Dict[str, Dict[str, int]] = {}
+    column_codes: Dict[str, np.ndarray] = {}
+    int_columns: Dict[str, np.ndarray] = {}
+    for page in _iter_pages(collection):
+        vectors = _normalize(np.asarray(page["embeddings"], dtype=np.float32))
+        if staging is None:
+            staging = np.lib.format.open_memmap(
+                tmp_dir / "float32.npy", mode="w+", dtype=np.float32, shape=(count, vectors.shape[1])
+            )
+        staging[row : row + len(vectors)] = vectors
+        rest = []
+        for i, meta in enumerate(page["metadatas"]):
+            # String and integer fields become columns; only other values stay as JSON
+            other = {}
+            for key, value in (meta or {}).items():
+                if isinstance(value, str) and key not in int_columns:
+                    if key not in column_codes:
+                        column_values[key] = {}
+                        column_codes[key] = np.full(count, -1, dtype=np.int32)
+                    codes_for_key = column_values[key]
+                    column_codes[key][row + i] = codes_for_key.setdefault(value, len(codes_for_key))
+                elif isinstance(value, int) and not isinstance(value, bool) and key not in column_codes:
+                    if key not in int_columns:
+                        int_columns[key] = np.full(count, INT_MISSING, dtype=np.int64)
+                    int_columns[key][row + i] = value
+                else:
+                    other[key] = value
+            rest.append(json.dumps(other) if other else None)
+        records.executemany(
+            "INSERT INTO records VALUES (?, ?, ?)",
+            [(row + i, chunk_id, rest[i]) for i, chunk_id in enumerate(page["ids"])],
+        )
+        row += len(vectors)
+    records.commit()
+    records.close()
+    if staging is None:
+        raise ValueError("Collection is empty; nothing to export")
+    staging.flush()
+    count, dim = row, staging.shape[1]
+
+    manifest = {
+        "version": 2,  # 1: records also held the documents
+        "method": method,
+        "rescore": rescore,
+        "count": count,
+        "dim": dim,
+        "space": "cosine",
+        "embedding_function": "chromadb.default",
+        "source_collection": collection.name,
+        "created_at": time.time(),
+        "columns": {key: list(values) for key, values in column_values.items()},
+        "int_columns": sorted(int_columns),
+    }
+    for key, codes_for_key in column_codes.items():
+        np.save(tmp_dir / f"col_{key}.npy", codes_for_key[:count])
+    for key, values in int_columns.items():
+        values = values[:count]
+        present = values[values != INT_MISSING]
+        small = np.iinfo(np.int32)
+        if not len(present) or (present.min() > small.min and present.max() <= small.max):
+            # Line numbers and indexes fit in 4 bytes; the missing marker becomes int32's minimum
+            values = np.where(values == INT_MISSING, small.min, values).astype(np.int32)
+        np.save(tmp_dir / f"int_{key}.npy", values)
+
+    if method == "int8":
+        codes = np.lib.format.open_memmap(tmp_dir / "int8.npy", mode="w+", dtype=np.int8, shape=(count, dim))
+        scales = np.lib.format.open_memmap(tmp_dir / "scales.npy", mode="w+", dtype=np.float32, shape=(count,))
+        for start in range(0, count, SCAN_BLOCK):
+            block = staging[start : start + SCAN_BLOCK]
+            scale = np.abs(block).max(axis=1) / 127.0
+            scale[scale == 0] = 1.0
+            codes[start : start + len(block)] = np.round(block / scale[:, None]).astype(np.int8)
+            scales[start : start + len(block)] = scale
+        codes.flush()
+        scales.flush()
+    elif method == "pq":
+        subspaces = pq_subspaces or max(1, dim // 4)
+        while dim % subspaces:
+            subspaces -= 1
+        sample = staging[np.random.default_rng(0).choice(count, min(count, 20000), replace=False)]
+        codebooks = _train_pq(np.asarray(sample), subspaces)
+        np.save(tmp_dir / "pq_codebooks.npy", codebooks)
+        codes = np.lib.format.open_memmap(
+            tmp_dir / "pq_codes.npy", mode="w+", dtype=np.uint8, shape=(count, subspaces)
+        )
+        sub_dim = dim // subspaces
+        for start in range(0, count, SCAN_BLOCK):
+            block = np.asarray(staging[start : start + SCAN_BLOCK])
+            for m in range(subspaces):
+                codes[start : start + len(block), m] = _nearest(
+                    block[:, m * sub_dim : (m + 1) * sub_dim], codebooks[m]
+                )
+        codes.flush()
+        manifest["pq_subspaces"] = subspaces
+    elif method != "flat":
+        raise ValueError(f"Unknown vector store method: {method}")
+
+    if manifest["rescore"] == "float16":
+        half = np.lib.format.open_memmap(tmp_dir / "float16.npy", mode="w+", dtype=np.float16, shape=(count, dim))
+        for start in range(0, count, SCAN_BLOCK):
+            half[start : start + SCAN_BLOCK] = staging[start : start + SCAN_BLOCK]
+        half.flush()
+
+    del staging
+    if method != "flat" and not keep_float32:
+        (tmp_dir / "float32.npy").unlink()
+
+    with open(tmp_dir / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp_dir.rename(out_dir)
+    return manifest
+
+
+# ---------- Search ----------
+
+
+class VectorStore(abc.ABC):
+    """Read side of an exported store with a Chroma-like `query()`.
+
+    `source()` returns the Chroma collection the store was exported from;
+    documents of the hits are read from it by id.
+    """
+
+    def __init__(self, path, source: Optional[Callable[[], object]] = None):
+        self.path = Path(path)
+        self.source = source
+        with open(self.path / MANIFEST, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.count = self.manifest["count"]
+        self.name = self.manifest["source_collection"]
+        self.metadata = {"hnsw:space": "cosine"}
+        self._records = sqlite3.connect(str(self.path / RECORDS_DB), check_same_thread=False)
+        self._records_lock = threading.Lock()
+        self.method = self.manifest["method"]
+        self._rescore = None
+        if self.manifest.get("rescore") == "float16":
+            self._rescore = np.load(self.path / "float16.npy", mmap_mode="r")
+        # Metadata columns written by the export, memory-mapped
+        self._strings = {
+            key: (np.load(self.path / f"col_{key}.npy", mmap_mode="r"), values)
+            for key, values in self.manifest.get("columns", {}).items()
+        }
+        self._ints = {
+            key: np.load(self.path / f"int_{key}.npy", mmap_mode="r") for key in self.manifest.get("int_columns", [])
+        }
+        self._columns: Dict[str, tuple] = {}
+        self._masks: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def open(path, source: Optional[Callable[[], object]] = None) -> "VectorStore":
+        with open(Path(path) / MANIFEST, "r", encoding="utf-8") as f:
+            method = json.load(f)["method"]
+        if method == "flat":
+            return FlatStore(path, source)
+        if method in ("int8", "pq"):
+            return QuantizedStore(path, source)
+        raise ValueError(f"Unknown vector store method: {method}")
+
+    # ---------- Metadata filters ----------
+
+    def _column(self, key: str) -> tuple:
+        """(codes per row, distinct values) for a metadata field."""
+        column = self._columns.get(key)
+        if column is None:
+            if key in self._strings:
+                codes, values = self._strings[key]
+                column = (np.asarray(codes), values)
+            elif key in self._ints:
+                ints = np.asarray(self._ints[key])
+                distinct, codes = np.unique(ints, return_inverse=True)
+                codes = codes.astype(np.int32)
+                if len(distinct) and distinct[0] == np.iinfo(ints.dtype).min:
+                    codes -= 1  # missing sorts first and becomes -1
+                    distinct = distinct[1:]
+                column = (codes, [int(value) for value in distinct])
+            else:
+                # Other fields are factorized from the records table on first use
+                values: Dict = {}
+                codes = np.full(self.count, -1, dtype=np.int32)
+                with self._records_lock:
+                    rows = self._records.execute("SELECT row, metadata FROM records").fetchall()
+                for row, metadata in rows:
+                    value = json.loads(metadata).get(key) if metadata else None
+                    if value is not None:
+                        codes[row] = values.setdefault(value, len(values))
+                column = (codes, list(values))
+            self._columns[key] = column
+        return column
+
+    def mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for a Chroma-style `where` filter (cached per filter)."""
+        if not where:
+            return None
+        cache_key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(cache_key)
+        if mask is None:
+            mask = self._build_mask(where)
+            # Per-query filters (hierarchical search) would otherwise grow this forever
+            while len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[cache_key] = mask
+        return mask
+
+    def _build_mask(self, where: Dict) -> np.ndarray:
+        mask = np.ones(self.count, dtype=bool)
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._build_mask(part) for part in condition]
+                combined = np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts)
+                mask &= combined
+                continue
+            op, operand = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            tests = {
+                "$eq": lambda v: v == operand,
+                "$ne": lambda v: v != operand,
+                "$in": lambda v: v in operand,
+                "$nin": lambda v: v not in operand,
+                "$gt": lambda v: v > operand,
+                "$gte": lambda v: v >= operand,
+                "$lt": lambda v: v < operand,
+                "$lte": lambda v: v <= operand,
+            }
+            if op not in tests:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            codes, values = self._column(key)
+            # Evaluate once per distinct value; the extra slot is "missing"
+            value_mask = np.array([tests[op](v) for v in values] + [False], dtype=bool)
+            mask &= value_mask[codes]
+        return mask
+
+    @abc.abstractmethod
+    def scan(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate scores of every row for each query: shape (rows, queries)."""
+
+    def scan_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Approximate scores of selected rows only: shape (len(rows), queries)."""
+        return self.scan(queries)[rows]
+
+    def search(
+        self, queries: np.ndarray, k: int, where: Optional[Dict] = None, rescore_factor: int = 4
+    ) -> List[List[tuple]]:
+        """Top-k (row, similarity) pairs per query, re-scored when possible.
+
+        Narrow filters (e.g. from the summary layer) score only their rows,
+        so the cost follows the filtered subset rather than the whole store.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        mask = self.mask(where)
+        if mask is not None and mask.sum() < self.count * SUBSET_SCAN_FRACTION:
+            rows = np.flatnonzero(mask)
+            scores = self.scan_rows(queries, rows)
+        else:
+            rows = np.arange(self.count)
+            scores = self.scan(queries)
+            if mask is not None:
+                scores[~mask] = -np.inf
+        available = self.count if mask is None else int(mask.sum())
+        k = min(k, available)
+        if k == 0:
+            return [[] for _ in queries]
+        pool = min(available, max(k * rescore_factor, 50)) if self._rescore is not None else k
+
+        results = []
+        for qi in range(len(queries)):
+            column = scores[:, qi]
+            if pool < len(rows):
+                candidates = np.argpartition(-column, pool - 1)[:pool]
+            else:
+                candidates = np.arange(len(rows))
+            candidates = candidates[np.isfinite(column[candidates])]
+            if self._rescore is not None:
+                picked = np.sort(rows[candidates])  # sequential reads from the memmap
+                exact = self._rescore[picked].astype(np.float32) @ queries[qi]
+                order = np.argsort(-exact)[:k]
+                results.append([(int(picked[i]), float(exact[i])) for i in order])
+            else:
+                order = candidates[np.argsort(-column[candidates])][:k]
+                results.append([(int(rows[i]), float(column[i])) for i in order])
+        return results
+
+    def fetch(self, rows: List[int], documents: bool = True) -> Dict[int, Dict]:
+        """Id, metadata and (from the source collection) document of each row."""
+        inline = self.manifest.get("version", 1) < 2
+        columns = "row, id, metadata, document" if inline else "row, id, metadata"
+        found = []
+        for start in range(0, len(rows), FETCH_BATCH):
+            batch = rows[start : start + FETCH_BATCH]
+            marks = ",".join("?" * len(batch))
+            with self._records_lock:
+                found += self._records.execute(
+                    f"SELECT {columns} FROM records WHERE row IN ({marks})", batch
+                ).fetchall()
+        records = {
+            r[0]: {"id": r[1], "metadata": self._metadata(r[0], r[2]), "document": r[3] if inline else None}
+            for r in found
+        }
+        if documents and not inline and records and self.source is not None:
+            texts = self._documents([record["id"] for record in records.values()])
+            for record in records.values():
+                record["document"] = texts.get(record["id"])
+        return records
+
+    def _metadata(self, row: int, rest: Optional[str]) -> Dict:
+        metadata = {}
+        for key, (codes, values) in self._strings.items():
+            if codes[row] >= 0:
+                metadata[key] = values[codes[row]]
+        for key, ints in self._ints.items():
+            if ints[row] != np.iinfo(ints.dtype).min:
+                metadata[key] = int(ints[row])
+        if rest:
+            metadata.update(json.loads(rest))
+        return metadata
+
+    def _documents(self, ids: List[str]) -> Dict[str, str]:
+        collection = self.source()
+        texts = {}
+        for start in range(0, len(ids), FETCH_BATCH):
+            page = collection.get(ids=ids[start : start + FETCH_BATCH], include=["documents"])
+            texts.update(zip(page["ids"], page["documents"]))
+        return texts
+
+    def row_ids(self) -> Dict[str, int]:
+        """Chunk id -> row for the whole store, without loading documents."""
+        with self._records_lock:
+            return {chunk_id: row for row, chunk_id in self._records.execute("SELECT row, id FROM records")}
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings=None,
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+    ) -> Dict:
+        """Chroma-compatible query returning ids/documents/metadatas/distances.
+
+        All queries in the call are scored together in one pass.
+        """
+        if query_embeddings is None:
+            query_embeddings = embed_texts(query_texts)
+        hits = self.search(np.asarray(query_embeddings, dtype=np.float32), n_results, where=where)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        # One lookup (and one Chroma read for the documents) for all queries
+        records = self.fetch(sorted({row for per_query in hits for row, _ in per_query}))
+        for per_query in hits:
+            out["ids"].append([records[row]["id"] for row, _ in per_query])
+            out["documents"].append([records[row]["document"] for row, _ in per_query])
+            out["metadatas"].append([records[row]["metadata"] for row, _ in per_query])
+            out["distances"].append([1.0 - score for _, score in per_query])
+        return out
+
+
+class FlatStore(VectorStore):
+    """Exact search over the memory-mapped, normalized float32 matrix."""
+
+    def __init__(self, path, source: Optional[Callable[[], object]] = None):
+        super().__init__(path, source)
+        self._vectors = np.load(self.path / "float32.npy", mmap_mode="r")
+
+    def scan(self, queries: np.ndarray) -> np.ndarray:
+        return np.asarray(self._vectors @ queries.T, dtype=np.float32)
+
+    def scan_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._vectors[rows] @ queries.T, dtype=np.float32)
+
+
+class QuantizedStore(VectorStore):
+    """Scans int8 or product-quantized codes instead of float vectors."""
+
+    def __init__(self, path, source: Optional[Callable[[], object]] = None):
+        super().__init__(path, source)
+        if self.method == "int8":
+            self._codes = np.load(self.path / "int8.npy", mmap_mode="r")
+            self._scales = np.load(self.path / "scales.npy", mmap_mode="r")
+        else:
+            self._codes = np.load(self.path / "pq_codes.npy", mmap_mode="r")
+            self._codebooks = np.load(self.path / "pq_codebooks.npy")
+
+    def scan(self, queries: np.ndarray) -> np.ndarray:
+        scores = np.empty((self.count, len(queries)), dtype=np.float32)
+        if self.method == "int8":
+            for start in range(0, self.count, SCAN_BLOCK):
+                block = np.asarray(self._codes[start : start + SCAN_BLOCK], dtype=np.float32)
+                scale = np.asarray(self._scales[start : start + SCAN_BLOCK])
+                scores[start : start + len(block)] = (block @ queries.T) * scale[:, None]
+            return scores
+
+        # Asymmetric distance: per-subspace lookup tables of query . centroid
+        subspaces, _, sub_dim = self._codebooks.shape
+        subs = np.arange(subspaces)
+        for qi, query in enumerate(queries):
+            tables = np.einsum("mcd,md->mc", self._codebooks, query.reshape(subspaces, sub_dim))
+            for start in range(0, self.count, SCAN_BLOCK):
+                codes = np.asarray(self._codes[start : start + SCAN_BLOCK])
+                scores[start : start + len(codes), qi] = tables[subs, codes].sum(axis=1)
+        return scores
+
+    def scan_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self.method == "int8":
+            block = np.asarray(self._codes[rows], dtype=np.float32)
+            return (block @ queries.T) * np.asarray(self._scales[rows])[:, None]
+        subspaces, _, sub_dim = self._codebooks.shape
+        subs = np.arange(subspaces)
+        codes = np.asarray(self._codes[rows])
+        scores = np.empty((len(rows), len(queries)), dtype=np.float32)
+        for qi, query in enumerate(queries):
+            tables = np.einsum("mcd,md->mc", self._codebooks, query.reshape(subspaces, sub_dim))
+            scores[:, qi] = tables[subs, codes].sum(axis=1)
+        return scores
+
+
+# ---------- CLI ----------
+
+
+def _benchmark(collection, store: VectorStore, queries: int, k: int, store_dir: Path, index_path: Path):
+    rng = np.random.default_rng(0)
+    sample_ids = rng.choice(store.count, min(queries, store.count), replace=False).tolist()
+    records = store.fetch(sample_ids)
+    texts = [(records[row]["document"] or "").strip().split("\n")[0][:200] or "code" for row in sample_ids]
+    query_vectors = embed_texts(texts)
+
+    # Ground truth: exact cosine over the original float32 vectors
+    exact = []
+    for page in _iter_pages(collection):
+        exact.append(_normalize(np.asarray(page["embeddings"], dtype=np.float32)))
+    exact = np.vstack(exact)
+    truth = [set(np.argsort(-(exact @ q))[:k].tolist()) for q in query_vectors]
+    id_to_row = store.row_ids()
+
+    def run(search):
+        started = time.perf_counter()
+        rows = [search(q) for q in query_vectors]
+        elapsed = (time.perf_counter() - started) * 1000 / len(query_vectors)
+        recall = np.mean([len(set(r) & t) / len(t) for r, t in zip(rows, truth)])
+        return elapsed, recall
+
+    chroma_ms, chroma_recall = run(
+        lambda q: [id_to_row[i] for i in collection.query(query_embeddings=[q.tolist()], n_results=k)["ids"][0]]
+    )
+    store_ms, store_recall = run(lambda q: [row for row, _ in store.search(q, k)[0]])
+
+    store_bytes = dir_bytes(store_dir)
+    chroma_bytes = dir_bytes(index_path) - dir_bytes(index_path / STORE_DIR)
+    if store.manifest["method"] == "flat":
+        scan_bytes = store.count * store.manifest["dim"] * 4
+    elif store.manifest["method"] == "int8":
+        scan_bytes = store.count * (store.manifest["dim"] + 4)
+    else:
+        scan_bytes = store.count * store.manifest["pq_subspaces"]
+    mb = 1024 * 1024
+    print(f"{'backend':<12}{'ms/query':>10}{f'recall@{k}':>12}")
+    print(f"{'chroma':<12}{chroma_ms:>10.2f}{chroma_recall:>12.3f}")
+    print(f"{store.manifest['method']:<12}{store_ms:>10.2f}{store_recall:>12.3f}")
+    print(f"\nFloat32 vectors:  {exact.nbytes / mb:.1f} MB (what Chroma's HNSW index holds in RAM)")
+    print(f"Store directory:  {store_bytes / mb:.1f} MB on disk, {exact.nbytes / store_bytes:.1f}x smaller")
+    print(f"Scan codes:       {scan_bytes / mb:.1f} MB resident while searching ({exact.nbytes / scan_bytes:.1f}x)")
+    print(f"Chroma directory: {chroma_bytes / mb:.1f} MB (all collections, with documents)")
+
+
+def main():
+    import chromadb
+
+    from index_aliases import resolve_collection
+
+    config = load_config()
+    bases = load_knowledge_bases(config)
+
+    parser = argparse.ArgumentParser(description="Compact vector store tools")
+    parser.add_argument("command", choices=["build", "benchmark"])
+    parser.add_argument("--kb", action="append", choices=list(bases), help="Knowledge base (default: all)")
+    parser.add_argument("--index-path", default="./chroma_db")
+    parser.add_argument("--method", choices=["auto", "flat", "int8", "pq"], default="auto")
+    parser.add_argument("--rescore", choices=["none", "float16"], default="none")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.index_path)
+    for name in args.kb or list(bases):
+        physical = resolve_collection(args.index_path, bases[name]["collection"])
+        collection = client.get_collection(physical)
+        out_dir = store_path(args.index_path, physical)
+        if args.command == "build" or not out_dir.exists():
+            started = time.perf_counter()
+            manifest = export_collection(collection, out_dir, method=args.method, rescore=args.rescore)
+            print(
+                f"✅ {name}: exported {manifest['count']} vectors as {manifest['method']} "
+                f"in {time.perf_counter() - started:.1f}s -> {out_dir}"
+            )
+        if args.command == "benchmark":
+            print(f"\nBenchmark: {name}")
+            store = VectorStore.open(out_dir, source=lambda: collection)
+            _benchmark(collection, store, args.queries, args.k, out_dir, Path(args.index_path))
+
+
+if __name__ == "__main__":
+    main()